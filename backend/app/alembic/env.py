@@ -20,6 +20,7 @@ fileConfig(config.config_file_name)
 
 from app.models import SQLModel  # noqa
 from app.core.config import settings # noqa
+from app.core.partitions import PARTITION_NAME_PATTERN # noqa
 
 target_metadata = SQLModel.metadata
 
@@ -33,6 +34,13 @@ def get_url():
     return str(settings.SQLALCHEMY_DATABASE_URI)
 
 
+def include_name(name, type_, parent_names):
+    # partitions are created at runtime, they are not part of the models
+    if type_ == "table":
+        return PARTITION_NAME_PATTERN.search(name) is None and not name.endswith("_default")
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -47,7 +55,8 @@ def run_migrations_offline():
     """
     url = get_url()
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True
+        url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -71,7 +80,8 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata, compare_type=True
+            connection=connection, target_metadata=target_metadata, compare_type=True,
+            include_name=include_name
         )
 
         with context.begin_transaction():
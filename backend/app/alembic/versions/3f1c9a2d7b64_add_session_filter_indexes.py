@@ -0,0 +1,52 @@
+"""Add session filter indexes
+
+Revision ID: 3f1c9a2d7b64
+Revises: e7f3b1d9c260
+Create Date: 2026-10-19 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2d7b64'
+down_revision = 'e7f3b1d9c260'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # indexes on the partitioned parent are created on every partition as well
+    op.create_index(
+        'ix_turnbench_sessions_llm_id_created_at', 'turnbench_sessions', ['llm_id', 'created_at'],
+        if_not_exists=True
+    )
+    op.create_index(
+        'ix_turnbench_sessions_mode_created_at', 'turnbench_sessions', ['mode', 'created_at'],
+        if_not_exists=True
+    )
+    op.create_index(
+        'ix_turnbench_sessions_finished', 'turnbench_sessions', ['llm_id', 'mode', 'game_success', 'created_at'],
+        postgresql_where=sa.text('game_over'),
+        postgresql_include=['setup_id', 'game_over_reason', 'total_rounds', 'total_input_tokens', 'total_output_tokens'],
+        if_not_exists=True
+    )
+    op.create_index(
+        'ix_turnbench_sessions_game_over_reason', 'turnbench_sessions', ['game_over_reason', 'created_at'],
+        postgresql_where=sa.text('game_over_reason IS NOT NULL'),
+        if_not_exists=True
+    )
+    op.create_index(
+        'ix_turnbench_setups_difficulty', 'turnbench_setups', ['difficulty'],
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_turnbench_setups_difficulty', table_name='turnbench_setups', if_exists=True)
+    op.drop_index('ix_turnbench_sessions_game_over_reason', table_name='turnbench_sessions', if_exists=True)
+    op.drop_index('ix_turnbench_sessions_finished', table_name='turnbench_sessions', if_exists=True)
+    op.drop_index('ix_turnbench_sessions_mode_created_at', table_name='turnbench_sessions', if_exists=True)
+    op.drop_index('ix_turnbench_sessions_llm_id_created_at', table_name='turnbench_sessions', if_exists=True)
@@ -0,0 +1,157 @@
+"""Initial schema
+
+Revision ID: a1c4e8f20b37
+Revises:
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c4e8f20b37'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases set up before the migrations already have these tables
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'providers' not in existing_tables:
+        op.create_table(
+            'providers',
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('display_name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('base_url', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+            sa.Column('api_key', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+            sa.Column('max_concurrent', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'games' not in existing_tables:
+        op.create_table(
+            'games',
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('game_name', sqlmodel.sql.sqltypes.AutoString(length=50), nullable=False),
+            sa.Column('display_name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('icon_url', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_games_game_name', 'games', ['game_name'], unique=True)
+    if 'turnbench_setups' not in existing_tables:
+        op.create_table(
+            'turnbench_setups',
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('number_of_verifiers', sa.Integer(), nullable=True),
+            sa.Column('answer', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+            sa.Column('difficulty', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+            sa.Column('verifier_ids', sa.JSON(), nullable=True),
+            sa.Column('active_criteria_ids', sa.JSON(), nullable=True),
+            sa.Column('nightmare_verifier_ids', sa.JSON(), nullable=True),
+            sa.Column('nightmare_active_criteria_ids', sa.JSON(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if 'llms' not in existing_tables:
+        op.create_table(
+            'llms',
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+            sa.Column('display_name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('frequency_penalty', sa.Float(), nullable=True),
+            sa.Column('presence_penalty', sa.Float(), nullable=True),
+            sa.Column('max_tokens', sa.Integer(), nullable=True),
+            sa.Column('max_completion_tokens', sa.Integer(), nullable=True),
+            sa.Column('temperature', sa.Float(), nullable=True),
+            sa.Column('top_p', sa.Float(), nullable=True),
+            sa.Column('reasoning_effort', postgresql.ENUM('LOW', 'MEDIUM', 'HIGH', name='reasoningeffort'), nullable=True),
+            sa.Column('provider_id', sa.Uuid(), nullable=False),
+            sa.ForeignKeyConstraint(['provider_id'], ['providers.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_llms_name', 'llms', ['name'])
+        op.create_index('ix_llms_provider_id', 'llms', ['provider_id'])
+    if 'game_histories' not in existing_tables:
+        op.create_table(
+            'game_histories',
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('game_id', sa.Uuid(), nullable=False),
+            sa.Column('game_name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+            sa.Column('llm_id', sa.Uuid(), nullable=False),
+            sa.Column('session_id', sa.Uuid(), nullable=False),
+            sa.Column('result', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['game_id'], ['games.id']),
+            sa.ForeignKeyConstraint(['llm_id'], ['llms.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_game_histories_game_id', 'game_histories', ['game_id'])
+        op.create_index('ix_game_histories_llm_id', 'game_histories', ['llm_id'])
+        op.create_index('ix_game_histories_session_id', 'game_histories', ['session_id'])
+    if 'turnbench_sessions' not in existing_tables:
+        op.create_table(
+            'turnbench_sessions',
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('mode', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+            sa.Column('llm_id', sa.Uuid(), nullable=False),
+            sa.Column('setup_id', sa.Uuid(), nullable=False),
+            sa.Column('max_rounds', sa.Integer(), nullable=True),
+            sa.Column('game_info', sa.JSON(), nullable=True),
+            sa.Column('verifier_descriptions', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+            sa.Column('total_time', sa.Float(), nullable=True),
+            sa.Column('total_turns', sa.Integer(), nullable=True),
+            sa.Column('total_rounds', sa.Integer(), nullable=True),
+            sa.Column('total_verifiers', sa.Integer(), nullable=True),
+            sa.Column('total_input_tokens', sa.Integer(), nullable=True),
+            sa.Column('total_output_tokens', sa.Integer(), nullable=True),
+            sa.Column('longest_context_length', sa.Integer(), nullable=True),
+            sa.Column('total_response_with_formatting_error', sa.Integer(), nullable=True),
+            sa.Column('total_response_with_not_valid_error', sa.Integer(), nullable=True),
+            sa.Column('submitted_code', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+            sa.Column('num_of_verifier_passed', sa.Integer(), nullable=True),
+            sa.Column('game_over', sa.Boolean(), nullable=False),
+            sa.Column('game_over_reason', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+            sa.Column('game_success', sa.Boolean(), nullable=False),
+            sa.Column('base_game_prompts', sa.JSON(), nullable=True),
+            sa.Column('turn_messages', sa.JSON(), nullable=True),
+            sa.Column('turn_time_used', sa.Float(), nullable=True),
+            sa.Column('turn_input_tokens', sa.Integer(), nullable=True),
+            sa.Column('turn_output_tokens', sa.Integer(), nullable=True),
+            sa.Column('turn_longest_context_length', sa.Integer(), nullable=True),
+            sa.Column('next_turn_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+            sa.Column('messages', sa.JSON(), nullable=True),
+            sa.Column('turn_result_history', sa.JSON(), nullable=True),
+            sa.Column('turn_message_indexes', sa.JSON(), nullable=True),
+            sa.Column('turn_llm_response_indexes', sa.JSON(), nullable=True),
+            sa.ForeignKeyConstraint(['llm_id'], ['llms.id']),
+            sa.ForeignKeyConstraint(['setup_id'], ['turnbench_setups.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_turnbench_sessions_llm_id', 'turnbench_sessions', ['llm_id'])
+        op.create_index('ix_turnbench_sessions_setup_id', 'turnbench_sessions', ['setup_id'])
+
+
+def downgrade():
+    op.drop_table('turnbench_sessions')
+    op.drop_table('game_histories')
+    op.drop_table('llms')
+    op.drop_table('turnbench_setups')
+    op.drop_table('games')
+    op.drop_table('providers')
+    sa.Enum(name='reasoningeffort').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,174 @@
+"""Add forks, leases, archives, stats, search, idempotency keys and llm call telemetry
+
+Revision ID: c52e9d7a4f18
+Revises: a1c4e8f20b37
+Create Date: 2026-10-19 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e9d7a4f18'
+down_revision = 'a1c4e8f20b37'
+branch_labels = None
+depends_on = None
+
+
+# counters new sessions start at 0, existing rows get the same
+SESSION_COUNTER_COLUMNS = [
+    ('fork_turn', sa.Integer()),
+    ('fork_message_index', sa.Integer()),
+    ('total_cached_tokens', sa.Integer()),
+    ('total_reasoning_tokens', sa.Integer()),
+    ('total_retries', sa.Integer()),
+    ('total_retry_time', sa.Float()),
+    ('total_retry_input_tokens', sa.Integer()),
+    ('total_retry_output_tokens', sa.Integer()),
+    ('turn_cached_tokens', sa.Integer()),
+    ('turn_reasoning_tokens', sa.Integer()),
+    ('turn_retries', sa.Integer()),
+    ('turn_retry_time', sa.Float()),
+    ('turn_retry_input_tokens', sa.Integer()),
+    ('turn_retry_output_tokens', sa.Integer()),
+]
+
+
+def upgrade():
+    # sessions: play options, forks, token and retry counters, worker leases and archiving
+    op.add_column('turnbench_sessions', sa.Column('prompt_layout', sqlmodel.sql.sqltypes.AutoString(length=20), nullable=False, server_default='default'))
+    op.add_column('turnbench_sessions', sa.Column('context_strategy', sqlmodel.sql.sqltypes.AutoString(length=20), nullable=False, server_default='full'))
+    op.add_column('turnbench_sessions', sa.Column('output_mode', sqlmodel.sql.sqltypes.AutoString(length=20), nullable=False, server_default='text'))
+    op.add_column('turnbench_sessions', sa.Column('retry_mode', sqlmodel.sql.sqltypes.AutoString(length=20), nullable=False, server_default='keep'))
+    op.add_column('turnbench_sessions', sa.Column('parent_session_id', sa.Uuid(), nullable=True))
+    op.create_index('ix_turnbench_sessions_parent_session_id', 'turnbench_sessions', ['parent_session_id'])
+    for name, type_ in SESSION_COUNTER_COLUMNS:
+        op.add_column('turnbench_sessions', sa.Column(name, type_, nullable=True, server_default='0'))
+    op.add_column('turnbench_sessions', sa.Column('owner_id', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=True))
+    op.add_column('turnbench_sessions', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    op.add_column('turnbench_sessions', sa.Column('handoff_requested', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('turnbench_sessions', sa.Column('state_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('turnbench_sessions', sa.Column('archived_at', sa.DateTime(), nullable=True))
+
+    # llm aliases routed over several endpoints, hedging and turn deadlines
+    op.add_column('llms', sa.Column('endpoint_llm_ids', sa.JSON(), nullable=True))
+    op.add_column('llms', sa.Column('hedge_after_seconds', sa.Float(), nullable=True))
+    op.add_column('llms', sa.Column('turn_deadline_seconds', sa.Float(), nullable=True))
+
+    # incremental setup sync
+    op.add_column('games', sa.Column('setup_manifest_hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=True))
+    op.add_column('turnbench_setups', sa.Column('game_id', sqlmodel.sql.sqltypes.AutoString(length=50), nullable=True))
+    op.add_column('turnbench_setups', sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=True))
+    op.create_index('ix_turnbench_setups_game_id', 'turnbench_setups', ['game_id'], unique=True)
+
+    op.create_table(
+        'turnbench_session_archives',
+        sa.Column('session_id', sa.Uuid(), nullable=False),
+        sa.Column('codec', sqlmodel.sql.sqltypes.AutoString(length=20), nullable=False),
+        sa.Column('raw_size', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('session_id'),
+    )
+    op.create_table(
+        'turnbench_turn_reasonings',
+        sa.Column('hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('hash'),
+    )
+    op.create_table(
+        'turnbench_turn_idempotency_keys',
+        sa.Column('session_id', sa.Uuid(), nullable=False),
+        sa.Column('key', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('request_hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+        sa.Column('turn_data', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('session_id', 'key'),
+    )
+    op.create_index('ix_turnbench_turn_idempotency_keys_created_at', 'turnbench_turn_idempotency_keys', ['created_at'])
+    # filled by `python -m app.games.turnbench.rebuild_stats` for the sessions stored before
+    op.create_table(
+        'turnbench_session_stats',
+        sa.Column('llm_id', sa.Uuid(), nullable=False),
+        sa.Column('mode', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+        sa.Column('difficulty', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('sessions', sa.Integer(), nullable=False),
+        sa.Column('successes', sa.Integer(), nullable=False),
+        sa.Column('total_rounds', sa.Integer(), nullable=False),
+        sa.Column('total_turns', sa.Integer(), nullable=False),
+        sa.Column('total_input_tokens', sa.Integer(), nullable=False),
+        sa.Column('total_output_tokens', sa.Integer(), nullable=False),
+        sa.Column('total_cached_tokens', sa.Integer(), nullable=False),
+        sa.Column('total_reasoning_tokens', sa.Integer(), nullable=False),
+        sa.Column('total_time', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('llm_id', 'mode', 'difficulty', 'day'),
+    )
+    op.create_table(
+        'turnbench_turn_search',
+        sa.Column('session_id', sa.Uuid(), nullable=False),
+        sa.Column('turn_index', sa.Integer(), nullable=False),
+        sa.Column('turn_num', sa.Integer(), nullable=False),
+        sa.Column('turn_name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True),
+        sa.PrimaryKeyConstraint('session_id', 'turn_index'),
+    )
+    op.create_index('ix_turnbench_turn_search_search_vector', 'turnbench_turn_search', ['search_vector'], postgresql_using='gin')
+    # new table, partitioned from the start, its monthly partitions are created at startup
+    op.create_table(
+        'llm_calls',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('session_id', sa.Uuid(), nullable=True),
+        sa.Column('turn_num', sa.Integer(), nullable=True),
+        sa.Column('attempt', sa.Integer(), nullable=False),
+        sa.Column('llm_id', sa.Uuid(), nullable=False),
+        sa.Column('llm_name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+        sa.Column('provider_id', sa.Uuid(), nullable=False),
+        sa.Column('provider_name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+        sa.Column('latency', sa.Float(), nullable=False),
+        sa.Column('input_tokens', sa.Integer(), nullable=True),
+        sa.Column('output_tokens', sa.Integer(), nullable=True),
+        sa.Column('cached_tokens', sa.Integer(), nullable=True),
+        sa.Column('reasoning_tokens', sa.Integer(), nullable=True),
+        sa.Column('http_status', sa.Integer(), nullable=True),
+        sa.Column('error_class', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    op.execute('CREATE TABLE "llm_calls_default" PARTITION OF "llm_calls" DEFAULT')
+    op.create_index('ix_llm_calls_llm_id_created_at', 'llm_calls', ['llm_id', 'created_at'])
+    op.create_index('ix_llm_calls_provider_id_created_at', 'llm_calls', ['provider_id', 'created_at'])
+    op.create_index('ix_llm_calls_session_id', 'llm_calls', ['session_id'])
+
+
+def downgrade():
+    op.drop_table('llm_calls')
+    op.drop_table('turnbench_turn_search')
+    op.drop_table('turnbench_session_stats')
+    op.drop_table('turnbench_turn_idempotency_keys')
+    op.drop_table('turnbench_turn_reasonings')
+    op.drop_table('turnbench_session_archives')
+
+    op.drop_index('ix_turnbench_setups_game_id', table_name='turnbench_setups')
+    op.drop_column('turnbench_setups', 'content_hash')
+    op.drop_column('turnbench_setups', 'game_id')
+    op.drop_column('games', 'setup_manifest_hash')
+
+    op.drop_column('llms', 'turn_deadline_seconds')
+    op.drop_column('llms', 'hedge_after_seconds')
+    op.drop_column('llms', 'endpoint_llm_ids')
+
+    for name in ('archived_at', 'state_version', 'handoff_requested', 'lease_expires_at', 'owner_id'):
+        op.drop_column('turnbench_sessions', name)
+    for name, _ in reversed(SESSION_COUNTER_COLUMNS):
+        op.drop_column('turnbench_sessions', name)
+    op.drop_index('ix_turnbench_sessions_parent_session_id', table_name='turnbench_sessions')
+    for name in ('parent_session_id', 'retry_mode', 'output_mode', 'context_strategy', 'prompt_layout'):
+        op.drop_column('turnbench_sessions', name)
@@ -0,0 +1,101 @@
+"""Partition sessions and game histories by month of created_at
+
+Revision ID: e7f3b1d9c260
+Revises: c52e9d7a4f18
+Create Date: 2026-10-19 11:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7f3b1d9c260'
+down_revision = 'c52e9d7a4f18'
+branch_labels = None
+depends_on = None
+
+
+PARTITIONED_TABLES = ['turnbench_sessions', 'game_histories']
+
+
+def upgrade():
+    # stored created_at values are utc
+    op.execute("SET LOCAL TIME ZONE 'UTC'")
+    for table_name in PARTITIONED_TABLES:
+        swap_table(table_name, partitioned=True)
+
+
+def downgrade():
+    op.execute("SET LOCAL TIME ZONE 'UTC'")
+    for table_name in PARTITIONED_TABLES:
+        swap_table(table_name, partitioned=False)
+
+
+def swap_table(table_name, partitioned):
+    """
+    copy a table into a new one partitioned by created_at (or back into a plain one) and swap the two.
+    the primary key becomes (id, created_at), postgres wants the partition key in every unique constraint.
+    the table is locked for writes while its rows are copied.
+    """
+    bind = op.get_bind()
+    relkind = bind.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table_name)"), {"table_name": table_name}
+    ).scalar_one()
+    if (relkind == 'p') == partitioned:
+        return
+    old_name = f'{table_name}_old'
+    op.execute(f'LOCK TABLE "{table_name}" IN ACCESS EXCLUSIVE MODE')
+    # index and constraint names are taken over by the new table, the index definitions name the table only
+    indexes = bind.execute(sa.text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = :table_name AND indexname NOT IN "
+        "(SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table_name))"
+    ), {"table_name": table_name}).all()
+    foreign_keys = bind.execute(sa.text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(:table_name) AND contype = 'f'"
+    ), {"table_name": table_name}).all()
+    for index_name, _ in indexes:
+        op.execute(f'DROP INDEX "{index_name}"')
+    op.execute(f'ALTER TABLE "{table_name}" RENAME TO "{old_name}"')
+    op.execute(f'ALTER TABLE "{old_name}" RENAME CONSTRAINT "{table_name}_pkey" TO "{old_name}_pkey"')
+
+    created_at_type = 'timestamp with time zone' if partitioned else 'timestamp without time zone'
+    columns = ', '.join(
+        f'"{name}" {created_at_type if name == "created_at" else type_}'
+        + (' NOT NULL' if not_null else '')
+        + (f' DEFAULT {default}' if default is not None else '')
+        for name, type_, not_null, default in bind.execute(sa.text(
+            "SELECT attname, format_type(atttypid, atttypmod), attnotnull, pg_get_expr(adbin, adrelid) "
+            "FROM pg_attribute LEFT JOIN pg_attrdef ON adrelid = attrelid AND adnum = attnum "
+            "WHERE attrelid = to_regclass(:old_name) AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+        ), {"old_name": old_name}).all()
+    )
+    if partitioned:
+        op.execute(
+            f'CREATE TABLE "{table_name}" ({columns}, CONSTRAINT "{table_name}_pkey" PRIMARY KEY (id, created_at)) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        # monthly partitions of the stored rows, the current and coming months are created at startup
+        months = bind.execute(sa.text(
+            f'SELECT DISTINCT date_trunc(\'month\', created_at) FROM "{old_name}" ORDER BY 1'
+        )).scalars().all()
+        for lower in months:
+            upper = lower.replace(year=lower.year + lower.month // 12, month=lower.month % 12 + 1)
+            op.execute(
+                f'CREATE TABLE "{table_name}_p{lower:%Y%m}" PARTITION OF "{table_name}" '
+                f"FOR VALUES FROM ('{lower:%Y-%m-%d} 00:00:00+00') TO ('{upper:%Y-%m-%d} 00:00:00+00')"
+            )
+        op.execute(f'CREATE TABLE "{table_name}_default" PARTITION OF "{table_name}" DEFAULT')
+    else:
+        op.execute(f'CREATE TABLE "{table_name}" ({columns}, CONSTRAINT "{table_name}_pkey" PRIMARY KEY (id))')
+
+    # same columns in the same order, created_at converted in utc
+    op.execute(f'INSERT INTO "{table_name}" SELECT * FROM "{old_name}"')
+    for constraint_name, definition in foreign_keys:
+        op.execute(f'ALTER TABLE "{table_name}" ADD CONSTRAINT "{constraint_name}" {definition}')
+    # indexes on a partitioned table are created on each of its partitions
+    for _, definition in indexes:
+        op.execute(definition)
+    op.execute(f'DROP TABLE "{old_name}"')
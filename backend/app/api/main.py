@@ -1,10 +1,11 @@
 from fastapi import APIRouter
 
-from app.api.routes import games, llms, providers, utils, dependencies
+from app.api.routes import games, llms, providers, utils, dependencies, history
 
 api_router = APIRouter()
 api_router.include_router(games.router)
 api_router.include_router(llms.router)
 api_router.include_router(providers.router)
 api_router.include_router(utils.router)
-api_router.include_router(dependencies.router)
\ No newline at end of file
+api_router.include_router(dependencies.router)
+api_router.include_router(history.router)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import uuid
-from fastapi import APIRouter, HTTPException
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query
 
 from app.api.deps import SessionDep
 from app.core.config import settings
@@ -10,6 +12,9 @@ from app.models.history import (
     GameHistoryPublic,
     GameHistoryUpdate,
     GameHistoryDeleteResponse,
+    GameHistoryFilter,
+    GameHistoriesUpdateRequest,
+    GameHistoriesCountResponse,
 )
 
 router = APIRouter(prefix="/history", tags=["history"])
@@ -25,6 +30,32 @@ def get_games(page: int, page_size: int, db_session: SessionDep):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting histories: {e}")
     
+@router.patch("", response_model=GameHistoriesCountResponse)
+def update_histories(update_request: GameHistoriesUpdateRequest, db_session: SessionDep):
+    try:
+        history_service = GameHistoryService(db_session)
+        updated = history_service.update_game_histories(
+            update_request.filter, update_request.update, settings.BULK_OPERATION_BATCH_SIZE
+        )
+        logger.info(f"update {updated} histories")
+        return GameHistoriesCountResponse(data=updated)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating histories: {e}")
+
+@router.delete("", response_model=GameHistoriesCountResponse)
+def delete_histories(history_filter: Annotated[GameHistoryFilter, Query()], db_session: SessionDep):
+    try:
+        history_service = GameHistoryService(db_session)
+        deleted = history_service.delete_game_histories(history_filter, settings.BULK_OPERATION_BATCH_SIZE)
+        logger.info(f"delete {deleted} histories")
+        return GameHistoriesCountResponse(data=deleted)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting histories: {e}")
+    
 @router.get("/{session_id}", response_model=GameHistoryPublic)
 def get_game_by_id(session_id: uuid.UUID, db_session: SessionDep):
     try:
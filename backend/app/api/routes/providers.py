@@ -3,9 +3,17 @@ from fastapi import APIRouter, HTTPException
 
 from app.api.deps import SessionDep
 from app.core.config import settings
+from app.core.circuit_breaker import circuit_breakers
 from app.utils import setup_logger
 from app.services.provider_service import ProviderService
-from app.models.provider import ProviderCreate, ProviderUpdate, ProviderPublic, ProviderListResponse, ProviderDeleteResponse
+from app.models.provider import (
+    ProviderCreate,
+    ProviderUpdate,
+    ProviderPublic,
+    ProviderListResponse,
+    ProviderDeleteResponse,
+    CircuitBreakerListResponse,
+)
 
 router = APIRouter(prefix="/providers", tags=["providers"])
 logger = setup_logger("providers-router", settings.LOG_LEVEL)
@@ -32,6 +40,13 @@ def create_provider(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating provider: {e}")
 
+@router.get("/circuit-breakers", response_model=CircuitBreakerListResponse)
+def get_circuit_breakers():
+    try:
+        return CircuitBreakerListResponse(data=circuit_breakers.snapshot())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting circuit breakers: {e}")
+
 @router.get("/{provider_id}", response_model=ProviderPublic)
 def get_provider(
     provider_id: uuid.UUID,
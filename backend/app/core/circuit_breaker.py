@@ -0,0 +1,158 @@
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from app.core.config import settings
+from app.core.exceptions import CircuitOpenError
+from app.utils import setup_logger
+
+logger = setup_logger("CircuitBreaker", settings.LOG_LEVEL)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_provider_error(error: Exception) -> bool:
+    """errors telling the provider is in trouble rather than the request: timeouts, connection errors and 5xx"""
+    if isinstance(error, (APITimeoutError, APIConnectionError, CircuitOpenError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class CircuitBreaker:
+    """Breaker of one model on one provider, opened by too many failed or slow calls among the recent ones"""
+
+    def __init__(self, provider_id: uuid.UUID, provider_name: str, model_name: str):
+        self.provider_id = provider_id
+        self.provider_name = provider_name
+        self.model_name = model_name
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        # (failed, latency) of the recent calls while closed
+        self._calls: Deque[Tuple[bool, float]] = deque(maxlen=max(settings.LLM_BREAKER_WINDOW, 1))
+        self._transitions: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str, reason: str) -> None:
+        """move to `state`, called with the lock held"""
+        logger.warning(f"{self.provider_name}/{self.model_name}: circuit {self.state} -> {state}, {reason}")
+        self._transitions.append({
+            "from_state": self.state, "to_state": state, "reason": reason, "at": datetime.now(timezone.utc)
+        })
+        self.state = state
+        self.opened_at = time.time() if state == OPEN else None
+        self._calls.clear()
+
+    def _rates(self) -> Tuple[float, float]:
+        """error rate and slow call rate of the recent calls"""
+        if not self._calls:
+            return 0.0, 0.0
+        slow_seconds = settings.LLM_BREAKER_SLOW_CALL_SECONDS
+        errors = sum(1 for failed, _ in self._calls if failed)
+        slow = sum(1 for failed, latency in self._calls if not failed and slow_seconds and latency >= slow_seconds)
+        return errors / len(self._calls), slow / len(self._calls)
+
+    def retry_at(self) -> Optional[float]:
+        """time the open circuit lets a probe through"""
+        return self.opened_at + settings.LLM_BREAKER_OPEN_SECONDS if self.opened_at is not None else None
+
+    def before_call(self, probe: Callable[[], None]) -> None:
+        """fail fast while open, once the open period is over the first caller probes the provider"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self._probing or time.time() < self.retry_at():
+                raise CircuitOpenError(
+                    f"circuit of {self.model_name} on {self.provider_name} is {self.state}", retry_at=self.retry_at()
+                )
+            self._probing = True
+            self._transition(HALF_OPEN, "open period over, probing")
+        failure = None
+        start_time = time.time()
+        try:
+            probe()
+        except Exception as e:
+            # any other answer, e.g. a 400 for the probe's parameters, still shows the provider is up
+            if is_provider_error(e):
+                failure = f"{type(e).__name__}: {e}"
+        latency = time.time() - start_time
+        slow_seconds = settings.LLM_BREAKER_SLOW_CALL_SECONDS
+        if failure is None and slow_seconds and latency >= slow_seconds:
+            failure = f"took {latency:.1f}s"
+        if failure is not None:
+            with self._lock:
+                self._probing = False
+                self._transition(OPEN, f"probe failed, {failure}")
+            raise CircuitOpenError(
+                f"circuit of {self.model_name} on {self.provider_name} is open, probe failed, {failure}", retry_at=self.retry_at()
+            )
+        with self._lock:
+            self._probing = False
+            self._transition(CLOSED, "probe succeeded")
+
+    def record(self, latency: float, error: Optional[Exception] = None) -> None:
+        """count a finished call, opening the circuit when the recent calls cross a threshold"""
+        if error is not None and not is_provider_error(error):
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self._calls.append((error is not None, latency))
+            if len(self._calls) < settings.LLM_BREAKER_MIN_CALLS:
+                return
+            error_rate, slow_call_rate = self._rates()
+            if error_rate >= settings.LLM_BREAKER_ERROR_RATE:
+                self._transition(OPEN, f"error rate {error_rate:.0%}")
+            elif settings.LLM_BREAKER_SLOW_CALL_SECONDS and slow_call_rate >= settings.LLM_BREAKER_SLOW_CALL_RATE:
+                self._transition(OPEN, f"slow call rate {slow_call_rate:.0%}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """state, recent rates and transitions"""
+        with self._lock:
+            error_rate, slow_call_rate = self._rates()
+            retry_at = self.retry_at()
+            return {
+                "provider_id": self.provider_id,
+                "provider_name": self.provider_name,
+                "model_name": self.model_name,
+                "state": self.state,
+                "recent_calls": len(self._calls),
+                "error_rate": error_rate,
+                "slow_call_rate": slow_call_rate,
+                "retry_at": datetime.fromtimestamp(retry_at, timezone.utc) if retry_at is not None else None,
+                "transitions": list(self._transitions),
+            }
+
+
+class CircuitBreakerRegistry:
+    """Circuit breakers of the process, one per provider and model name"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._breakers: Dict[Tuple[uuid.UUID, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider_id: uuid.UUID, provider_name: str, model_name: str) -> CircuitBreaker:
+        """breaker of the model on the provider, created closed"""
+        with self._lock:
+            key = (provider_id, model_name)
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(provider_id, provider_name, model_name)
+            return self._breakers[key]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """snapshots of every breaker, open ones first"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        snapshots = [breaker.snapshot() for breaker in breakers]
+        return sorted(snapshots, key=lambda snapshot: (snapshot["state"] == CLOSED, snapshot["provider_name"], snapshot["model_name"]))
+
+
+circuit_breakers = CircuitBreakerRegistry(settings.LLM_BREAKER_ENABLED)
@@ -26,6 +26,91 @@ class Settings(BaseSettings):
 
     LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
 
+    # monthly range partitions of the session and history tables, created this many months ahead
+    PARTITION_MONTHS_AHEAD: int = 3
+    # months of sessions / histories / llm call records to keep, older partitions are dropped, 0 keeps everything
+    TURNBENCH_SESSION_RETENTION_MONTHS: int = 0
+    GAME_HISTORY_RETENTION_MONTHS: int = 0
+    LLM_CALL_RETENTION_MONTHS: int = 0
+    # detach expired partitions instead of dropping them, e.g. to dump them elsewhere first
+    PARTITION_RETENTION_DETACH_ONLY: bool = False
+
+    # every llm api call is recorded in the llm_calls table by a background writer
+    LLM_CALL_TELEMETRY_ENABLED: bool = True
+    LLM_CALL_TELEMETRY_BATCH_SIZE: int = 200
+    LLM_CALL_TELEMETRY_FLUSH_INTERVAL_SECONDS: float = 2.0
+    # records beyond this many waiting ones are dropped rather than slowing down turns
+    LLM_CALL_TELEMETRY_QUEUE_SIZE: int = 10000
+
+    # seconds before an llm request times out, a timed out request fails over to the next endpoint of the llm
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 600.0
+    # recent latencies kept per llm endpoint for routing, and the samples needed before they are trusted
+    LLM_ROUTING_LATENCY_WINDOW: int = 100
+    LLM_ROUTING_MIN_SAMPLES: int = 5
+    # share of calls sent first to an endpoint without enough samples, so that every endpoint of an llm gets measured
+    LLM_ROUTING_EXPLORE_RATE: float = 0.05
+    # seconds one endpoint of a routed llm gets before failing over, without sdk retries, within the turn deadline
+    LLM_ROUTING_ATTEMPT_TIMEOUT_SECONDS: float = 120.0
+    # threads shared by the calls of all routed llms, a hedge that lost the race holds one until it finishes
+    LLM_ROUTING_MAX_WORKERS: int = 64
+    # threads running the llm calls of turns, a call its turn abandoned holds one until it returns or times out
+    LLM_CALL_MAX_WORKERS: int = 128
+
+    # circuit breaker per provider and model: opens once enough recent calls failed (timeouts, connection errors, 5xx)
+    # or took longer than LLM_BREAKER_SLOW_CALL_SECONDS (0 ignores latency), then fails fast for
+    # LLM_BREAKER_OPEN_SECONDS before a one token probe decides whether to close it again
+    LLM_BREAKER_ENABLED: bool = True
+    LLM_BREAKER_WINDOW: int = 20
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_SLOW_CALL_SECONDS: float = 0
+    LLM_BREAKER_SLOW_CALL_RATE: float = 0.8
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0
+    LLM_BREAKER_PROBE_TIMEOUT_SECONDS: float = 10.0
+
+    # rows changed per statement / transaction by bulk updates and deletes
+    BULK_OPERATION_BATCH_SIZE: int = 1000
+
+    # rows fetched per round trip when streaming session exports
+    TURNBENCH_EXPORT_BATCH_SIZE: int = 500
+
+    # month chunks of sessions recomputed in parallel when rebuilding the session stats
+    TURNBENCH_STATS_REBUILD_WORKERS: int = 4
+
+    # postgres text search configuration of the turn search index
+    TURNBENCH_SEARCH_TEXT_CONFIG: str = "english"
+    TURNBENCH_SEARCH_REINDEX_BATCH_SIZE: int = 200
+
+    # retries of each kind of unusable llm response in a turn, and the tokens all retries of a turn may use (0 for no cap)
+    TURNBENCH_MAX_RESPONSE_RETRIES: int = 4
+    TURNBENCH_RETRY_TOKEN_BUDGET: int = 0
+
+    # rounds kept verbatim by the sliding_window context strategy, older rounds are summarized
+    TURNBENCH_CONTEXT_WINDOW_ROUNDS: int = 2
+
+    # seconds a turn may take before its llm calls are aborted and the turn is discarded, 0 for no deadline.
+    # requests and llms can set their own deadline, the shortest one applies
+    TURNBENCH_TURN_DEADLINE_SECONDS: float = 0
+    # how often a turn checks whether its client is still connected
+    TURNBENCH_DISCONNECT_POLL_SECONDS: float = 1.0
+
+    # seconds a play turn result is replayed to requests repeating its Idempotency-Key
+    TURNBENCH_IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400
+
+    # hot session cache, 0 disables it
+    TURNBENCH_SESSION_CACHE_SIZE: int = 256
+    # persist a cached session after every N played turns (and always on game over / eviction)
+    TURNBENCH_SESSION_WRITE_EVERY_N_TURNS: int = 1
+    TURNBENCH_SESSION_LEASE_SECONDS: int = 30
+    TURNBENCH_SESSION_CACHE_IDLE_SECONDS: int = 300
+    TURNBENCH_SESSION_FLUSH_INTERVAL_SECONDS: float = 1.0
+    TURNBENCH_SESSION_HANDOFF_TIMEOUT_SECONDS: float = 15.0
+
+    # finished sessions untouched for this many days get their bulky columns compressed into the archive table
+    TURNBENCH_SESSION_ARCHIVE_AFTER_DAYS: int = 7
+    TURNBENCH_SESSION_ARCHIVE_BATCH_SIZE: int = 200
+    TURNBENCH_SESSION_ARCHIVE_ZSTD_LEVEL: int = 10
+
     @computed_field  # type: ignore[prop-decorator]
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
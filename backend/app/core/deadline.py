@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import TurnCancelledError
+from app.utils import setup_logger
+
+logger = setup_logger("TurnDeadline", settings.LOG_LEVEL)
+
+# calls made under a deadline, a cancelled call keeps its thread until it returns or times out
+call_executor = ThreadPoolExecutor(max_workers=settings.LLM_CALL_MAX_WORKERS, thread_name_prefix="turn-call")
+
+
+class TurnDeadline:
+    """Deadline and cancellation of one turn, a cancelled turn stops waiting for its llm calls right away"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.reason: Optional[str] = None
+        self.expires_at: Optional[float] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        # set once the turn is being written, it can no longer be cancelled then
+        self._settled = False
+        if seconds:
+            self.limit(seconds)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def limit(self, seconds: Optional[float]) -> None:
+        """cancel the turn `seconds` from now, unless it already has an earlier deadline"""
+        if not seconds:
+            return
+        expires_at = time.monotonic() + seconds
+        with self._lock:
+            if self.cancelled or (self.expires_at is not None and self.expires_at <= expires_at):
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            self.expires_at = expires_at
+            self._timer = threading.Timer(seconds, self.cancel, args=(f"deadline of {seconds:g}s exceeded",))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def remaining(self) -> Optional[float]:
+        """seconds left until the deadline, None without one"""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """run `callback` when the turn is cancelled, right away if it already is"""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, reason: str) -> None:
+        """cancel the turn, only the first reason is kept"""
+        with self._lock:
+            if self.cancelled or self._settled:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+            if self._timer is not None:
+                self._timer.cancel()
+        logger.info(f"turn cancelled: {reason}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"turn cancel callback failed: {e}")
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        run `fn` on the call executor and wait for it, raising TurnCancelledError as soon as the turn is cancelled.
+        a blocking call cannot be interrupted, so a cancelled one finishes in the background and its result is dropped.
+        """
+        self.check()
+        finished = threading.Event()
+        future = call_executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: finished.set())
+        self.on_cancel(finished.set)
+        try:
+            finished.wait()
+        finally:
+            self._remove_callback(finished.set)
+        if future.done() and future.exception() is None:
+            return future.result()
+        # a call still queued is dropped, a running one is left to finish
+        future.cancel()
+        self.check()
+        return future.result()
+
+    def _remove_callback(self, callback: Callable[[], None]) -> None:
+        """forget a cancel callback no longer needed"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self) -> None:
+        """raise TurnCancelledError once the turn is cancelled"""
+        if self.reason is not None:
+            raise TurnCancelledError(self.reason)
+
+    def settle(self) -> None:
+        """
+        raise TurnCancelledError if the turn is cancelled, otherwise ignore any later cancellation.
+        called right before the turn is written, so that a turn whose write started is kept and returned.
+        """
+        with self._lock:
+            if self.reason is not None:
+                raise TurnCancelledError(self.reason)
+            self._settled = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._callbacks = []
+
+    def close(self) -> None:
+        """stop the deadline timer of a finished turn"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._callbacks = []
@@ -1,3 +1,5 @@
+from typing import Optional
+
 
 class ResponseFormatError(Exception):
     """Exception raised when the response format is not as expected"""
@@ -9,4 +11,14 @@ class ResponseNotValidError(Exception):
 
 class ResponseRepeatError(Exception):
     """Exception raised when the response is repeated"""
+    pass
+
+class CircuitOpenError(Exception):
+    """Exception raised without calling a provider whose circuit breaker is open"""
+    def __init__(self, message: str, retry_at: Optional[float] = None):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+class TurnCancelledError(Exception):
+    """Exception raised when a turn is aborted by its deadline or its client going away"""
     pass
\ No newline at end of file
@@ -0,0 +1,158 @@
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.utils import setup_logger
+
+logger = setup_logger("FakeLLM", settings.LOG_LEVEL)
+
+# providers with a base url of this scheme are answered in process, e.g. fake://solver?error_rate=0.01
+FAKE_SCHEME = "fake"
+FAKE_BASE_URL = "http://fake-llm/v1"
+
+# policies answering a chat completion request: (messages, response_format) -> content
+FakePolicy = Callable[[List[Dict[str, Any]], Optional[Dict[str, Any]]], str]
+FAKE_POLICIES: Dict[str, FakePolicy] = {}
+
+
+def register_fake_policy(name: str) -> Callable[[FakePolicy], FakePolicy]:
+    """register a policy the fake llm can be configured with"""
+    def decorator(policy: FakePolicy) -> FakePolicy:
+        FAKE_POLICIES[name] = policy
+        return policy
+    return decorator
+
+
+class FakeLLMConfig(BaseModel):
+    """behaviour of the fake llm, every field can be set as a query parameter of the provider's base url"""
+    policy: str = "random"
+    # lognormal latency of a response, sigma 0 for a fixed latency
+    latency_median_seconds: float = Field(default=1.0, ge=0)
+    latency_sigma: float = Field(default=0.5, ge=0)
+    # token counts are estimated from the text, plus simulated hidden reasoning and prompt cache reads
+    chars_per_token: float = Field(default=4.0, gt=0)
+    reasoning_tokens_min: int = Field(default=0, ge=0)
+    reasoning_tokens_max: int = Field(default=0, ge=0)
+    cache_hit_rate: float = Field(default=0.0, ge=0, le=1)
+    # share of requests answered with a 5xx and of responses cut in half
+    error_rate: float = Field(default=0.0, ge=0, le=1)
+    malformed_rate: float = Field(default=0.0, ge=0, le=1)
+    # characters per chunk of a streamed response
+    stream_chunk_chars: int = Field(default=16, gt=0)
+    # seed of the latencies, errors and token counts
+    seed: Optional[int] = None
+
+
+def include_usage(request: Dict[str, Any]) -> bool:
+    """whether a streamed completion ends with a usage chunk"""
+    return bool((request.get("stream_options") or {}).get("include_usage"))
+
+
+class FakeLLM:
+    """OpenAI compatible chat completions answered by a policy instead of a model"""
+
+    def __init__(self, config: FakeLLMConfig):
+        if config.policy not in FAKE_POLICIES:
+            raise ValueError(f"Unknown fake llm policy {config.policy}, known: {', '.join(FAKE_POLICIES)}")
+        self.config = config
+        self.policy = FAKE_POLICIES[config.policy]
+        self.random = random.Random(config.seed)
+
+    def sample_latency(self) -> float:
+        """seconds the response takes"""
+        if self.config.latency_sigma == 0:
+            return self.config.latency_median_seconds
+        return self.config.latency_median_seconds * math.exp(self.random.gauss(0, self.config.latency_sigma))
+
+    def count_tokens(self, text: str) -> int:
+        return max(int(len(text) / self.config.chars_per_token), 1)
+
+    def complete(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """status and body of the answer to a chat completion request"""
+        if self.random.random() < self.config.error_rate:
+            return 503, {"error": {"message": "fake llm overloaded", "type": "server_error", "code": None}}
+        messages = request.get("messages") or []
+        try:
+            content = self.policy(messages, request.get("response_format"))
+        except Exception as e:
+            logger.warning(f"fake llm policy {self.config.policy} failed: {e}")
+            content = "I cannot answer that."
+        if self.random.random() < self.config.malformed_rate:
+            content = content[:len(content) // 2]
+
+        prompt_tokens = self.count_tokens("".join(str(message.get("content") or "") for message in messages))
+        reasoning_tokens = self.random.randint(self.config.reasoning_tokens_min, max(self.config.reasoning_tokens_min, self.config.reasoning_tokens_max))
+        completion_tokens = self.count_tokens(content) + reasoning_tokens
+        return 200, {
+            "id": f"chatcmpl-fake-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": int(prompt_tokens * self.config.cache_hit_rate)},
+                "completion_tokens_details": {"reasoning_tokens": reasoning_tokens},
+            },
+        }
+
+    def stream(self, body: Dict[str, Any], include_usage: bool) -> Iterator[bytes]:
+        """server sent events of a completion body, the content split into chunks"""
+        content = body["choices"][0]["message"]["content"]
+        chunk_chars = self.config.stream_chunk_chars
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": content[i:i + chunk_chars]} for i in range(0, len(content), chunk_chars)]
+        base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"], "model": body["model"]}
+        for i, delta in enumerate(deltas):
+            finish_reason = "stop" if i == len(deltas) - 1 else None
+            chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        if include_usage:
+            yield f"data: {json.dumps({**base, 'choices': [], 'usage': body['usage']})}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """httpx transport handler, sleeping through the sampled latency"""
+        if not request.url.path.endswith("/chat/completions"):
+            return httpx.Response(404, json={"error": {"message": f"{request.url.path} not served by the fake llm"}})
+        payload = json.loads(request.content or b"{}")
+        time.sleep(self.sample_latency())
+        status, body = self.complete(payload)
+        if status != 200 or not payload.get("stream"):
+            return httpx.Response(status, json=body)
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=b"".join(self.stream(body, include_usage(payload)))
+        )
+
+
+    def create_http_client(self, timeout: float) -> httpx.Client:
+        """http client whose requests are answered by this fake llm in process"""
+        return httpx.Client(transport=httpx.MockTransport(self.handle), timeout=timeout)
+
+
+# one fake llm per base url, so that the clients of every turn draw from the same random sequence
+_fake_llms: Dict[str, FakeLLM] = {}
+_fake_llms_lock = threading.Lock()
+
+
+def get_fake_llm(base_url: str) -> Optional[FakeLLM]:
+    """fake llm of a fake:// base url, None for any other url"""
+    parts = urlsplit(base_url)
+    if parts.scheme != FAKE_SCHEME:
+        return None
+    with _fake_llms_lock:
+        if base_url not in _fake_llms:
+            config = FakeLLMConfig(policy=parts.netloc or "random", **dict(parse_qsl(parts.query)))
+            _fake_llms[base_url] = FakeLLM(config)
+        return _fake_llms[base_url]
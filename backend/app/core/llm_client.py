@@ -1,9 +1,16 @@
 import time
+import uuid
 from typing import Dict, List, Any, Optional
 
 from openai import OpenAI
 from openai.types.chat import ChatCompletion
 
+from app.core.config import settings
+from app.core.circuit_breaker import circuit_breakers
+from app.core.deadline import TurnDeadline
+from app.core.fake_llm import FAKE_BASE_URL, get_fake_llm
+from app.core.exceptions import TurnCancelledError
+from app.core.telemetry import llm_call_recorder
 from app.models.provider import Provider
 from app.models.llm import LLMPublic, LLMCompleteResponse
 
@@ -16,16 +23,37 @@ class LLMClient:
         provider_info: Provider, 
         reasoning_effort: Optional[str] = None, 
         json_format: Optional[bool] = None,
+        session_id: Optional[uuid.UUID] = None,
+        deadline: Optional[TurnDeadline] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
     ) -> None:
-        """initialize the base client"""
+        """
+        initialize the base client, the calls of a cancelled `deadline` are abandoned and its client closed.
+        `timeout` and `max_retries` of a request default to LLM_REQUEST_TIMEOUT_SECONDS and the sdk's retries.
+        """
         self.model_info = model_info
         self.provider_info = provider_info
         self.reasoning_effort = reasoning_effort
         self.json_format = json_format
-        client_kwargs = {"api_key": provider_info.api_key}
+        # game session the calls are recorded for
+        self.session_id = session_id
+        timeout = timeout or settings.LLM_REQUEST_TIMEOUT_SECONDS
+        client_kwargs = {"api_key": provider_info.api_key, "timeout": timeout}
+        if max_retries is not None:
+            client_kwargs["max_retries"] = max_retries
         if provider_info.base_url:
             client_kwargs["base_url"] = provider_info.base_url
+            # a fake:// provider is answered in process, for load tests without llm costs
+            fake_llm = get_fake_llm(provider_info.base_url)
+            if fake_llm is not None:
+                client_kwargs["base_url"] = FAKE_BASE_URL
+                client_kwargs["http_client"] = fake_llm.create_http_client(timeout)
         self.client = OpenAI(**client_kwargs)
+        self.deadline = deadline
+        if deadline is not None:
+            # a closed client makes the sdk give up on retries of an abandoned call
+            deadline.on_cancel(self.client.close)
 
     def _get_structured_response(self, response: ChatCompletion, time_used: float, model: Optional[LLMPublic] = None) -> LLMCompleteResponse:
         """Get structured response from OpenAI API"""
@@ -39,11 +67,65 @@ class LLMClient:
             "model_level_reasoning_content": getattr(response.choices[0].message, 'reasoning_content', None),
             "input_tokens": response.usage.prompt_tokens,
             "output_tokens": response.usage.completion_tokens,
+            "cached_tokens": self._get_cached_tokens(response.usage) or 0,
+            "reasoning_tokens": self._get_reasoning_tokens(response.usage) or 0,
         })
         return model_outputs
 
-    def get_complete(self, messages: List[Dict[str, Any]], model: Optional[LLMPublic] = None, **kwargs) -> LLMCompleteResponse:
-        """use the API to generate a completion"""
+    @staticmethod
+    def _get_cached_tokens(usage: Any) -> Optional[int]:
+        """prompt tokens served from the provider's prompt cache, None if not reported"""
+        return getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+
+    @staticmethod
+    def _get_reasoning_tokens(usage: Any) -> Optional[int]:
+        """hidden reasoning tokens included in the completion tokens, None if not reported"""
+        return getattr(getattr(usage, "completion_tokens_details", None), "reasoning_tokens", None)
+
+    def _record_call(
+        self,
+        model: Optional[LLMPublic],
+        turn_num: Optional[int],
+        attempt: int,
+        time_used: float,
+        response: Optional[ChatCompletion] = None,
+        error: Optional[Exception] = None
+    ) -> None:
+        """Queue the telemetry record of one API call"""
+        usage = getattr(response, "usage", None)
+        llm_call_recorder.record(
+            session_id=self.session_id,
+            turn_num=turn_num,
+            attempt=attempt,
+            llm_id=model.id if model else self.model_info.id,
+            llm_name=model.name if model else self.model_info.name,
+            provider_id=self.provider_info.id,
+            provider_name=self.provider_info.display_name,
+            latency=time_used,
+            input_tokens=getattr(usage, "prompt_tokens", None),
+            output_tokens=getattr(usage, "completion_tokens", None),
+            cached_tokens=self._get_cached_tokens(usage),
+            reasoning_tokens=self._get_reasoning_tokens(usage),
+            # the sdk only surfaces the status of failed requests
+            http_status=200 if response is not None else getattr(error, "status_code", None),
+            error_class=type(error).__name__ if error is not None else None,
+        )
+
+    def _probe(self, model_name: str) -> None:
+        """one token completion, only checking that the provider answers"""
+        self.client.with_options(timeout=settings.LLM_BREAKER_PROBE_TIMEOUT_SECONDS, max_retries=0).chat.completions.create(
+            model=model_name, messages=[{"role": "user", "content": "ping"}], max_tokens=1
+        )
+
+    def get_complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: Optional[LLMPublic] = None,
+        turn_num: Optional[int] = None,
+        attempt: int = 1,
+        **kwargs
+    ) -> LLMCompleteResponse:
+        """use the API to generate a completion, `turn_num` and `attempt` only label the recorded call"""
         try:
             params = {
                 "model": model.name if model else self.model_info.name, 
@@ -52,13 +134,38 @@ class LLMClient:
             }
             if self.reasoning_effort:
                 params["reasoning_effort"] = self.reasoning_effort
-            if self.json_format:
+            if self.json_format and "response_format" not in params:
                 params["response_format"] = {"type": "json_object"}
 
+            if self.deadline is not None:
+                self.deadline.check()
+            breaker = None
+            if circuit_breakers.enabled:
+                breaker = circuit_breakers.get(self.provider_info.id, self.provider_info.display_name, params["model"])
+                breaker.before_call(lambda: self._probe(params["model"]))
+
             start_time = time.time()
-            response = self.client.chat.completions.create(**params)
+            try:
+                if self.deadline is not None:
+                    response = self.deadline.run(self.client.chat.completions.create, **params)
+                else:
+                    response = self.client.chat.completions.create(**params)
+            except Exception as e:
+                error = e
+                if self.deadline is not None and self.deadline.cancelled:
+                    # the call failed because the turn closed its connection, the provider is not to blame
+                    error = TurnCancelledError(self.deadline.reason)
+                self._record_call(model, turn_num, attempt, time.time() - start_time, error=error)
+                if breaker is not None:
+                    breaker.record(time.time() - start_time, error)
+                if error is e:
+                    raise
+                raise error from e
             end_time = time.time()
             time_used = end_time - start_time
+            self._record_call(model, turn_num, attempt, time_used, response=response)
+            if breaker is not None:
+                breaker.record(time_used)
             if response.choices:
                 return self._get_structured_response(response, time_used, model)
             else:
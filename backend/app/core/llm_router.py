@@ -0,0 +1,197 @@
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.circuit_breaker import is_provider_error
+from app.core.config import settings
+from app.core.deadline import TurnDeadline
+from app.core.exceptions import CircuitOpenError
+from app.core.llm_client import LLMClient
+from app.models.llm import LLMCompleteResponse, LLMPublic
+from app.models.provider import Provider
+from app.utils import setup_logger
+
+logger = setup_logger("LLMRouter", settings.LOG_LEVEL)
+
+# an endpoint is a model name served by a provider
+EndpointKey = Tuple[uuid.UUID, str]
+
+
+class EndpointLatencyTracker:
+    """Recent latencies of every llm endpoint, shared by all clients of the process"""
+
+    def __init__(self, window: int, min_samples: int):
+        self.window = max(window, 1)
+        self.min_samples = max(min_samples, 1)
+        self._samples: Dict[EndpointKey, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: EndpointKey, latency: float) -> None:
+        """Add the latency of a finished call"""
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(latency)
+
+    def record_failure(self, key: EndpointKey) -> None:
+        """A failed call counts as a timed out one, so failing endpoints sink in the routing order"""
+        self.record(key, settings.LLM_REQUEST_TIMEOUT_SECONDS)
+
+    def percentiles(self, key: EndpointKey) -> Optional[Tuple[float, float]]:
+        """p50 and p95 latency of the endpoint, None while it has too few samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(0.5 * (len(samples) - 1))], samples[int(0.95 * (len(samples) - 1))]
+
+
+endpoint_latency = EndpointLatencyTracker(settings.LLM_ROUTING_LATENCY_WINDOW, settings.LLM_ROUTING_MIN_SAMPLES)
+
+# endpoint calls of every router, a hedge that lost the race finishes in the background and its answer is dropped
+endpoint_executor = ThreadPoolExecutor(max_workers=settings.LLM_ROUTING_MAX_WORKERS, thread_name_prefix="llm-endpoint")
+
+
+class LLMRouter(LLMClient):
+    """LLM client of an alias: routes each call to the fastest of equivalent endpoints, failing over and hedging"""
+
+    def __init__(
+        self,
+        endpoints: List[Tuple[LLMPublic, Provider]],
+        reasoning_effort: Optional[str] = None,
+        json_format: Optional[bool] = None,
+        session_id: Optional[uuid.UUID] = None,
+        hedge_after_seconds: Optional[float] = None,
+        deadline: Optional[TurnDeadline] = None,
+    ) -> None:
+        """
+        `endpoints` in configured order, the first one is the alias itself.
+        failing over is up to the router, so an endpoint is asked once, for at most the attempt timeout.
+        """
+        attempt_timeout = settings.LLM_ROUTING_ATTEMPT_TIMEOUT_SECONDS
+        if deadline is not None and deadline.remaining() is not None:
+            attempt_timeout = min(attempt_timeout, max(deadline.remaining(), 1.0))
+        self.clients = [
+            LLMClient(
+                model_info, provider_info, reasoning_effort, json_format, session_id, deadline,
+                timeout=attempt_timeout, max_retries=0
+            )
+            for model_info, provider_info in endpoints
+        ]
+        self.model_info = self.clients[0].model_info
+        self.provider_info = self.clients[0].provider_info
+        self.reasoning_effort = reasoning_effort
+        self.json_format = json_format
+        self.session_id = session_id
+        self.client = self.clients[0].client
+        self.hedge_after_seconds = hedge_after_seconds
+        self.deadline = deadline
+
+    @staticmethod
+    def _endpoint_key(client: LLMClient) -> EndpointKey:
+        return client.provider_info.id, client.model_info.name
+
+    def _route(self) -> List[LLMClient]:
+        """
+        endpoints by recent p50, endpoints without enough samples keep their configured order behind them.
+        a share of the calls goes to one of those first, otherwise they would never get measured.
+        """
+        def rank(client: LLMClient) -> float:
+            latency = endpoint_latency.percentiles(self._endpoint_key(client))
+            return latency[0] if latency else float("inf")
+        ranks = {client: rank(client) for client in self.clients}
+        routed = sorted(self.clients, key=ranks.__getitem__)
+        unmeasured = [client for client in routed[1:] if ranks[client] == float("inf")]
+        if unmeasured and random.random() < settings.LLM_ROUTING_EXPLORE_RATE:
+            explored = random.choice(unmeasured)
+            routed.remove(explored)
+            routed.insert(0, explored)
+        return routed
+
+    def _hedge_delay(self, client: LLMClient) -> Optional[float]:
+        """seconds to wait on `client` before asking the next endpoint too, None without hedging"""
+        if self.hedge_after_seconds is None:
+            return None
+        latency = endpoint_latency.percentiles(self._endpoint_key(client))
+        return latency[1] if latency else self.hedge_after_seconds
+
+    def _on_done(self, client: LLMClient, future: Future) -> None:
+        """
+        record the latency of every call, including hedges that lost the race.
+        a call its open breaker refused never reached the endpoint and has no latency.
+        """
+        error = future.exception()
+        if error is None:
+            endpoint_latency.record(self._endpoint_key(client), future.result().time_used)
+        elif is_provider_error(error) and not isinstance(error, CircuitOpenError):
+            endpoint_latency.record_failure(self._endpoint_key(client))
+
+    def get_complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: Optional[LLMPublic] = None,
+        turn_num: Optional[int] = None,
+        attempt: int = 1,
+        **kwargs
+    ) -> LLMCompleteResponse:
+        """complete on the routed endpoints, `time_used` of the response is the time the caller waited"""
+        if model is not None or len(self.clients) == 1:
+            return self.clients[0].get_complete(messages, model, turn_num, attempt, **kwargs)
+
+        start_time = time.time()
+        pending = deque(self._route())
+        running: Dict[Future, LLMClient] = {}
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        def submit(client: LLMClient) -> None:
+            future = endpoint_executor.submit(client.get_complete, messages, None, turn_num, attempt, **kwargs)
+            future.add_done_callback(lambda done: self._on_done(client, done))
+            running[future] = client
+
+        while running or pending:
+            if not running:
+                submit(pending.popleft())
+            timeout = None
+            if not hedged and pending and len(running) == 1:
+                timeout = self._hedge_delay(next(iter(running.values())))
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                client = pending.popleft()
+                logger.info(
+                    f"hedging {self.model_info.name} on {client.provider_info.display_name} after {timeout:.1f}s"
+                )
+                submit(client)
+                continue
+            # an answer wins over an error finishing at the same time
+            for future in sorted(done, key=lambda future: future.exception() is not None):
+                client = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    return future.result().model_copy(update={"time_used": time.time() - start_time})
+                if not is_provider_error(error):
+                    raise error
+                logger.warning(
+                    f"{client.model_info.name} on {client.provider_info.display_name} failed, failing over: {error}"
+                )
+                last_error = error
+        raise last_error
+
+
+def create_llm_client(
+    endpoints: List[Tuple[LLMPublic, Provider]],
+    reasoning_effort: Optional[str] = None,
+    session_id: Optional[uuid.UUID] = None,
+    hedge_after_seconds: Optional[float] = None,
+    deadline: Optional[TurnDeadline] = None,
+) -> LLMClient:
+    """client of an llm, a plain one unless the llm is an alias of several endpoints"""
+    if len(endpoints) == 1:
+        model_info, provider_info = endpoints[0]
+        return LLMClient(model_info, provider_info, reasoning_effort, session_id=session_id, deadline=deadline)
+    return LLMRouter(
+        endpoints, reasoning_effort, session_id=session_id, hedge_after_seconds=hedge_after_seconds, deadline=deadline
+    )
@@ -0,0 +1,134 @@
+import re
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import Table, text
+from sqlmodel import Session, SQLModel
+
+from app.core.config import settings
+from app.utils import setup_logger
+
+logger = setup_logger("partitions", settings.LOG_LEVEL)
+
+# monthly partitions are named <table>_pYYYYMM
+PARTITION_NAME_PATTERN = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def as_utc(value: datetime) -> datetime:
+    """`value` in UTC, naive values are taken as UTC already"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def month_start(value: datetime, months: int = 0) -> datetime:
+    """first moment in UTC of the month `months` after the month of `value`"""
+    value = as_utc(value)
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def get_partitioned_tables() -> List[Table]:
+    """tables declared with `postgresql_partition_by`"""
+    return [
+        table for table in SQLModel.metadata.sorted_tables
+        if table.dialect_options["postgresql"].get("partition_by")
+    ]
+
+
+def is_partitioned(session: Session, table_name: str) -> bool:
+    """whether the table exists in the database as a partitioned table"""
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    statement = text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table_name)")
+    return session.execute(statement, {"table_name": table_name}).scalar_one_or_none() == "p"
+
+
+def list_partitions(session: Session, table_name: str) -> List[Tuple[str, datetime, datetime]]:
+    """monthly partitions of a table with their [lower, upper) created_at bounds, oldest first"""
+    statement = text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table_name)"
+    )
+    partitions = []
+    for (partition_name,) in session.execute(statement, {"table_name": table_name}).all():
+        match = PARTITION_NAME_PATTERN.search(partition_name)
+        if match:
+            lower = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+            partitions.append((partition_name, lower, month_start(lower, 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def ensure_partitions(session: Session, now: Optional[datetime] = None, months_ahead: Optional[int] = None) -> None:
+    """create the default partition and the monthly partitions from this month up to `months_ahead` months ahead"""
+    now = now or datetime.now(timezone.utc)
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    for table in get_partitioned_tables():
+        if not is_partitioned(session, table.name):
+            logger.warning(f"{table.name} is not a partitioned table, run the migrations to convert it")
+            continue
+        # rows outside of every monthly range (e.g. migrated from before partitioning) land in the default partition
+        session.execute(text(f'CREATE TABLE IF NOT EXISTS "{table.name}_default" PARTITION OF "{table.name}" DEFAULT'))
+        for months in range(months_ahead + 1):
+            lower = month_start(now, months)
+            create_partition(session, table, lower, month_start(lower, 1))
+        session.commit()
+        logger.info(f"ensured partitions of {table.name} up to {month_start(now, months_ahead):%Y-%m}")
+
+
+def create_partition(session: Session, table: Table, lower: datetime, upper: datetime) -> None:
+    """
+    create the monthly partition of [lower, upper) unless it exists. postgres refuses a new range while the default
+    partition holds rows in it, so those are moved over with the default partition detached.
+    """
+    partition_name = f"{table.name}_p{lower:%Y%m}"
+    if session.execute(text("SELECT to_regclass(:name)"), {"name": partition_name}).scalar_one_or_none() is not None:
+        return
+    default_name = f"{table.name}_default"
+    bounds = {"lower": lower, "upper": upper}
+    in_range = "created_at >= :lower AND created_at < :upper"
+    create = (
+        f'CREATE TABLE "{partition_name}" PARTITION OF "{table.name}" '
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+    stray_rows = session.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{default_name}" WHERE {in_range})'), bounds).scalar()
+    if not stray_rows:
+        session.execute(text(create))
+        return
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    session.execute(text(f'ALTER TABLE "{table.name}" DETACH PARTITION "{default_name}"'))
+    session.execute(text(create))
+    session.execute(text(
+        f'INSERT INTO "{partition_name}" ({columns}) SELECT {columns} FROM "{default_name}" WHERE {in_range}'
+    ), bounds)
+    moved = session.execute(text(f'DELETE FROM "{default_name}" WHERE {in_range}'), bounds).rowcount
+    session.execute(text(f'ALTER TABLE "{table.name}" ATTACH PARTITION "{default_name}" DEFAULT'))
+    logger.info(f"created partition {partition_name}, moved {moved} rows from {default_name}")
+
+
+def drop_partitions_before(
+    session: Session,
+    table_name: str,
+    created_before: datetime,
+    detach_only: bool = False,
+    before_drop: Optional[Callable[[datetime, datetime], None]] = None,
+) -> List[str]:
+    """
+    detach (and drop unless `detach_only`) the monthly partitions holding only rows created before `created_before`.
+    `before_drop(lower, upper)` runs first for each partition, to clean up rows referencing it,
+    in the transaction that removes the partition.
+    """
+    removed = []
+    for partition_name, lower, upper in list_partitions(session, table_name):
+        if upper > as_utc(created_before):
+            break
+        if before_drop is not None:
+            before_drop(lower, upper)
+        session.execute(text(f'ALTER TABLE "{table_name}" DETACH PARTITION "{partition_name}"'))
+        if not detach_only:
+            session.execute(text(f'DROP TABLE "{partition_name}"'))
+        session.commit()
+        removed.append(partition_name)
+        logger.info(f"{'detached' if detach_only else 'dropped'} partition {partition_name}")
+    return removed
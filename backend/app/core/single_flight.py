@@ -0,0 +1,42 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set
+
+
+class SingleFlight:
+    """Concurrent calls under the same key share one execution, started by the first of them"""
+
+    def __init__(self) -> None:
+        # thread safe futures, so that callers on other event loops can wait for them too
+        self._flights: Dict[Hashable, Future[Any]] = {}
+        self._lock = threading.Lock()
+        # running executions, the event loop only keeps weak references to its tasks
+        self._tasks: Set[asyncio.Task[Any]] = set()
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        await `fn`, or the execution already running under `key`.
+        the execution runs as a task of its own, so no caller going away cancels it for the others,
+        the one that started it included.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Future()
+                task = asyncio.ensure_future(fn())
+                self._tasks.add(task)
+                task.add_done_callback(lambda done: self._finish(key, flight, done))
+        return await asyncio.shield(asyncio.wrap_future(flight))
+
+    def _finish(self, key: Hashable, flight: "Future[Any]", task: "asyncio.Task[Any]") -> None:
+        """hand the outcome of an execution to its callers"""
+        self._tasks.discard(task)
+        with self._lock:
+            del self._flights[key]
+        if task.cancelled():
+            flight.cancel()
+        elif task.exception() is not None:
+            flight.set_exception(task.exception())
+        else:
+            flight.set_result(task.result())
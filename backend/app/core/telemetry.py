@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.llm_call import LLMCall
+from app.utils import setup_logger
+
+logger = setup_logger("LLMCallRecorder", settings.LOG_LEVEL)
+
+
+class LLMCallRecorder:
+    """Queue of llm call records, written to the database in batches by a background thread"""
+
+    def __init__(self, enabled: bool, batch_size: int, flush_interval_seconds: float, max_queue_size: int):
+        self.enabled = enabled
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.dropped = 0
+
+        self._queue: queue.Queue[Dict[str, Any]] = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def record(self, **fields: Any) -> None:
+        """Queue a call record, never waits: records are dropped while the queue is full"""
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(LLMCall(**fields).model_dump())
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped % 1000 == 1:
+                logger.warning(f"llm call queue full, {dropped} records dropped so far")
+
+    def flush(self) -> None:
+        """Write every queued record"""
+        while True:
+            batch = self._take_batch(timeout=None)
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self) -> None:
+        """Stop the writer and write what is still queued"""
+        self._stopped.set()
+        if self._writer is not None:
+            self._writer.join()
+        self.flush()
+
+    def _ensure_writer(self) -> None:
+        """Start the background writer on first use"""
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="llm-call-writer", daemon=True)
+                self._writer.start()
+
+    def _run_writer(self) -> None:
+        """Background loop writing a batch once it is full or a flush interval passed"""
+        while not self._stopped.is_set():
+            batch = self._take_batch(timeout=self.flush_interval_seconds)
+            if batch:
+                self._write(batch)
+
+    def _take_batch(self, timeout: Optional[float]) -> List[Dict[str, Any]]:
+        """Take up to a batch of records, waiting up to `timeout` for the batch to fill (not at all if none)"""
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + (timeout or 0)
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            with Session(engine) as db_session:
+                db_session.execute(insert(LLMCall), batch)
+                db_session.commit()
+        except Exception as e:
+            logger.error(f"failed to write {len(batch)} llm call records: {e}")
+
+
+llm_call_recorder = LLMCallRecorder(
+    enabled=settings.LLM_CALL_TELEMETRY_ENABLED,
+    batch_size=settings.LLM_CALL_TELEMETRY_BATCH_SIZE,
+    flush_interval_seconds=settings.LLM_CALL_TELEMETRY_FLUSH_INTERVAL_SECONDS,
+    max_queue_size=settings.LLM_CALL_TELEMETRY_QUEUE_SIZE,
+)
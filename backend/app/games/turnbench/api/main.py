@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 
-from app.games.turnbench.api.routes import sessions, setups
+from app.games.turnbench.api.routes import sessions, setups, stats
 
 turnbench_api_router = APIRouter()
 turnbench_api_router.include_router(sessions.router)
-turnbench_api_router.include_router(setups.router)
\ No newline at end of file
+turnbench_api_router.include_router(setups.router)
+turnbench_api_router.include_router(stats.router)
\ No newline at end of file
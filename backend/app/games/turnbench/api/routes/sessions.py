@@ -1,11 +1,21 @@
+import asyncio
+import hashlib
+import time
 import uuid
-from typing import Optional
+from typing import Annotated, Optional
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
 
 from app.core.config import settings
-from app.core.llm_client import LLMClient
+from app.core.db import engine
+from app.core.deadline import TurnDeadline
+from app.core.exceptions import CircuitOpenError, TurnCancelledError
+from app.core.llm_router import create_llm_client
+from app.core.single_flight import SingleFlight
 from app.utils import setup_logger
 from app.api.deps import SessionDep
 from app.models.llm import LLMPublic
@@ -13,22 +23,35 @@ from app.services.llm_service import LLMService
 from app.games.turnbench.config import GAME_NAME
 from app.games.turnbench.game_loop.game_loop_service import GameLoopService
 from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.game_session.session_export import CONTENT_TYPES, check_format_available
+from app.games.turnbench.game_session.session_cache import session_cache
 from app.games.turnbench.game_setup.setup_service import SetupService
-from app.games.turnbench.llm.prompt_manager import prompt_manager
+# registers the turnbench policies of fake:// llm providers
+from app.games.turnbench.llm import fake_policies  # noqa: F401
 from app.games.turnbench.verifier.verifier_manager import verifier_manager
+from app.games.turnbench.models.search import SearchTurnsRequest, SearchTurnsResponse
 from app.games.turnbench.models.session import (
     GameSessionPublic,
-    GameSessionCreate,
     GameSessionUpdate,
     GetSessionsResponse,
     GetSessionResponse,
     GetSessionTurnHistoryResponse,
+    GetTurnReasoningResponse,
+    ExportSessionsRequest,
+    ListSessionsRequest,
+    SessionFilter,
+    UpdateSessionsRequest,
+    SessionsCountResponse,
     CreateSessionRequest, 
     CreateSessionResponse,
+    CreateSessionsRequest,
+    CreateSessionsResponse,
     UpdateSessionRequest,
     UpdateSessionResponse,
     CopySessionRequest,
     CopySessionResponse,
+    ForkSessionsRequest,
+    ForkSessionsResponse,
     PlayTurnRequest,
     PlayTurnResponse,
     PlayTurnData,
@@ -36,38 +59,73 @@ from app.games.turnbench.models.session import (
     SaveSessionResponse,
     ReloadSessionResponse
 )
-from app.games.turnbench.models.setup import GameSetupDetail
 
 router = APIRouter(prefix=f"/{GAME_NAME}/sessions", tags=[f"{GAME_NAME}-sessions"])
 logger = setup_logger(f"{GAME_NAME}-sessions-router", settings.LOG_LEVEL)
+play_turn_flights = SingleFlight()
 
 @router.get("", response_model=GetSessionsResponse)
 def get_sessions(
-    db_session: SessionDep,
-    page: int,
-    page_size: int,
-    llm_id: Optional[uuid.UUID] = None,
-    setup_id: Optional[uuid.UUID] = None
+    list_request: Annotated[ListSessionsRequest, Query()],
+    db_session: SessionDep
 ):
     try:
         session_service = SessionService(db_session)
-        sessions, total = session_service.get_sessions(page, page_size, llm_id, setup_id)
+        sessions, total = session_service.get_sessions(list_request)
         logger.info(f"get {len(sessions)} sessions")
         return GetSessionsResponse(
             data=[GameSessionPublic(**session.model_dump()) for session in sessions],
             count=total,
-            page=page,
-            page_size=page_size
+            page=list_request.page,
+            page_size=list_request.page_size
         )
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting sessions: {e}")
 
+@router.get("/export")
+def export_sessions(export_request: Annotated[ExportSessionsRequest, Query()]):
+    check_format_available(export_request.format)
+
+    def content():
+        # the request scoped db session is closed before the response streams, the export uses its own
+        with Session(engine) as db_session:
+            session_service = SessionService(db_session)
+            yield from session_service.export_sessions(export_request, settings.TURNBENCH_EXPORT_BATCH_SIZE)
+        logger.info(f"export {export_request.kind} as {export_request.format} success")
+
+    filename = f"{GAME_NAME}_{export_request.kind}.{export_request.format}"
+    return StreamingResponse(
+        content(),
+        media_type=CONTENT_TYPES[export_request.format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/search", response_model=SearchTurnsResponse)
+def search_turns(
+    search_request: Annotated[SearchTurnsRequest, Query()],
+    db_session: SessionDep
+):
+    try:
+        session_service = SessionService(db_session)
+        hits = session_service.search_turns(search_request)
+        logger.info(f"search turns for {search_request.q!r}: {len(hits)} hits")
+        return SearchTurnsResponse(data=hits)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching turns: {e}")
+
 @router.get("/{session_id}", response_model=GetSessionResponse)
 def get_specific_session(
     session_id: uuid.UUID,
     db_session: SessionDep
 ):
     try:
+        cached_state = session_cache.peek(session_id)
+        if cached_state is not None:
+            return GetSessionResponse(data=GameSessionPublic(**cached_state))
         session_service = SessionService(db_session)
         session = session_service.get_session_by_id(session_id)
         logger.info(f"get session {session_id} success")
@@ -81,6 +139,9 @@ def get_session_turn_history(
     db_session: SessionDep
 ):
     try:
+        cached_state = session_cache.peek(session_id)
+        if cached_state is not None:
+            return GetSessionTurnHistoryResponse(data=cached_state["turn_result_history"])
         session_service = SessionService(db_session)
         session = session_service.get_session_by_id(session_id)
         logger.info(f"get session {session_id} turn history success")
@@ -88,6 +149,20 @@ def get_session_turn_history(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting session turn history: {e}")
 
+@router.get("/reasoning/{reasoning_hash}", response_model=GetTurnReasoningResponse)
+def get_turn_reasoning(
+    reasoning_hash: str,
+    db_session: SessionDep
+):
+    try:
+        session_service = SessionService(db_session)
+        reasoning = session_service.get_turn_reasoning(reasoning_hash)
+        return GetTurnReasoningResponse(data=reasoning)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting reasoning {reasoning_hash}: {e}")
+
 @router.post("", response_model=CreateSessionResponse)
 def create_session(
     session_request: CreateSessionRequest,
@@ -97,29 +172,7 @@ def create_session(
         session_service = SessionService(db_session)
         setup_service = SetupService(db_session)
         setup_info = setup_service.get_setup_public_by_setup_id(session_request.setup_id)
-        
-        verifier_details = verifier_manager.get_verifier_by_ids(setup_info.verifier_ids)
-        verifier_descriptions = verifier_manager.get_verifier_descriptions(verifier_details)
-
-        game_info_detail = GameSetupDetail(
-            **setup_info.model_dump(), 
-            verifier_details=[vd.model_dump() for vd in verifier_details]
-        )
-
-        game_info_detail_json = game_info_detail.model_dump()
-        game_info_detail_json["id"] = str(game_info_detail.id)
-        game_info_detail_json["created_at"] = game_info_detail.created_at.isoformat()
-        game_info_detail_json["updated_at"] = game_info_detail.updated_at.isoformat()
-
-        base_prompts = prompt_manager.build_prompt_model(mode=session_request.mode)
-
-        session_create = GameSessionCreate(
-            **session_request.model_dump(),
-            game_info=game_info_detail_json,
-            verifier_descriptions=verifier_descriptions,
-            base_game_prompts=base_prompts.model_dump()
-        )
-        session_service.add_system_message(session_create)
+        session_create = session_service.build_session_create(session_request, setup_info)
 
         game_session = session_service.create_session(session_create)
         
@@ -128,6 +181,53 @@ def create_session(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating session: {e}")
 
+@router.post("/batch", response_model=CreateSessionsResponse)
+def create_sessions(
+    sessions_request: CreateSessionsRequest,
+    db_session: SessionDep
+):
+    try:
+        session_service = SessionService(db_session)
+        session_ids = session_service.create_sessions(sessions_request.data)
+        logger.info(f"create {len(session_ids)} sessions success")
+        return CreateSessionsResponse(data=session_ids)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating sessions: {e}")
+
+@router.patch("", response_model=SessionsCountResponse)
+def update_sessions(
+    update_request: UpdateSessionsRequest,
+    db_session: SessionDep
+):
+    try:
+        session_service = SessionService(db_session)
+        updated = session_service.update_sessions_by_filter(
+            update_request.filter, update_request.update, settings.BULK_OPERATION_BATCH_SIZE
+        )
+        logger.info(f"update {updated} sessions success")
+        return SessionsCountResponse(data=updated)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating sessions: {e}")
+
+@router.delete("", response_model=SessionsCountResponse)
+def delete_sessions(
+    session_filter: Annotated[SessionFilter, Query()],
+    db_session: SessionDep
+):
+    try:
+        session_service = SessionService(db_session)
+        deleted = session_service.delete_sessions_by_filter(session_filter, settings.BULK_OPERATION_BATCH_SIZE)
+        logger.info(f"delete {deleted} sessions success")
+        return SessionsCountResponse(data=deleted)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting sessions: {e}")
+
 @router.put("/{session_id}", response_model=UpdateSessionResponse)
 def update_session(
     session_id: uuid.UUID,
@@ -136,15 +236,16 @@ def update_session(
 ):
     try:
         session_service = SessionService(db_session)
-        session = session_service.get_session_by_id(session_id)
-        if update_request.new_turn_data:
-            session_service.update_turn_result(session, update_request.new_turn_data)
-        session_service.update_session(
-            session_id, 
-            GameSessionUpdate(
-                **session.model_dump(), 
+        with session_cache.exclusive(session_id, db_session):
+            session = session_service.get_session_by_id(session_id)
+            if update_request.new_turn_data:
+                session_service.update_turn_result(session, update_request.new_turn_data)
+            session_service.update_session(
+                session_id, 
+                GameSessionUpdate(
+                    **session.model_dump(), 
+                )
             )
-        )
         return UpdateSessionResponse(data=session.id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating session: {e}")
@@ -157,38 +258,195 @@ def copy_session(
 ):
     try:
         session_service = SessionService(db_session)
-        source_session = session_service.get_session_by_id(session_id)
         new_llm = None
         if copy_request.new_llm_id:
             new_llm = LLMService(db_session).get_llm_by_id(copy_request.new_llm_id)
-        new_session = session_service.copy_session(source_session, new_llm)
-        if copy_request.new_turn_data:
-            session_service.update_turn_result(new_session, copy_request.new_turn_data)
-            session_service.update_session(new_session.id, GameSessionUpdate(**new_session.model_dump()))
+        with session_cache.exclusive(session_id, db_session):
+            source_session = session_service.get_session_by_id(session_id)
+            new_session_id = session_service.copy_session(source_session, new_llm, copy_request.new_turn_data)
 
-        logger.info(f"copy session {new_session.id} from {session_id} success")
-        return CopySessionResponse(data=new_session.id)
+        logger.info(f"copy session {new_session_id} from {session_id} success")
+        return CopySessionResponse(data=new_session_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error copying session: {e}")
 
-@router.post("/{session_id}/play/turn", response_model=PlayTurnResponse)
-def play_turn(
+@router.post("/{session_id}/forks", response_model=ForkSessionsResponse)
+def fork_sessions(
     session_id: uuid.UUID,
-    play_request: PlayTurnRequest,
+    fork_request: ForkSessionsRequest,
     db_session: SessionDep
 ):
     try:
         session_service = SessionService(db_session)
+        llm_service = LLMService(db_session)
+        for llm_id in set(fork_request.llm_ids):
+            llm_service.get_llm_by_id(llm_id)
+        with session_cache.exclusive(session_id, db_session):
+            source_session = session_service.get_session_by_id(session_id)
+            new_session_ids = session_service.fork_sessions(source_session, fork_request.llm_ids, fork_request.new_turn_data)
+
+        logger.info(f"fork session {session_id} into {len(new_session_ids)} sessions success")
+        return ForkSessionsResponse(data=new_session_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error forking session: {e}")
+
+async def cancel_on_disconnect(request: Request, deadline: TurnDeadline) -> None:
+    """cancel the turn once its client went away"""
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.TURNBENCH_DISCONNECT_POLL_SECONDS)
+    deadline.cancel("client disconnected")
+
+def play_session_turn(
+    session_id: uuid.UUID,
+    play_request: PlayTurnRequest,
+    db_session: Session,
+    deadline: TurnDeadline,
+    idempotency_key: Optional[str] = None,
+    request_hash: Optional[str] = None
+) -> PlayTurnData:
+    """
+    play a turn, a cancelled turn is discarded before anything is written.
+    with an idempotency key, the turn already played for it is returned instead of playing another one.
+    """
+    session_service = SessionService(db_session)
+    if not session_cache.enabled:
+        # other turns of the session wait here until this one is written
+        session_service.lock_session(session_id)
+        if idempotency_key is not None:
+            turn_data = session_service.get_idempotent_turn(session_id, idempotency_key, request_hash)
+            if turn_data is not None:
+                return turn_data
         session_info = session_service.get_session_by_id_with_llm_info_and_setup_info(session_id)
         llm_info = LLMPublic(**session_info.llm.model_dump())
         provider_info = session_info.llm.provider
-        llm_client = LLMClient(llm_info, provider_info, play_request.reasoning_effort)
+        deadline.limit(llm_info.turn_deadline_seconds)
+        llm_client = create_llm_client(
+            LLMService(db_session).get_llm_endpoints(llm_info, provider_info),
+            play_request.reasoning_effort,
+            session_id,
+            llm_info.hedge_after_seconds,
+            deadline
+        )
         verifiers = verifier_manager.get_verifier_by_ids(session_info.game_info["verifier_ids"])
 
-        GameLoopService.run_turn(session_info, session_service, llm_client, verifiers, play_request.turn_num)
-        session_saved = session_service.update_session(session_id, GameSessionUpdate(**session_info.model_dump()))
+        try:
+            GameLoopService.run_turn(session_info, session_service, llm_client, verifiers, play_request.turn_num)
+            # a turn cancelled until here is discarded, once its write starts it is kept and returned
+            deadline.settle()
+        except TurnCancelledError as e:
+            db_session.rollback()
+            raise e
+        # the played turn still carries its reasoning content, the stored one only the hash
+        turn_data = PlayTurnData(**session_info.turn_result_history[-1])
+        if idempotency_key is not None:
+            # written in the transaction of the turn, so a retry sees either both or neither
+            session_service.save_idempotent_turn(session_id, idempotency_key, request_hash, turn_data, commit=False)
+        session_service.update_session(session_id, GameSessionUpdate(**session_info.model_dump()))
         logger.info(f"play turn for session {session_id} success")
-        return PlayTurnResponse(data=PlayTurnData(**session_saved.turn_result_history[-1]))
+        return turn_data
+
+    # actively played sessions stay in memory, the cache persists them in the background
+    with session_cache.checkout(session_id, db_session) as hot_session:
+        if idempotency_key is not None:
+            turn_data = session_service.get_idempotent_turn(
+                session_id, idempotency_key, request_hash,
+                session_cache.get_unwritten_idempotency_key(hot_session, idempotency_key)
+            )
+            if turn_data is not None:
+                return turn_data
+        deadline.limit(hot_session.llm_info.turn_deadline_seconds)
+        llm_client = create_llm_client(
+            LLMService(db_session).get_llm_endpoints(hot_session.llm_info, hot_session.provider_info),
+            play_request.reasoning_effort,
+            session_id,
+            hot_session.llm_info.hedge_after_seconds,
+            deadline
+        )
+        try:
+            GameLoopService.run_turn(hot_session.session, session_service, llm_client, hot_session.verifiers, play_request.turn_num)
+            # a turn cancelled until here is discarded, once its write starts it is kept and returned
+            deadline.settle()
+            turn_data = PlayTurnData(**hot_session.session.turn_result_history[-1])
+            # the cached session keeps only reasoning hashes, so write-behind does not carry reasoning content
+            session_service.store_turn_reasoning(hot_session.session)
+        except Exception as e:
+            hot_session.rollback()
+            raise e
+        turn_idempotency_key = None
+        if idempotency_key is not None:
+            turn_idempotency_key = session_service.create_idempotency_key(session_id, idempotency_key, request_hash, turn_data)
+        # the key is written with the state of its turn, until then it is replayed from the cache
+        session_cache.commit_turn(hot_session, turn_idempotency_key)
+    logger.info(f"play turn for session {session_id} success")
+    return turn_data
+
+def play_shared_session_turn(
+    session_id: uuid.UUID,
+    play_request: PlayTurnRequest,
+    deadline: TurnDeadline,
+    idempotency_key: str,
+    request_hash: str
+) -> PlayTurnData:
+    """play a turn shared by identical requests, it may outlive the request that started it and uses its own db session"""
+    with Session(engine) as db_session:
+        return play_session_turn(session_id, play_request, db_session, deadline, idempotency_key, request_hash)
+
+@router.post("/{session_id}/play/turn", response_model=PlayTurnResponse)
+async def play_turn(
+    session_id: uuid.UUID,
+    play_request: PlayTurnRequest,
+    db_session: SessionDep,
+    request: Request,
+    idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key", max_length=255)] = None
+):
+    deadline = TurnDeadline(play_request.deadline_seconds)
+    deadline.limit(settings.TURNBENCH_TURN_DEADLINE_SECONDS)
+    # a turn with an idempotency key is played to its end for a retry, even when its client went away
+    watcher = asyncio.create_task(cancel_on_disconnect(request, deadline)) if idempotency_key is None else None
+    try:
+        if idempotency_key is None:
+            turn_result = await run_in_threadpool(play_session_turn, session_id, play_request, db_session, deadline)
+        else:
+            # the deadline is not part of the request identity, a retry may well change it
+            request_hash = hashlib.sha256(play_request.model_dump_json(exclude={"deadline_seconds"}).encode("utf-8")).hexdigest()
+            while True:
+                try:
+                    # identical requests arriving while the turn is played wait for it rather than playing it again,
+                    # each one only up to its own deadline, the shared turn goes on for the others
+                    turn_result = await asyncio.wait_for(
+                        play_turn_flights.run(
+                            (session_id, idempotency_key, request_hash),
+                            lambda: run_in_threadpool(
+                                play_shared_session_turn, session_id, play_request, deadline, idempotency_key, request_hash
+                            )
+                        ),
+                        deadline.remaining()
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    # the deadline timer usually got here first, its reason is kept then
+                    deadline.cancel("deadline exceeded while waiting for the turn")
+                    deadline.check()
+                except TurnCancelledError:
+                    # the turn may have been played under the deadline of another request, this one plays it again
+                    if deadline.cancelled:
+                        raise
+        return PlayTurnResponse(data=turn_result)
+    except HTTPException as e:
+        logger.error(f"Error playing turn for session {session_id}: {e.detail}")
+        raise e
+    except TurnCancelledError as e:
+        logger.warning(f"turn of session {session_id} discarded: {e}")
+        raise HTTPException(status_code=504, detail=f"Turn cancelled: {e}")
+    except CircuitOpenError as e:
+        # the turn was not played, callers may retry later or move the load to another provider
+        logger.warning(f"Error playing turn for session {session_id}: {e}")
+        headers = {"Retry-After": str(max(int(e.retry_at - time.time()), 1))} if e.retry_at else None
+        raise HTTPException(status_code=503, detail=f"Error playing turn: {e}", headers=headers)
     except Exception as e:
         logger.error(f"Error playing turn for session {session_id}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error playing turn: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error playing turn: {e}")
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        deadline.close()
\ No newline at end of file
@@ -0,0 +1,28 @@
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.api.deps import SessionDep
+from app.core.config import settings
+from app.games.turnbench.config import GAME_NAME
+from app.games.turnbench.game_stats.stats_service import StatsService
+from app.games.turnbench.models.stats import GetLeaderboardResponse, LeaderboardRequest
+from app.utils import setup_logger
+
+router = APIRouter(prefix=f"/{GAME_NAME}/stats", tags=[f"{GAME_NAME}-stats"])
+logger = setup_logger(f"{GAME_NAME}-stats-router", settings.LOG_LEVEL)
+
+@router.get("/leaderboard", response_model=GetLeaderboardResponse)
+def get_leaderboard(
+    leaderboard_request: Annotated[LeaderboardRequest, Query()],
+    db_session: SessionDep
+):
+    try:
+        stats_service = StatsService(db_session)
+        entries = stats_service.get_leaderboard(leaderboard_request)
+        logger.info(f"get leaderboard with {len(entries)} entries")
+        return GetLeaderboardResponse(data=entries)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting leaderboard: {e}")
@@ -0,0 +1,29 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.games.turnbench.game_session.session_service import SessionService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def archive() -> int:
+    updated_before = datetime.now(timezone.utc) - timedelta(days=settings.TURNBENCH_SESSION_ARCHIVE_AFTER_DAYS)
+    with Session(engine) as session:
+        return SessionService(session).archive_finished_sessions(
+            updated_before, settings.TURNBENCH_SESSION_ARCHIVE_BATCH_SIZE
+        )
+
+
+def main() -> None:
+    logger.info("Archiving finished sessions")
+    archived = archive()
+    logger.info(f"Archived {archived} sessions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import logging
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.games.turnbench.llm.llm_parser_service import LlmParserService
+from app.utils import load_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CORPUS_FILEPATH = "app/games/turnbench/data/parser_corpus.json"
+PARSERS: Dict[str, Callable[[str], Tuple[Any, str]]] = {
+    "proposal": LlmParserService.extract_proposal,
+    "question": LlmParserService.extract_verifier_choices,
+    "deduce": LlmParserService.extract_deduce,
+}
+# reasoning filler of the padded responses, mentions colors and tags like real reasoning does
+FILLER = "If BLUE=3 then Verifier 2 would <FAIL>, so the YELLOW digit has to be checked against PURPLE first. "
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check the llm response parser against its corpus and measure its throughput")
+    parser.add_argument("--corpus", default=CORPUS_FILEPATH)
+    parser.add_argument("--iterations", type=int, default=200, help="passes over the corpus, 0 only checks it")
+    parser.add_argument("--reasoning-size", type=int, default=50000, help="characters of reasoning added to the benchmarked responses")
+    return parser.parse_args()
+
+
+def run_parser(stage: str, response: str) -> Dict[str, Any]:
+    """parser result in the corpus `expected` shape"""
+    try:
+        reasoning, choice = PARSERS[stage](response)
+    except Exception as e:
+        return {"error": type(e).__name__}
+    return {"reasoning": reasoning, "choice": choice}
+
+
+def check(corpus: List[Dict[str, Any]]) -> int:
+    """number of corpus entries the parser does not reproduce"""
+    failures = 0
+    for entry in corpus:
+        result = run_parser(entry["stage"], entry["response"])
+        if result != entry["expected"]:
+            failures += 1
+            logger.error(f"{entry['name']}: expected {entry['expected']}, got {result}")
+    return failures
+
+
+def pad_reasoning(response: str, size: int) -> str:
+    """response with `size` characters of filler at the start of its reasoning"""
+    filler = (FILLER * (size // len(FILLER) + 1))[:size]
+    index = response.upper().find("<REASONING>")
+    if index < 0:
+        return filler + response
+    index += len("<REASONING>")
+    return response[:index] + " " + filler + response[index:]
+
+
+def benchmark(corpus: List[Dict[str, Any]], iterations: int, reasoning_size: int) -> None:
+    """time every parser over the padded responses of its stage"""
+    # the error logs of malformed responses would flood the output and dominate the timings
+    logging.getLogger("LlmParserService").disabled = True
+    for stage in PARSERS:
+        responses = [pad_reasoning(entry["response"], reasoning_size) for entry in corpus if entry["stage"] == stage]
+        if not responses:
+            continue
+        parse = PARSERS[stage]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for response in responses:
+                try:
+                    parse(response)
+                except Exception:
+                    pass
+        elapsed = time.perf_counter() - start
+        count = iterations * len(responses)
+        megabytes = iterations * sum(len(response) for response in responses) / 1e6
+        logger.info(
+            f"{stage}: {count} responses in {elapsed:.3f}s, "
+            f"{count / elapsed:.0f} responses/s, {megabytes / elapsed:.1f} MB/s, {elapsed / count * 1e6:.1f} us/response"
+        )
+
+
+def main() -> None:
+    args = parse_args()
+    corpus = load_json(args.corpus)
+    failures = check(corpus)
+    logger.info(f"{len(corpus) - failures}/{len(corpus)} corpus responses parsed as expected")
+    if failures:
+        sys.exit(1)
+    if args.iterations > 0:
+        benchmark(corpus, args.iterations, args.reasoning_size)
+
+
+if __name__ == "__main__":
+    main()
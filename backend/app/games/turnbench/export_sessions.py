@@ -0,0 +1,55 @@
+import argparse
+import logging
+from datetime import datetime
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.games.turnbench.game_session.session_export import check_format_available
+from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.models.session import ExportSessionsRequest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export turnbench sessions")
+    parser.add_argument("--format", choices=["ndjson", "csv", "parquet"], default="ndjson")
+    parser.add_argument("--kind", choices=["sessions", "turns"], default="sessions")
+    parser.add_argument("--llm-id", dest="llm_ids", action="append")
+    parser.add_argument("--setup-id", dest="setup_ids", action="append")
+    parser.add_argument("--mode", dest="modes", action="append")
+    parser.add_argument("--created-from", type=datetime.fromisoformat)
+    parser.add_argument("--created-before", type=datetime.fromisoformat)
+    parser.add_argument("--game-over", type=parse_bool)
+    parser.add_argument("--game-success", type=parse_bool)
+    parser.add_argument("--batch-size", type=int, default=settings.TURNBENCH_EXPORT_BATCH_SIZE)
+    parser.add_argument("--output", "-o", required=True, help="output file")
+    return parser.parse_args()
+
+
+def export(args: argparse.Namespace) -> None:
+    export_request = ExportSessionsRequest(**{
+        name: value for name, value in vars(args).items() if name not in ("batch_size", "output")
+    })
+    check_format_available(export_request.format)
+    with open(args.output, "wb") as output, Session(engine) as session:
+        for chunk in SessionService(session).export_sessions(export_request, args.batch_size):
+            output.write(chunk)
+
+
+def main() -> None:
+    args = parse_args()
+    logger.info(f"Exporting {args.kind} as {args.format}")
+    export(args)
+    logger.info("Export finished")
+
+
+if __name__ == "__main__":
+    main()
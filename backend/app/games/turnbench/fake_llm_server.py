@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import logging
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.fake_llm import FakeLLM, FakeLLMConfig, include_usage
+
+# registers the turnbench policies of the fake llm
+from app.games.turnbench.llm import fake_policies  # noqa: F401
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI compatible chat completions api for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    for name, field in FakeLLMConfig.model_fields.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, help=f"default {field.default}")
+    return parser.parse_args()
+
+
+def create_app(fake_llm: FakeLLM) -> FastAPI:
+    """app answering chat completions with the fake llm, the latency is awaited so one process serves many sessions"""
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Response:
+        payload = await request.json()
+        await asyncio.sleep(fake_llm.sample_latency())
+        status, body = await run_in_threadpool(fake_llm.complete, payload)
+        if status != 200 or not payload.get("stream"):
+            return JSONResponse(body, status_code=status)
+        return StreamingResponse(fake_llm.stream(body, include_usage(payload)), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    args = parse_args()
+    config = FakeLLMConfig(**{
+        name: value for name, value in vars(args).items() if name in FakeLLMConfig.model_fields and value is not None
+    })
+    logger.info(f"Serving a fake llm on http://{args.host}:{args.port}/v1, {config}")
+    uvicorn.run(create_app(FakeLLM(config)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+from app.games.turnbench.verifier.criteria_service import CriteriaService
+from app.games.turnbench.verifier.models import Verifier
+
+# active criterion of a verifier, whether a code meets it
+CriterionCheck = Callable[[str], bool]
+
+
+def get_criterion_checks(verifiers: Sequence[Verifier], verifier_ids: Sequence[int], criteria_ids: Sequence[int]) -> Tuple[CriterionCheck, ...]:
+    """check of the active criterion of each verifier of a setup"""
+    verifiers_by_id = {verifier.id: verifier for verifier in verifiers}
+    checks = []
+    for verifier_id, criterion_id in zip(verifier_ids, criteria_ids, strict=True):
+        criterion = next((c for c in verifiers_by_id[verifier_id].criteria if c.id == criterion_id), None)
+        if criterion is None:
+            raise ValueError(f"Criterion with id {criterion_id} not found")
+        checks.append(getattr(CriteriaService, criterion.function))
+    return tuple(checks)
+
+
+@dataclass(slots=True, frozen=True)
+class GameRules:
+    """setup of one game, independent of how it is stored"""
+    answer: str
+    max_rounds: int
+    # criterion tested when a verifier is chosen, another verifier's one in nightmare mode
+    verifier_checks: Tuple[CriterionCheck, ...]
+    # criteria a submitted code is scored against
+    answer_checks: Tuple[CriterionCheck, ...]
+
+
+@dataclass(slots=True)
+class TurnRecord:
+    """outcome of one turn"""
+    turn_num: int
+    round_num: int
+    turn_name: str
+    guess_code: Optional[str] = None
+    verifier_choice: Optional[str] = None
+    verifier_result: Optional[str] = None
+    # code submitted in a deduce turn, None when the player continued to the next round
+    submitted_code: Optional[str] = None
+
+
+@dataclass(slots=True)
+class GameState:
+    """
+    Turn rules of a game, with the counters they depend on maintained as turns are recorded,
+    so that simulations and replays run without the session models.
+    """
+    rules: GameRules
+    next_turn_name: str = "proposal"
+    total_turns: int = 0
+    total_rounds: int = 0
+    submitted_code: Optional[str] = None
+    game_over: bool = False
+    game_over_reason: Optional[str] = None
+    game_success: bool = False
+    # verifiers the submitted code passed, None until a code is submitted
+    num_of_verifier_passed: Optional[int] = None
+    # code proposed in the current round
+    round_guess_code: Optional[str] = None
+    # names of the last three turns, questions are counted over them
+    recent_turn_names: Tuple[str, ...] = ()
+    last_turn: Optional[TurnRecord] = None
+
+    @classmethod
+    def replay(cls, rules: GameRules, turns: Iterable[TurnRecord]) -> "GameState":
+        """state after the recorded turns, their verifier results are taken as recorded"""
+        state = cls(rules)
+        for turn in turns:
+            state.record(turn)
+        return state
+
+    @property
+    def question_round(self) -> int:
+        """number of the next question of the round"""
+        return self.recent_turn_names.count("question") + 1
+
+    @property
+    def three_questions(self) -> bool:
+        """whether the last three turns were questions"""
+        return self.recent_turn_names.count("question") >= 3
+
+    def propose(self, guess_code: str) -> TurnRecord:
+        """play a proposal turn"""
+        return self.record(TurnRecord(self.total_turns + 1, self.total_rounds + 1, "proposal", guess_code=guess_code))
+
+    def question(self, verifier_choice: str) -> TurnRecord:
+        """play a question turn, testing the code of the round on the chosen verifier unless it is SKIP"""
+        verifier_result = None
+        if verifier_choice != "SKIP":
+            passed = self.rules.verifier_checks[int(verifier_choice)](self.round_guess_code)
+            verifier_result = "PASS" if passed else "FAIL"
+        return self.record(TurnRecord(
+            self.total_turns + 1, self.total_rounds + 1, "question",
+            verifier_choice=verifier_choice, verifier_result=verifier_result
+        ))
+
+    def deduce(self, submitted_code: Optional[str]) -> TurnRecord:
+        """play a deduce turn, None continues to the next round"""
+        if submitted_code:
+            self.num_of_verifier_passed = sum(1 for check in self.rules.answer_checks if check(submitted_code))
+        return self.record(TurnRecord(self.total_turns + 1, self.total_rounds + 1, "deduce", submitted_code=submitted_code))
+
+    def record(self, turn: TurnRecord) -> TurnRecord:
+        """apply a played turn to the counters, the game status and the next turn name"""
+        self.total_turns += 1
+        if turn.turn_name == "proposal":
+            self.round_guess_code = turn.guess_code
+        elif turn.turn_name == "deduce":
+            self.total_rounds += 1
+            if turn.submitted_code:
+                self.submitted_code = turn.submitted_code
+            self._update_status()
+        self.recent_turn_names = (self.recent_turn_names + (turn.turn_name,))[-3:]
+        self.last_turn = turn
+        self._update_next_turn_name()
+        return turn
+
+    def _update_status(self) -> None:
+        """game over once a code is submitted or the round limit is reached"""
+        if self.submitted_code:
+            self.game_over = True
+            self.game_over_reason = "Submitted"
+            self.game_success = self.submitted_code == self.rules.answer
+        elif self.total_rounds >= self.rules.max_rounds:
+            self.game_over = True
+            self.game_over_reason = "Over rounds"
+            self.game_success = False
+        else:
+            self.game_over = False
+            self.game_over_reason = None
+            self.game_success = False
+
+    def _update_next_turn_name(self) -> None:
+        if self.next_turn_name == "proposal":
+            self.next_turn_name = "question"
+        elif self.next_turn_name == "question":
+            if self.last_turn.turn_name == "proposal":
+                return
+            if self.last_turn.verifier_choice == "SKIP" or self.three_questions:
+                self.next_turn_name = "deduce"
+        elif self.next_turn_name == "deduce":
+            self.next_turn_name = "end" if self.game_over else "proposal"
+
+
+def play_game(rules: GameRules, player: Callable[[GameState], Optional[str]]) -> GameState:
+    """
+    play a game to its end without llm or database, `player` answers the next turn of the state:
+    the code to propose, a verifier number or SKIP, then the code to submit or None to continue
+    """
+    state = GameState(rules)
+    while state.next_turn_name != "end":
+        answer = player(state)
+        if state.next_turn_name == "proposal":
+            state.propose(answer)
+        elif state.next_turn_name == "question":
+            state.question(answer)
+        else:
+            state.deduce(answer)
+    return state
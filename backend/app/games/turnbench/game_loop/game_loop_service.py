@@ -44,15 +44,17 @@ class GameLoopService:
         verifiers: List[Verifier],
         custom_prompt: Optional[str] = None
     ) -> None:
+        # the stages play the turn on the game engine state, the session stores its outcome
+        state = session_service.get_game_state(session, verifiers)
         if session.next_turn_name == "proposal":
             logger.debug(f"{session.id}: proposal stage started")
-            ProposalStageService.execute_turn(session, session_service, llm_client, custom_prompt)
+            ProposalStageService.execute_turn(session, session_service, llm_client, state, custom_prompt)
         elif session.next_turn_name == "question":
             logger.debug(f"{session.id}: question stage started")
-            QuestionStageService.execute_turn(session, session_service, llm_client, verifiers, custom_prompt)
+            QuestionStageService.execute_turn(session, session_service, llm_client, state, custom_prompt)
         elif session.next_turn_name == "deduce":
             logger.debug(f"{session.id}: deduce stage started")
-            DeduceStageService.execute_turn(session, session_service, llm_client, verifiers, custom_prompt)
+            DeduceStageService.execute_turn(session, session_service, llm_client, state, custom_prompt)
         elif session.next_turn_name == "end":
             logger.debug(f"{session.id}: Game Ended")
         else:
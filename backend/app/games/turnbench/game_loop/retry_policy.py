@@ -0,0 +1,68 @@
+from typing import Any, Callable, Dict, Tuple, Type
+
+from app.core.config import settings
+from app.core.exceptions import ResponseNotValidError
+from app.core.llm_client import LLMClient
+from app.games.turnbench.config import GAME_NAME
+from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.llm.structured_output import get_stage_complete
+from app.games.turnbench.models.session import GameSession
+from app.models.llm import LLMCompleteResponse
+from app.utils import setup_logger
+
+logger = setup_logger(f"{GAME_NAME}-RetryPolicy", settings.LOG_LEVEL)
+
+# what the llm sees again after a response that cannot be used:
+# keep - every failed response and its correction prompt
+# collapse - only the correction prompt of the latest failure
+# restart - the context the turn started with, without any correction
+RETRY_MODES = ("keep", "collapse", "restart")
+
+
+def complete_with_retries(
+    session: GameSession,
+    session_service: SessionService,
+    llm_client: LLMClient,
+    turn_name: str,
+    parse: Callable[[str], Any],
+    retry_prompts: Dict[Type[Exception], Callable[[Exception, str], str]],
+) -> Tuple[Any, LLMCompleteResponse]:
+    """
+    ask until `parse` accepts the response, retrying on the exception types of `retry_prompts`.
+    each error type is retried up to TURNBENCH_MAX_RESPONSE_RETRIES times and all retries of the turn
+    stop once they used TURNBENCH_RETRY_TOKEN_BUDGET tokens, the last error is raised then.
+    """
+    # the turn's messages up to its prompt, a restart goes back to them
+    clean_length = len(session.turn_messages)
+    retries = dict.fromkeys(retry_prompts, 0)
+    attempt = 1
+    while True:
+        llm_response = get_stage_complete(
+            session, llm_client, turn_name, session_service.get_context_messages(session), attempt=attempt
+        )
+        session_service.add_turn_message(session, "assistant", llm_response.content)
+        session_service.update_turn_time(session, llm_response.time_used)
+        session_service.update_turn_tokens(session, llm_response)
+        if attempt > 1:
+            session_service.update_turn_retry_usage(session, llm_response)
+        try:
+            return parse(llm_response.content), llm_response
+        except tuple(retry_prompts) as e:
+            error_type = next(error_type for error_type in retry_prompts if isinstance(e, error_type))
+            retries[error_type] += 1
+            if isinstance(e, ResponseNotValidError):
+                session_service.update_game_response_with_not_valid_error(session, 1)
+            else:
+                session_service.update_game_response_with_formatting_error(session, 1)
+            retry_tokens = session.turn_retry_input_tokens + session.turn_retry_output_tokens
+            budget = settings.TURNBENCH_RETRY_TOKEN_BUDGET
+            if retries[error_type] > settings.TURNBENCH_MAX_RESPONSE_RETRIES or (budget and retry_tokens >= budget):
+                logger.error(f"{turn_name} stage, {error_type.__name__}, giving up after {attempt} attempts and {retry_tokens} retry tokens")
+                raise e
+            logger.debug(f"{turn_name} stage, {error_type.__name__}, retrying, attempt: {attempt}")
+            retry_prompt = retry_prompts[error_type](e, llm_response.content)
+            if session.retry_mode != "keep":
+                session.turn_messages = session.turn_messages[:clean_length]
+            if session.retry_mode != "restart":
+                session_service.add_turn_message(session, "user", retry_prompt)
+            attempt += 1
@@ -8,7 +8,10 @@ from app.models.llm import LLMCompleteResponse
 from app.games.turnbench.config import GAME_NAME
 from app.games.turnbench.models.session import GameSession, PlayTurnData
 from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.game_loop.game_engine import GameState
 from app.games.turnbench.llm.llm_parser_service import LlmParserService
+from app.games.turnbench.llm.structured_output import get_format_error_prompt
+from app.games.turnbench.game_loop.retry_policy import complete_with_retries
 
 logger = setup_logger(f"{GAME_NAME}-ProposalStageService", settings.LOG_LEVEL)
 
@@ -16,12 +19,12 @@ class ProposalStageService:
     """proposal stage service"""
 
     @classmethod
-    def execute(cls, session: GameSession, session_service: SessionService, llm_client: LLMClient) -> None:
+    def execute(cls, session: GameSession, session_service: SessionService, llm_client: LLMClient, state: GameState) -> None:
         """execute proposal stage"""
-        cls.execute_turn(session, session_service, llm_client)
+        cls.execute_turn(session, session_service, llm_client, state)
 
     @classmethod
-    def execute_turn(cls, session: GameSession, session_service: SessionService, llm_client: LLMClient, custom_prompt: Optional[str] = None) -> None:
+    def execute_turn(cls, session: GameSession, session_service: SessionService, llm_client: LLMClient, state: GameState, custom_prompt: Optional[str] = None) -> None:
         """execute proposal stage turn"""
         try:
             step_prompt = custom_prompt if custom_prompt else session.base_game_prompts["proposal_prompt"]
@@ -40,23 +43,26 @@ class ProposalStageService:
         session_service.update_turn_llm_response_indexes(session, len(session.messages)-1)
         session_service.update_game_time(session, session.turn_time_used)
         session_service.merge_game_tokens(session)
-        session_service.update_game_turns(session)
+        session_service.merge_game_retry_usage(session)
+        turn = state.propose(guess_code)
+        session_service.apply_game_state(session, state)
 
-        # SessionService.update_all_guesses(session, guess_code)
         session_service.update_turn_result(session,
             PlayTurnData(
-                turn_num=session.total_turns,
-                round_num=session.total_rounds + 1,
+                turn_num=turn.turn_num,
+                round_num=turn.round_num,
                 turn_name="proposal",
                 turn_prompt=step_prompt,
                 turn_reasoning=reasoning,
                 turn_model_level_reasoning=llm_response.model_level_reasoning_content,
                 turn_time_used=session.turn_time_used,
+                turn_cached_tokens=session.turn_cached_tokens,
+                turn_reasoning_tokens=session.turn_reasoning_tokens,
+                turn_retries=session.turn_retries,
                 guess_code=guess_code
             )
         )
         session_service.clear_current_turn_data(session)
-        session_service.update_next_turn_name(session)
         logger.debug(f"proposal stage completed, next turn: {session.next_turn_name}")
         
     @classmethod
@@ -64,26 +70,16 @@ class ProposalStageService:
         cls, 
         session: GameSession, 
         session_service: SessionService, 
-        llm_client: LLMClient, 
-        retry_count=0
+        llm_client: LLMClient
     ) -> Tuple[Optional[str], Optional[str], Optional[LLMCompleteResponse]]:
         """handle proposal"""
-        llm_response = llm_client.get_complete(session.messages + session.turn_messages)
-        session_service.add_turn_message(session, "assistant", llm_response.content)
-        session_service.update_turn_time(session, llm_response.time_used)
-        session_service.update_turn_tokens(session, llm_response)
-        
-        try:
-            reasoning, guess_code = LlmParserService.extract_proposal(llm_response.content)
-            return reasoning, guess_code, llm_response
-        except ResponseFormatError as e:
-            session_service.update_game_response_with_formatting_error(session, 1)
-            if retry_count > 3:
-                logger.error(f"proposal stage, response format error, retry_count: {retry_count} exceeded max retry count")
-                raise e
-            logger.debug(f"proposal stage, response format error, retrying, retry_count: {retry_count}")
-            session_service.add_turn_message(session, "user", session.base_game_prompts["not_valid_proposal_format_prompt"])
-            return cls.handle_proposal(session, session_service, llm_client, retry_count + 1)
-        except Exception as e:
-            logger.error(f"proposal stage, unknown error: {e}")
-            raise e
\ No newline at end of file
+        def parse(content: str) -> Tuple[Optional[str], str]:
+            if session.output_mode == "json_schema":
+                return LlmParserService.extract_proposal_structured(content)
+            return LlmParserService.extract_proposal(content)
+
+        (reasoning, guess_code), llm_response = complete_with_retries(
+            session, session_service, llm_client, "proposal", parse,
+            {ResponseFormatError: lambda e, _content: get_format_error_prompt(session, "proposal", e)}
+        )
+        return reasoning, guess_code, llm_response
\ No newline at end of file
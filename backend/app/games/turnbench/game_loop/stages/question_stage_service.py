@@ -1,16 +1,17 @@
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional
 
 from app.core.llm_client import LLMClient
 from app.core.exceptions import ResponseFormatError, ResponseNotValidError
 from app.core.config import settings
 from app.utils import setup_logger
 from app.models.llm import LLMCompleteResponse
-from app.games.turnbench.verifier.verifier_manager import verifier_manager
-from app.games.turnbench.verifier.models import Verifier
 from app.games.turnbench.config import GAME_NAME
 from app.games.turnbench.models.session import GameSession, PlayTurnData
 from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.game_loop.game_engine import GameState, TurnRecord
 from app.games.turnbench.llm.llm_parser_service import LlmParserService
+from app.games.turnbench.llm.structured_output import get_format_error_prompt
+from app.games.turnbench.game_loop.retry_policy import complete_with_retries
 
 logger = setup_logger(f"{GAME_NAME}-QuestionStageService", settings.LOG_LEVEL)
 
@@ -23,10 +24,10 @@ class QuestionStageService:
         session: GameSession, 
         session_service: SessionService, 
         llm_client: LLMClient, 
-        verifiers: List[Verifier]
+        state: GameState
     ) -> None:
         """execute question verifier stage"""
-        cls.execute_turn(session, session_service, llm_client, verifiers)
+        cls.execute_turn(session, session_service, llm_client, state)
     
     @classmethod
     def execute_turn(
@@ -34,13 +35,14 @@ class QuestionStageService:
         session: GameSession, 
         session_service: SessionService, 
         llm_client: LLMClient, 
-        verifiers: List[Verifier], 
+        state: GameState, 
         custom_prompt: Optional[str] = None
     ) -> None:
         """execute question verifier stage turn"""
+        three_questions = state.three_questions
         try:
-            step_prompt, reasoning, model_level_reasoning, verifier_choice, verifier_result = cls.handle_question_turn(session, session_service, llm_client, verifiers, custom_prompt)
-            logger.debug(f"question stage, verifier_choice: {verifier_choice}, verifier_result: {verifier_result}")
+            step_prompt, reasoning, model_level_reasoning, turn = cls.handle_question_turn(session, session_service, llm_client, state, custom_prompt)
+            logger.debug(f"question stage, verifier_choice: {turn.verifier_choice}, verifier_result: {turn.verifier_result}")
         except Exception as e:
             logger.error(f"question stage, unknown error: {e}")
             session_service.clear_current_turn_data(session)
@@ -48,30 +50,33 @@ class QuestionStageService:
 
         session_service.update_turn_message_indexes(session)
         session_service.merge_game_messages(session)
-        if session_service.check_if_three_questions(session):
+        if three_questions:
             session_service.update_turn_llm_response_indexes(session, len(session.messages)-3)
         else:
             session_service.update_turn_llm_response_indexes(session, len(session.messages)-1)
 
         session_service.update_game_time(session, session.turn_time_used)
         session_service.merge_game_tokens(session)
-        session_service.update_game_turns(session)
+        session_service.merge_game_retry_usage(session)
+        session_service.apply_game_state(session, state)
     
         session_service.update_turn_result(session,
             PlayTurnData(
-                turn_num=session.total_turns,
-                round_num=session.total_rounds + 1,
+                turn_num=turn.turn_num,
+                round_num=turn.round_num,
                 turn_name="question",
                 turn_prompt=step_prompt,
                 turn_reasoning=reasoning,
                 turn_model_level_reasoning=model_level_reasoning,
                 turn_time_used=session.turn_time_used,
-                verifier_choice=verifier_choice,
-                verifier_result=verifier_result
+                turn_cached_tokens=session.turn_cached_tokens,
+                turn_reasoning_tokens=session.turn_reasoning_tokens,
+                turn_retries=session.turn_retries,
+                verifier_choice=turn.verifier_choice,
+                verifier_result=turn.verifier_result
             )
         )
         session_service.clear_current_turn_data(session)
-        session_service.update_next_turn_name(session)
         
     @classmethod
     def handle_question_turn(
@@ -79,86 +84,66 @@ class QuestionStageService:
         session: GameSession, 
         session_service: SessionService, 
         llm_client: LLMClient, 
-        verifiers: List[Verifier], 
+        state: GameState, 
         custom_prompt: Optional[str] = None
-    ) -> None:
+    ) -> Tuple[str, Optional[str], Optional[str], TurnRecord]:
         """handle question turn"""
-        step_prompt = custom_prompt if custom_prompt else cls.prepare_prompt_for_round(session, session_service)
+        step_prompt = custom_prompt if custom_prompt else cls.prepare_prompt_for_round(session, state)
         session_service.add_turn_message(session, "user", step_prompt)
         
         reasoning, verifier_choice, llm_response = cls.handle_question(session, session_service, llm_client)
-        # get verifier result
-        if verifier_choice == "SKIP":
-            verifier_result = None
-        else:
-            guess_code = session_service.get_current_round_guess_code(session)
-            if session.mode == "classic":
-                verifier_id = session.game_info["verifier_ids"][int(verifier_choice)]
-                active_criteria_id = session.game_info["active_criteria_ids"][int(verifier_choice)]
-            else:
-                verifier_id = session.game_info["nightmare_verifier_ids"][int(verifier_choice)]
-                active_criteria_id = session.game_info["nightmare_active_criteria_ids"][int(verifier_choice)]
-            verifier = next((v for v in verifiers if v.id == verifier_id), None)
-            verifier_result = cls.get_verifier_result(verifier, active_criteria_id, guess_code)
+        three_questions = state.three_questions
+        # the engine tests the code of the round on the chosen verifier
+        turn = state.question(verifier_choice)
         
-        if session_service.check_if_three_questions(session):
+        if three_questions:
             after_last_prompt = session.base_game_prompts["after_last_question_prompt"].format(
-                verifier_num=verifier_choice, 
-                verifier_result=verifier_result
+                verifier_num=turn.verifier_choice, 
+                verifier_result=turn.verifier_result
             )
             session_service.add_turn_message(session, "assistant", after_last_prompt)
             session_service.add_turn_message(session, "assistant", "I will decide whether to proceed to the next round during the Deduce Stage.")
             
 
-        return step_prompt, reasoning, llm_response.model_level_reasoning_content, verifier_choice, verifier_result
+        return step_prompt, reasoning, llm_response.model_level_reasoning_content, turn
         
     @classmethod
     def handle_question(
         cls, 
         session: GameSession, 
         session_service: SessionService, 
-        llm_client: LLMClient, 
-        format_error_retry_count: int = 0, 
-        not_valid_error_retry_count: int = 0
+        llm_client: LLMClient
     ) -> Tuple[Optional[str], str, LLMCompleteResponse]:
         """handle question"""
-        # get LLM response
-        llm_response = llm_client.get_complete(session.messages + session.turn_messages)
-        session_service.add_turn_message(session, "assistant", llm_response.content)
-        session_service.update_turn_time(session, llm_response.time_used)
-        session_service.update_turn_tokens(session, llm_response)
+        def extract(content: str) -> Tuple[Optional[str], str]:
+            if session.output_mode == "json_schema":
+                return LlmParserService.extract_verifier_choices_structured(content)
+            return LlmParserService.extract_verifier_choices(content)
         
-        # extract reasoning and verifier choice
-        try:
-            reasoning, verifier_choice = LlmParserService.extract_verifier_choices(llm_response.content)
+        def parse(content: str) -> Tuple[Optional[str], str]:
+            reasoning, verifier_choice = extract(content)
             if verifier_choice != "SKIP":
                 cls.check_verifier_choice_valid(session, verifier_choice)
-        except ResponseFormatError as e:
-            if format_error_retry_count > 3:
-                raise e
-            logger.debug(f"question stage, response format error, retrying, retry_count: {format_error_retry_count}")
-            session_service.update_game_response_with_formatting_error(session, 1)
-            session_service.add_turn_message(session, "user", session.base_game_prompts["not_valid_question_format_prompt"])
-            return cls.handle_question(session, session_service, llm_client, format_error_retry_count + 1, not_valid_error_retry_count)
-        except ResponseNotValidError as e:
-            if not_valid_error_retry_count > 3:
-                raise e
-            logger.debug(f"question stage, response not valid error, retrying, retry_count: {not_valid_error_retry_count}")
-            session_service.update_game_response_with_not_valid_error(session, 1)
-            session_service.add_turn_message(session, "user", session.base_game_prompts["not_valid_verifier_choice_prompt"].format(
-                verifier_num=verifier_choice
-            ))
-            return cls.handle_question(session, session_service, llm_client, format_error_retry_count, not_valid_error_retry_count + 1)
-        except Exception as e:
-            logger.error(f"question stage, unknown error: {e}")
-            raise e
+            return reasoning, verifier_choice
+
+        def not_valid_prompt(_error: Exception, content: str) -> str:
+            _, verifier_choice = extract(content)
+            return session.base_game_prompts["not_valid_verifier_choice_prompt"].format(verifier_num=verifier_choice)
+
+        (reasoning, verifier_choice), llm_response = complete_with_retries(
+            session, session_service, llm_client, "question", parse,
+            {
+                ResponseFormatError: lambda e, _content: get_format_error_prompt(session, "question", e),
+                ResponseNotValidError: not_valid_prompt,
+            }
+        )
         
         return reasoning, verifier_choice, llm_response
         
     @staticmethod
-    def prepare_prompt_for_round(session: GameSession, session_service: SessionService) -> str:
+    def prepare_prompt_for_round(session: GameSession, state: GameState) -> str:
         """prepare current round prompt"""
-        question_round = session_service.get_current_question_round(session)
+        question_round = state.question_round
         
         if question_round > 3: # unexpected question round
             raise Exception("Unexpected question round")
@@ -168,18 +153,11 @@ class QuestionStageService:
                 verifier_descriptions=session.verifier_descriptions
             )
         
-        last_question_turn_result = session.turn_result_history[-1]
-        
         # following question (2, 3)
         return session.base_game_prompts["following_question_prompt"].format(
-            verifier_num=last_question_turn_result["verifier_choice"], 
-            verifier_result=last_question_turn_result["verifier_result"]
+            verifier_num=state.last_turn.verifier_choice, 
+            verifier_result=state.last_turn.verifier_result
         )
-
-    @staticmethod
-    def get_verifier_result(verifier: Verifier, active_criteria_id: int, guess_code: str) -> str:
-        """get verifier result"""
-        return "PASS" if verifier_manager.verify(verifier, active_criteria_id, guess_code) else "FAIL"
     
     @staticmethod
     def check_verifier_choice_valid(session: GameSession, verifier_choice: str) -> None:
@@ -0,0 +1,176 @@
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, cast, delete, insert, or_, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.games.turnbench.models.search import TurnSearchDocument
+from app.games.turnbench.models.session import GameSession, TurnReasoning
+
+# ts_headline options of the hit snippets
+SNIPPET_OPTIONS = "MaxFragments=2, MinWords=8, MaxWords=30, FragmentDelimiter=\" ... \""
+SNIPPET_LENGTH = 200
+
+
+class SearchRepository:
+    """Turn search repository"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def index_turns(self, session_id: uuid.UUID, state: Dict[str, list], turn_indexes: List[int]) -> None:
+        """
+        (Re)index the given turns of a session's (stitched) state, in the current transaction.
+        Only a session's own turns are indexed, turns a fork inherits are found through its parent chain.
+        """
+        if not turn_indexes:
+            return
+        turns = state["turn_result_history"]
+        self.session.execute(
+            delete(TurnSearchDocument)
+            .where(TurnSearchDocument.session_id == session_id, TurnSearchDocument.turn_index.in_(turn_indexes))
+        )
+        # model level reasoning is kept in the reasoning store, turns only reference it
+        reasoning_hashes = {
+            turns[i]["turn_model_level_reasoning_hash"] for i in turn_indexes
+            if not turns[i].get("turn_model_level_reasoning") and turns[i].get("turn_model_level_reasoning_hash")
+        }
+        reasonings = dict(self.session.execute(
+            select(TurnReasoning.hash, TurnReasoning.content).where(TurnReasoning.hash.in_(reasoning_hashes))
+        ).all()) if reasoning_hashes else {}
+        rows = []
+        for i in turn_indexes:
+            turn = turns[i]
+            parts = [
+                turn.get("turn_reasoning"),
+                turn.get("turn_model_level_reasoning") or reasonings.get(turn.get("turn_model_level_reasoning_hash")),
+            ]
+            if i < len(state["turn_llm_response_indexes"]) and state["turn_llm_response_indexes"][i] < len(state["messages"]):
+                parts.append(state["messages"][state["turn_llm_response_indexes"][i]].get("content"))
+            content = "\n\n".join(part for part in parts if isinstance(part, str) and part)
+            rows.append({
+                "session_id": session_id,
+                "turn_index": i,
+                "turn_num": turn.get("turn_num", i + 1),
+                "turn_name": turn.get("turn_name", ""),
+                "content": content,
+            })
+        self.session.execute(insert(TurnSearchDocument), rows)
+        if self._is_postgres():
+            # computed in the database, so the content is only sent once
+            self.session.execute(
+                update(TurnSearchDocument)
+                .where(TurnSearchDocument.session_id == session_id, TurnSearchDocument.turn_index.in_(turn_indexes))
+                .values(search_vector=func.to_tsvector(self._text_config(), TurnSearchDocument.content))
+            )
+
+    def delete_turns_outside(self, session_id: uuid.UUID, first_own_turn: int, turn_count: int) -> None:
+        """Drop the documents of turns a session no longer owns: inherited ones before `first_own_turn` and removed ones"""
+        self.session.execute(
+            delete(TurnSearchDocument)
+            .where(TurnSearchDocument.session_id == session_id)
+            .where(or_(TurnSearchDocument.turn_index < first_own_turn, TurnSearchDocument.turn_index >= turn_count))
+        )
+
+    def delete_documents(self, session_ids: Any) -> None:
+        """Drop the index of the sessions in `session_ids` (a list or a select of ids), in the current transaction"""
+        self.session.execute(delete(TurnSearchDocument).where(TurnSearchDocument.session_id.in_(session_ids)))
+
+    def search_turns(self, *, query: str, session_ids: Optional[Any], limit: int, offset: int) -> List[Dict[str, Any]]:
+        """Turns matching a web search style query, best match first, optionally among `session_ids` only"""
+        if not self._is_postgres():
+            return self._search_turns_by_substring(query=query, session_ids=session_ids, limit=limit, offset=offset)
+        config = self._text_config()
+        ts_query = func.websearch_to_tsquery(config, query)
+        hits = self._with_forks(TurnSearchDocument.search_vector.op("@@")(ts_query))
+        rank = func.ts_rank_cd(TurnSearchDocument.search_vector, ts_query)
+        statement = (
+            select(
+                hits.c.session_id,
+                hits.c.turn_index,
+                TurnSearchDocument.turn_num,
+                TurnSearchDocument.turn_name,
+                TurnSearchDocument.content,
+                rank.label("rank"),
+            )
+            .select_from(hits)
+            .join(TurnSearchDocument, self._document_of(hits))
+            .order_by(rank.desc(), hits.c.session_id, hits.c.turn_index)
+            .offset(offset)
+            .limit(limit)
+        )
+        if session_ids is not None:
+            statement = statement.where(hits.c.session_id.in_(session_ids))
+        # snippets are only built for the page of hits
+        page = statement.subquery()
+        statement = select(
+            page.c.session_id,
+            page.c.turn_index,
+            page.c.turn_num,
+            page.c.turn_name,
+            func.ts_headline(config, page.c.content, ts_query, SNIPPET_OPTIONS).label("snippet"),
+            page.c.rank,
+        ).order_by(page.c.rank.desc(), page.c.session_id, page.c.turn_index)
+        return [dict(row) for row in self.session.execute(statement).mappings()]
+
+    def _search_turns_by_substring(
+        self, *, query: str, session_ids: Optional[Any], limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        """Case insensitive substring search, for databases without text search"""
+        hits = self._with_forks(TurnSearchDocument.content.ilike(f"%{query}%"))
+        statement = (
+            select(hits.c.session_id, hits.c.turn_index, TurnSearchDocument)
+            .select_from(hits)
+            .join(TurnSearchDocument, self._document_of(hits))
+            .order_by(hits.c.session_id, hits.c.turn_index)
+            .offset(offset)
+            .limit(limit)
+        )
+        if session_ids is not None:
+            statement = statement.where(hits.c.session_id.in_(session_ids))
+        results = []
+        for session_id, turn_index, document in self.session.execute(statement).all():
+            start = max(document.content.lower().find(query.lower()) - SNIPPET_LENGTH // 2, 0)
+            results.append({
+                "session_id": session_id,
+                "turn_index": turn_index,
+                "turn_num": document.turn_num,
+                "turn_name": document.turn_name,
+                "snippet": document.content[start:start + SNIPPET_LENGTH],
+                "rank": 0.0,
+            })
+        return results
+
+    @staticmethod
+    def _with_forks(matches: Any) -> Any:
+        """
+        (session_id, document_session_id, turn_index) of the documents matching a condition,
+        and of every fork down the parent chain that inherits their turn
+        """
+        hits = select(
+            TurnSearchDocument.session_id.label("session_id"),
+            TurnSearchDocument.session_id.label("document_session_id"),
+            TurnSearchDocument.turn_index.label("turn_index"),
+        ).where(matches).cte("turn_search_hits", recursive=True)
+        forks = (
+            select(GameSession.id, hits.c.document_session_id, hits.c.turn_index)
+            .join(hits, GameSession.parent_session_id == hits.c.session_id)
+            .where(GameSession.fork_turn > hits.c.turn_index)
+        )
+        return hits.union_all(forks)
+
+    @staticmethod
+    def _document_of(hits: Any) -> Any:
+        return and_(
+            TurnSearchDocument.session_id == hits.c.document_session_id,
+            TurnSearchDocument.turn_index == hits.c.turn_index,
+        )
+
+    @staticmethod
+    def _text_config() -> Any:
+        return cast(settings.TURNBENCH_SEARCH_TEXT_CONFIG, REGCONFIG)
+
+    def _is_postgres(self) -> bool:
+        return self.session.get_bind().dialect.name == "postgresql"
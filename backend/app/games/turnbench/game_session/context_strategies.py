@@ -0,0 +1,104 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Type
+
+from app.core.config import settings
+from app.games.turnbench.models.session import GameSession
+
+SUMMARY_HEADER = "Summary of the game so far, derived from your earlier turns:"
+
+
+class ContextStrategy(ABC):
+    """builds the messages sent to the llm for the next call of the current turn"""
+    name: str = ""
+
+    @classmethod
+    @abstractmethod
+    def build_messages(cls, session: GameSession) -> List[Dict[str, Any]]:
+        """messages of the next llm call"""
+
+    @staticmethod
+    def get_initial_messages(session: GameSession) -> List[Dict[str, Any]]:
+        """messages before the first turn, i.e. the rules and the setup"""
+        if not session.turn_message_indexes:
+            return list(session.messages)
+        return session.messages[:session.turn_message_indexes[0]]
+
+    @staticmethod
+    def summarize_turns(turns: List[Dict[str, Any]]) -> str:
+        """one line of proposal, verifier results and decision per round"""
+        rounds: Dict[int, List[str]] = {}
+        for turn in turns:
+            facts = rounds.setdefault(turn["round_num"], [])
+            if turn["turn_name"] == "proposal" and turn.get("guess_code"):
+                guess_code = turn["guess_code"]
+                facts.append(f"proposed BLUE={guess_code[0]} YELLOW={guess_code[1]} PURPLE={guess_code[2]}")
+            elif turn["turn_name"] == "question":
+                if turn.get("verifier_choice") == "SKIP":
+                    facts.append("skipped the remaining verifiers")
+                else:
+                    facts.append(f"Verifier {turn.get('verifier_choice')}: {turn.get('verifier_result')}")
+            elif turn["turn_name"] == "deduce":
+                if turn.get("deduce_choice_skip"):
+                    facts.append("continued to the next round")
+                else:
+                    facts.append(f"submitted {turn.get('deduce_choice_submit_code')}")
+        lines = [SUMMARY_HEADER]
+        for round_num, facts in rounds.items():
+            lines.append(f"Round {round_num}: {'; '.join(facts)}")
+        return "\n".join(lines)
+
+
+class FullHistoryStrategy(ContextStrategy):
+    """every message of the game, input tokens grow with each turn"""
+    name = "full"
+
+    @classmethod
+    def build_messages(cls, session: GameSession) -> List[Dict[str, Any]]:
+        return session.messages + session.turn_messages
+
+
+class SlidingWindowStrategy(ContextStrategy):
+    """rules and setup, a summary of the older rounds, then the messages of the last rounds"""
+    name = "sliding_window"
+
+    @classmethod
+    def build_messages(cls, session: GameSession) -> List[Dict[str, Any]]:
+        turns = session.turn_result_history
+        if not turns:
+            return session.messages + session.turn_messages
+        last_kept_round = turns[-1]["round_num"] - settings.TURNBENCH_CONTEXT_WINDOW_ROUNDS
+        first_kept_turn = next((i for i, turn in enumerate(turns) if turn["round_num"] > last_kept_round), len(turns))
+        if first_kept_turn == 0:
+            return session.messages + session.turn_messages
+        window = session.messages[session.turn_message_indexes[first_kept_turn]:] if first_kept_turn < len(turns) else []
+        return [
+            *cls.get_initial_messages(session),
+            {"role": "user", "content": cls.summarize_turns(turns[:first_kept_turn])},
+            *window,
+            *session.turn_messages,
+        ]
+
+
+class FactsOnlyStrategy(ContextStrategy):
+    """rules and setup, a summary of every played turn and the current turn only"""
+    name = "facts_only"
+
+    @classmethod
+    def build_messages(cls, session: GameSession) -> List[Dict[str, Any]]:
+        if not session.turn_result_history:
+            return cls.get_initial_messages(session) + session.turn_messages
+        return [
+            *cls.get_initial_messages(session),
+            {"role": "user", "content": cls.summarize_turns(session.turn_result_history)},
+            *session.turn_messages,
+        ]
+
+
+CONTEXT_STRATEGIES: Dict[str, Type[ContextStrategy]] = {
+    strategy.name: strategy for strategy in (FullHistoryStrategy, SlidingWindowStrategy, FactsOnlyStrategy)
+}
+
+
+def get_context_messages(session: GameSession) -> List[Dict[str, Any]]:
+    """messages for the next llm call of the session, built by its context strategy"""
+    return CONTEXT_STRATEGIES[session.context_strategy or FullHistoryStrategy.name].build_messages(session)
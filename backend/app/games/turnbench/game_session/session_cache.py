@@ -0,0 +1,443 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.games.turnbench.config import GAME_NAME
+from app.games.turnbench.game_session.session_repository import SessionRepository
+from app.games.turnbench.models.session import (
+    GameSession,
+    GameSessionUpdate,
+    TurnIdempotencyKey,
+)
+from app.games.turnbench.verifier.models import Verifier
+from app.games.turnbench.verifier.verifier_manager import verifier_manager
+from app.models.llm import LLMPublic
+from app.models.provider import Provider
+from app.utils import setup_logger
+
+logger = setup_logger(f"{GAME_NAME}-SessionCache", settings.LOG_LEVEL)
+
+
+class HotSession:
+    """live state of a session owned by this worker"""
+
+    def __init__(self, session: GameSession, llm_info: LLMPublic, provider_info: Provider, verifiers: List[Verifier], state_version: int):
+        self.session = session
+        self.llm_info = llm_info
+        self.provider_info = provider_info
+        self.verifiers = verifiers
+        self.state_version = state_version
+        # state version of the latest state written to the database, another one there means another worker wrote it
+        self.written_version = state_version
+        self.committed_state: Dict[str, Any] = session.model_dump()
+        # idempotency keys of completed turns not queued for writing yet, written with the state of their turn
+        self.idempotency_keys: Dict[str, TurnIdempotencyKey] = {}
+        self.turns_since_flush = 0
+        self.lease_expires_at = 0.0
+        self.last_used_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    def rollback(self) -> None:
+        """Drop in-memory changes made since the last completed turn"""
+        self.session = GameSession.model_validate(self.committed_state)
+
+
+class HotSessionCache:
+    """
+    Bounded LRU cache of sessions being actively played, with write-behind persistence.
+    A worker owns the sessions it caches through a lease on the session row, other workers
+    ask it to hand the session off before touching it.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        write_every_n_turns: int,
+        lease_seconds: int,
+        idle_seconds: int,
+        flush_interval_seconds: float,
+        handoff_timeout_seconds: float
+    ):
+        self.max_size = max_size
+        self.write_every_n_turns = max(write_every_n_turns, 1)
+        self.lease_seconds = lease_seconds
+        self.idle_seconds = idle_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.handoff_timeout_seconds = handoff_timeout_seconds
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._entries: OrderedDict[uuid.UUID, HotSession] = OrderedDict()
+        self._entries_lock = threading.Lock()
+        # pending writes, coalesced per session: session id -> (state, state version, release after write, idempotency keys)
+        self._pending: Dict[uuid.UUID, tuple[Optional[Dict[str, Any]], int, bool, Dict[str, TurnIdempotencyKey]]] = {}
+        # idempotency keys of the writes in progress, until they are committed
+        self._writing: Dict[uuid.UUID, Dict[str, TurnIdempotencyKey]] = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        """whether sessions are cached at all"""
+        return self.max_size > 0
+
+    @contextmanager
+    def checkout(self, session_id: uuid.UUID, db_session: Session) -> Iterator[HotSession]:
+        """Get exclusive access to the live state of a session, loading and claiming it on a miss"""
+        self._ensure_writer()
+        while True:
+            hot_session = self._get_entry(session_id) or self._load(session_id, db_session)
+            hot_session.lock.acquire()
+            if self._get_entry(session_id) is hot_session:
+                break
+            # evicted or handed off while waiting for the lock
+            hot_session.lock.release()
+        try:
+            if hot_session.lease_expires_at - time.monotonic() < self.flush_interval_seconds:
+                self._reclaim(hot_session, db_session)
+            hot_session.last_used_at = time.monotonic()
+            yield hot_session
+        finally:
+            hot_session.lock.release()
+
+    def commit_turn(self, hot_session: HotSession, idempotency_key: Optional[TurnIdempotencyKey] = None) -> None:
+        """Mark the current in-memory state as the result of a completed turn, its idempotency key is written with it"""
+        hot_session.committed_state = hot_session.session.model_dump()
+        if idempotency_key is not None:
+            hot_session.idempotency_keys[idempotency_key.key] = idempotency_key
+        hot_session.turns_since_flush += 1
+        if hot_session.session.game_over:
+            # finished sessions are rarely played again, write them out and free the slot
+            self._drop_entry(hot_session.session.id)
+            self._schedule_write(hot_session, release=True)
+        elif hot_session.turns_since_flush >= self.write_every_n_turns:
+            self._schedule_write(hot_session)
+
+    def get_unwritten_idempotency_key(self, hot_session: HotSession, key: str) -> Optional[TurnIdempotencyKey]:
+        """Idempotency key of a completed turn of a cached session that is not written yet"""
+        if key in hot_session.idempotency_keys:
+            return hot_session.idempotency_keys[key]
+        session_id = hot_session.session.id
+        with self._pending_lock:
+            pending = self._pending.get(session_id)
+            if pending is not None and key in pending[3]:
+                return pending[3][key]
+            return self._writing.get(session_id, {}).get(key)
+
+    def peek(self, session_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        """Get the latest completed state of a cached session, if this worker holds it"""
+        hot_session = self._get_entry(session_id)
+        if hot_session is None:
+            return None
+        return hot_session.committed_state
+
+    @contextmanager
+    def exclusive(self, session_id: uuid.UUID, db_session: Session) -> Iterator[None]:
+        """Make sure no worker holds unsaved state of a session while it is modified outside the cache"""
+        if not self.enabled:
+            yield
+            return
+        self.release(session_id)
+        repository = SessionRepository(db_session)
+        self._claim(repository, session_id)
+        try:
+            yield
+        finally:
+            repository.release_game_sessions([session_id], self.owner_id)
+
+    def release(self, session_id: uuid.UUID) -> None:
+        """Persist and drop a cached session, giving up its ownership"""
+        hot_session = self._get_entry(session_id)
+        if hot_session is not None:
+            with hot_session.lock:
+                self._drop_entry(session_id)
+                self._schedule_write(hot_session, release=True, force=True)
+        self._write_pending(session_id)
+
+    def discard(self, session_id: uuid.UUID) -> None:
+        """Drop a cached session without persisting it"""
+        self._drop_entry(session_id)
+        with self._pending_lock:
+            self._pending.pop(session_id, None)
+
+    def close(self) -> None:
+        """Persist and release every cached session, stop the writer"""
+        with self._entries_lock:
+            hot_sessions = list(self._entries.values())
+            self._entries.clear()
+        for hot_session in hot_sessions:
+            with hot_session.lock:
+                self._schedule_write(hot_session, release=True, force=True)
+        self._stopped.set()
+        self._wakeup.set()
+        if self._writer is not None:
+            self._writer.join(timeout=self.handoff_timeout_seconds)
+        self._write_pending()
+
+    def _load(self, session_id: uuid.UUID, db_session: Session) -> HotSession:
+        """Claim a session and load its live state"""
+        # a write of this session may still be queued from a previous eviction
+        self._write_pending(session_id)
+        repository = SessionRepository(db_session)
+        state_version = self._claim(repository, session_id)
+        hot_session = HotSession(*self._read(repository, session_id), state_version=state_version)
+        hot_session.lease_expires_at = time.monotonic() + self.lease_seconds
+
+        evicted = []
+        with self._entries_lock:
+            self._entries[session_id] = hot_session
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for evicted_session in evicted:
+            with evicted_session.lock:
+                self._schedule_write(evicted_session, release=True, force=True)
+        logger.debug(f"session {session_id} loaded into hot cache, state version {state_version}")
+        return hot_session
+
+    def _read(self, repository: SessionRepository, session_id: uuid.UUID) -> tuple[GameSession, LLMPublic, Provider, List[Verifier]]:
+        """Read a session with everything a turn needs, detached from the db session"""
+        db_obj = repository.get_game_session_by_id_with_llm_info_and_setup_info(session_id)
+        if db_obj is None:
+            repository.release_game_sessions([session_id], self.owner_id)
+            raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+        return (
+            GameSession.model_validate(db_obj.model_dump()),
+            LLMPublic(**db_obj.llm.model_dump()),
+            Provider(**db_obj.llm.provider.model_dump()),
+            verifier_manager.get_verifier_by_ids(db_obj.game_info["verifier_ids"]),
+        )
+
+    def _claim(self, repository: SessionRepository, session_id: uuid.UUID) -> int:
+        """Take ownership of a session, asking its current owner to hand it off if needed"""
+        deadline = time.monotonic() + self.handoff_timeout_seconds
+        handoff_requested = False
+        while True:
+            now = datetime.now(timezone.utc)
+            state_version = repository.claim_game_session(
+                session_id, self.owner_id, now + timedelta(seconds=self.lease_seconds), now
+            )
+            if state_version is not None:
+                return state_version
+            if not handoff_requested:
+                if not repository.request_game_session_handoff(session_id):
+                    raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+                handoff_requested = True
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=409, detail=f"Session {session_id} is busy on another worker")
+            time.sleep(0.1)
+
+    def _reclaim(self, hot_session: HotSession, db_session: Session) -> None:
+        """Renew an expiring lease, reloading the session if someone else changed it meanwhile"""
+        session_id = hot_session.session.id
+        repository = SessionRepository(db_session)
+        state_version = self._claim(repository, session_id)
+        if state_version != hot_session.written_version:
+            # a write of ours may have been in flight, once it is over only this worker changes the session
+            with self._write_lock:
+                state_version = self._claim(repository, session_id)
+        # states queued but not written yet are newer than the stored one, they are not a change made elsewhere
+        if state_version != hot_session.written_version:
+            logger.warning(f"session {session_id} changed on another worker, reloading")
+            hot_session.session, hot_session.llm_info, hot_session.provider_info, hot_session.verifiers = self._read(repository, session_id)
+            hot_session.committed_state = hot_session.session.model_dump()
+            hot_session.state_version = state_version
+            hot_session.written_version = state_version
+            hot_session.turns_since_flush = 0
+            hot_session.idempotency_keys = {}
+            with self._pending_lock:
+                self._pending.pop(session_id, None)
+        hot_session.lease_expires_at = time.monotonic() + self.lease_seconds
+
+    def _get_entry(self, session_id: uuid.UUID) -> Optional[HotSession]:
+        """Get a cached session, marking it as recently used"""
+        with self._entries_lock:
+            hot_session = self._entries.get(session_id)
+            if hot_session is not None:
+                self._entries.move_to_end(session_id)
+            return hot_session
+
+    def _drop_entry(self, session_id: uuid.UUID) -> Optional[HotSession]:
+        """Remove a session from the cache"""
+        with self._entries_lock:
+            return self._entries.pop(session_id, None)
+
+    def _schedule_write(self, hot_session: HotSession, release: bool = False, force: bool = False) -> None:
+        """Queue the latest completed state of a session for the writer"""
+        session_id = hot_session.session.id
+        with self._pending_lock:
+            if hot_session.turns_since_flush > 0:
+                hot_session.state_version += 1
+                hot_session.turns_since_flush = 0
+                _, _, pending_release, idempotency_keys = self._pending.get(session_id, (None, 0, False, {}))
+                # the keys of a replaced state belong to turns the new state contains as well
+                idempotency_keys = {**idempotency_keys, **hot_session.idempotency_keys}
+                hot_session.idempotency_keys = {}
+                self._pending[session_id] = (
+                    hot_session.committed_state, hot_session.state_version, release or pending_release, idempotency_keys
+                )
+            elif session_id in self._pending:
+                state, state_version, pending_release, idempotency_keys = self._pending[session_id]
+                self._pending[session_id] = (state, state_version, pending_release or release, idempotency_keys)
+            elif force:
+                # nothing left to write, only the ownership to give up
+                self._pending[session_id] = (None, hot_session.state_version, release, {})
+            else:
+                return
+        self._wakeup.set()
+
+    def _write_pending(self, session_id: Optional[uuid.UUID] = None) -> None:
+        """Write queued states, all of them or only the one of `session_id`"""
+        with self._write_lock:
+            with self._pending_lock:
+                if session_id is None:
+                    pending, self._pending = self._pending, {}
+                elif session_id in self._pending:
+                    pending = {session_id: self._pending.pop(session_id)}
+                else:
+                    return
+                self._writing.update((pending_session_id, entry[3]) for pending_session_id, entry in pending.items())
+            for pending_session_id, (state, state_version, release, idempotency_keys) in pending.items():
+                try:
+                    with Session(engine) as db_session:
+                        repository = SessionRepository(db_session)
+                        lease_expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+                        if state is not None:
+                            written = repository.update_owned_game_session(
+                                pending_session_id,
+                                GameSessionUpdate(**state),
+                                self.owner_id,
+                                state_version,
+                                lease_expires_at,
+                                list(idempotency_keys.values()),
+                            )
+                            if not written:
+                                logger.error(
+                                    f"session {pending_session_id} is owned by another worker, "
+                                    f"its turns up to state version {state_version} played here are not written"
+                                )
+                                self._drop_entry(pending_session_id)
+                                continue
+                            with self._entries_lock:
+                                hot_session = self._entries.get(pending_session_id)
+                            if hot_session is not None:
+                                hot_session.written_version = state_version
+                        if release:
+                            repository.release_game_sessions([pending_session_id], self.owner_id)
+                except Exception as e:
+                    logger.error(f"failed to write session {pending_session_id}: {e}")
+                    with self._pending_lock:
+                        newer = self._pending.get(pending_session_id)
+                        if newer is None or newer[0] is None:
+                            # keep it for the next round, with a release asked for meanwhile
+                            self._pending[pending_session_id] = (
+                                state, state_version, release or (newer is not None and newer[2]), idempotency_keys
+                            )
+                        else:
+                            # a newer state was queued meanwhile, it contains the turns of these keys
+                            newer_state, newer_version, newer_release, newer_keys = newer
+                            self._pending[pending_session_id] = (
+                                newer_state, newer_version, newer_release, {**idempotency_keys, **newer_keys}
+                            )
+                finally:
+                    with self._pending_lock:
+                        self._writing.pop(pending_session_id, None)
+
+    def _maintain(self) -> None:
+        """Renew leases, hand off requested sessions and release idle ones"""
+        with self._entries_lock:
+            hot_sessions = dict(self._entries)
+        if not hot_sessions:
+            return
+        with Session(engine) as db_session:
+            handoffs = SessionRepository(db_session).renew_game_session_leases(
+                list(hot_sessions),
+                self.owner_id,
+                datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds),
+            )
+        now = time.monotonic()
+        for session_id, hot_session in hot_sessions.items():
+            if session_id not in handoffs and not self._recover_lease(hot_session):
+                self.discard(session_id)
+                continue
+            hot_session.lease_expires_at = now + self.lease_seconds
+            if handoffs.get(session_id) or now - hot_session.last_used_at > self.idle_seconds:
+                if hot_session.lock.acquire(blocking=False):
+                    try:
+                        logger.debug(f"session {session_id} handed off")
+                        self._drop_entry(session_id)
+                        self._schedule_write(hot_session, release=True, force=True)
+                    finally:
+                        hot_session.lock.release()
+
+    def _recover_lease(self, hot_session: HotSession) -> bool:
+        """
+        Take back the lease of a session whose renewal failed, if no other worker wrote it or holds it meanwhile.
+        Otherwise the turns played here and not written conflict with the other worker's, they are reported as lost.
+        """
+        session_id = hot_session.session.id
+        now = datetime.now(timezone.utc)
+        # no write in flight, the written version is the one of our latest write
+        with self._write_lock, Session(engine) as db_session:
+            repository = SessionRepository(db_session)
+            state_version = repository.claim_game_session(
+                session_id, self.owner_id, now + timedelta(seconds=self.lease_seconds), now
+            )
+            if state_version is not None and state_version == hot_session.written_version:
+                logger.warning(f"session {session_id} lease lapsed, taken back")
+                return True
+            if state_version is not None:
+                # written by another worker meanwhile, whoever loads it next reads that state
+                repository.release_game_sessions([session_id], self.owner_id)
+        with self._pending_lock:
+            pending = self._pending.get(session_id)
+        if (pending is not None and pending[0] is not None) or hot_session.turns_since_flush > 0:
+            logger.error(
+                f"session {session_id} lease lost to another worker, its turns up to turn {hot_session.session.total_turns} "
+                f"played here since state version {hot_session.written_version} are not written"
+            )
+        else:
+            logger.warning(f"session {session_id} lease lost, dropping it from hot cache")
+        return False
+
+    def _ensure_writer(self) -> None:
+        """Start the background writer on first use"""
+        if self._writer is not None:
+            return
+        with self._entries_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="session-cache-writer", daemon=True)
+                self._writer.start()
+
+    def _run_writer(self) -> None:
+        """Background loop writing queued states and keeping leases alive"""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval_seconds)
+            self._wakeup.clear()
+            try:
+                self._write_pending()
+                self._maintain()
+            except Exception as e:
+                logger.error(f"session cache writer error: {e}")
+
+
+session_cache = HotSessionCache(
+    max_size=settings.TURNBENCH_SESSION_CACHE_SIZE,
+    write_every_n_turns=settings.TURNBENCH_SESSION_WRITE_EVERY_N_TURNS,
+    lease_seconds=settings.TURNBENCH_SESSION_LEASE_SECONDS,
+    idle_seconds=settings.TURNBENCH_SESSION_CACHE_IDLE_SECONDS,
+    flush_interval_seconds=settings.TURNBENCH_SESSION_FLUSH_INTERVAL_SECONDS,
+    handoff_timeout_seconds=settings.TURNBENCH_SESSION_HANDOFF_TIMEOUT_SECONDS,
+)
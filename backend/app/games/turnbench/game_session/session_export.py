@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import typing
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+from fastapi import HTTPException
+
+from app.games.turnbench.game_session.session_repository import (
+    ARCHIVE_MANAGED_FIELDS,
+    OWNERSHIP_FIELDS,
+)
+from app.games.turnbench.models.session import GameSession, PlayTurnData
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# session columns repeated on every exported turn record
+TURN_SESSION_COLUMNS = ("session_id", "llm_id", "setup_id", "mode", "created_at")
+
+
+def get_session_columns() -> Dict[str, type]:
+    """exported session columns with their python types"""
+    columns = {}
+    for column in GameSession.__table__.columns:
+        if column.name in OWNERSHIP_FIELDS or column.name in ARCHIVE_MANAGED_FIELDS:
+            continue
+        try:
+            columns[column.name] = column.type.python_type
+        except NotImplementedError:
+            columns[column.name] = str
+    return columns
+
+
+def get_turn_columns() -> Dict[str, type]:
+    """exported turn columns with their python types"""
+    session_columns = get_session_columns()
+    columns = {"session_id": uuid.UUID, **{name: session_columns[name] for name in TURN_SESSION_COLUMNS[1:]}}
+    for name, field in PlayTurnData.model_fields.items():
+        types = [arg for arg in typing.get_args(field.annotation) if arg is not type(None)]
+        columns[name] = types[0] if types else field.annotation
+    return columns
+
+
+def to_turn_records(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """flatten sessions into one record per played turn"""
+    records = []
+    for row in rows:
+        session_info = {"session_id": row["id"], **{name: row[name] for name in TURN_SESSION_COLUMNS[1:]}}
+        for turn in row["turn_result_history"] or []:
+            records.append({**session_info, **turn})
+    return records
+
+
+def encode_records(batches: Iterator[List[Dict[str, Any]]], export_format: str, columns: Dict[str, type]) -> Iterator[bytes]:
+    """encode batches of records, one chunk per batch"""
+    if export_format == "ndjson":
+        return _encode_ndjson(batches)
+    if export_format == "csv":
+        return _encode_csv(batches, columns)
+    if export_format == "parquet":
+        return _encode_parquet(batches, columns)
+    raise HTTPException(status_code=400, detail=f"Unsupported export format {export_format}")
+
+
+def check_format_available(export_format: str) -> None:
+    """fail before streaming starts if the format needs a missing optional dependency"""
+    if export_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Parquet export needs pyarrow, install the `export` extra")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _flat_value(value: Any) -> Any:
+    """scalar value for tabular formats, nested values become json"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _encode_ndjson(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for records in batches:
+        lines = [json.dumps(record, ensure_ascii=False, default=_json_default) for record in records]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _encode_csv(batches: Iterator[List[Dict[str, Any]]], columns: Dict[str, type]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), extrasaction="ignore")
+    writer.writeheader()
+    for records in batches:
+        writer.writerows({name: _flat_value(value) for name, value in record.items()} for record in records)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """write-only file collecting what the parquet writer produced since the last drain"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _encode_parquet(batches: Iterator[List[Dict[str, Any]]], columns: Dict[str, type]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(), datetime: pa.timestamp("us")}
+    schema = pa.schema([(name, arrow_types.get(python_type, pa.string())) for name, python_type in columns.items()])
+    sink = _ChunkSink()
+    # one row group per batch
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for records in batches:
+            if not records:
+                continue
+            table = pa.Table.from_pylist(
+                [{name: _flat_value(record.get(name)) for name in columns} for record in records], schema=schema
+            )
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
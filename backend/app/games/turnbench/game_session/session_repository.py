@@ -1,10 +1,49 @@
+import hashlib
+import json
 import uuid
-from typing import Any, Optional, List
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, List, Tuple
 
+import zstandard
 from sqlmodel import Session, select, func
+from sqlalchemy import update, delete, insert, and_, or_, not_, null, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value, flag_modified
 
-from app.games.turnbench.models.session import GameSession, GameSessionCreate, GameSessionUpdate
+from app.core.config import settings
+from app.games.turnbench.game_search.search_repository import SearchRepository
+from app.games.turnbench.game_stats.stats_repository import StatsRepository, STATS_SOURCE_FIELDS
+from app.games.turnbench.models.session import (
+    GameSession,
+    GameSessionArchive,
+    GameSessionCreate,
+    GameSessionUpdate,
+    SessionFilter,
+    TurnIdempotencyKey,
+    TurnReasoning
+)
+from app.games.turnbench.models.setup import GameSetup
+
+# list columns a fork shares with its parent by reference
+FORK_SHARED_FIELDS = ("messages", "turn_result_history", "turn_message_indexes", "turn_llm_response_indexes")
+# fork columns managed by the repository only
+FORK_MANAGED_FIELDS = {"parent_session_id", "fork_turn", "fork_message_index"}
+# columns tracking which worker owns a session in its hot cache
+OWNERSHIP_FIELDS = {"owner_id", "lease_expires_at", "handoff_requested", "state_version"}
+# bulky columns moved into the compressed archive once a finished session goes cold
+ARCHIVED_FIELDS = (*FORK_SHARED_FIELDS, "turn_messages")
+ARCHIVE_MANAGED_FIELDS = {"archived_at"}
+ARCHIVE_CODEC = "zstd"
+# columns sessions can be listed by
+SESSION_SORT_COLUMNS = {
+    name: getattr(GameSession, name)
+    for name in (
+        "created_at", "updated_at", "mode", "total_rounds", "total_turns",
+        "total_input_tokens", "total_output_tokens", "total_cached_tokens", "total_reasoning_tokens",
+        "total_time", "game_success"
+    )
+}
 
 
 class SessionRepository:
@@ -12,6 +51,8 @@ class SessionRepository:
     
     def __init__(self, session: Session):
         self.session = session
+        self.stats_repository = StatsRepository(session)
+        self.search_repository = SearchRepository(session)
     
     def create_game_session(self, *, game_session_create: GameSessionCreate) -> GameSession:
         """Create game session"""
@@ -21,78 +62,730 @@ class SessionRepository:
         self.session.refresh(db_obj)
         return db_obj
     
+    def create_game_sessions(self, *, game_session_creates: List[GameSessionCreate]) -> List[uuid.UUID]:
+        """Create game sessions with a single executemany insert, return their ids in input order"""
+        rows = [GameSession.model_validate(game_session_create).model_dump() for game_session_create in game_session_creates]
+        if rows:
+            self.session.execute(insert(GameSession), rows)
+            self.session.commit()
+        return [row["id"] for row in rows]
+    
+    def create_forked_game_sessions(
+        self,
+        *,
+        parent: GameSession,
+        forks: List[GameSession]
+    ) -> List[uuid.UUID]:
+        """Create forks of a (stitched) parent session in one transaction"""
+        parent_state = self._get_state_of(parent)
+        parent_session_id, fork_turn, fork_message_index = (
+            parent.id, len(parent_state["turn_result_history"]), len(parent_state["messages"])
+        )
+        # a parent without turns of its own is skipped, so fork chains do not grow on repeated copies
+        if self._is_fork(parent) and (parent.fork_turn, parent.fork_message_index) == (fork_turn, fork_message_index):
+            parent_session_id = parent.parent_session_id
+        for fork in forks:
+            fork.parent_session_id = parent_session_id
+            fork_state = self._get_state_of(fork)
+            fork_state["turn_result_history"] = self._store_reasoning(fork_state["turn_result_history"])
+            self._split_fork_state(fork, parent_state, fork_state)
+            # the shared turns are found through the parent, only the fork's own ones are indexed
+            self.search_repository.index_turns(
+                fork.id, fork_state, list(range(self._first_own_turn(fork), len(fork_state["turn_result_history"])))
+            )
+        fork_ids = [fork.id for fork in forks]
+        self.session.add_all(forks)
+        finished_ids = [fork.id for fork in forks if fork.game_over]
+        if finished_ids:
+            self.session.flush()
+            self.stats_repository.add_sessions(GameSession.id.in_(finished_ids))
+        self.session.commit()
+        return fork_ids
+    
     def get_game_session_by_id(self, session_id: uuid.UUID) -> GameSession | None:
         """Get game session by id"""
         statement = (
             select(GameSession)
-            .where(GameSession.id == session_id)
+            .where(GameSession.id == session_id, GameSession.partition_filter(session_id))
             .execution_options(populate_existing=True)
         )
-        return self.session.exec(statement).first()
+        return self._stitch(self._hydrate_one(self.session.exec(statement).first()))
     
     def get_game_session_by_id_with_llm_info_and_setup_info(self, session_id: uuid.UUID) -> GameSession | None:
         """Get game session by id with llm info"""
         statement = (
             select(GameSession)
-            .where(GameSession.id == session_id)
+            .where(GameSession.id == session_id, GameSession.partition_filter(session_id))
             .options(selectinload(GameSession.llm))
             .options(selectinload(GameSession.turnbench_setup))
+            .execution_options(populate_existing=True)
         )
-        return self.session.exec(statement).first()
+        return self._stitch(self._hydrate_one(self.session.exec(statement).first()))
 
     def update_game_session(self, session_id: uuid.UUID, game_session_update: GameSessionUpdate) -> GameSession:
         """Update game session"""
-        session_data = game_session_update.model_dump(exclude_unset=True)
-        db_session = self.get_game_session_by_id(session_id)
-        db_session.sqlmodel_update(session_data)
+        session_data = game_session_update.model_dump(exclude_unset=True, exclude=FORK_MANAGED_FIELDS)
+        # the stored state must be read before any pending in-memory changes get flushed
+        with self.session.no_autoflush:
+            db_session = self.get_game_session_by_id(session_id)
+            old_state = self._get_state_of(db_session)
+            old_first_own_turn = self._first_own_turn(db_session)
+            # a finished session is taken out of the stats and added back with its new values
+            by_id = and_(GameSession.id == session_id, GameSession.partition_filter(session_id))
+            if db_session.game_over:
+                self.stats_repository.add_sessions(by_id, -1)
+            # a rewritten archived session moves back to the hot table
+            self._unarchive(db_session)
+            db_session.sqlmodel_update(session_data)
+            db_session.turn_result_history = self._store_reasoning(db_session.turn_result_history)
+            new_state = self._get_state_of(db_session)
+
+            # copy on write: forks sharing a rewritten part of this session get their own copy first
+            children = self._get_children(db_session.id)
+            if children:
+                turns, message_index = self._common_prefix(old_state, new_state)
+                self._rebase_children(children, old_state, turns, message_index, db_session.id)
+            if self._is_fork(db_session):
+                parent_state = self._get_prefix_state(
+                    db_session.parent_session_id, db_session.fork_turn, db_session.fork_message_index
+                )
+                self._split_fork_state(db_session, parent_state, new_state)
+
+            # turns a fork stopped sharing with its parent are its own now, and indexed as such
+            old_turns, new_turns = old_state["turn_result_history"], new_state["turn_result_history"]
+            first_own_turn = self._first_own_turn(db_session)
+            self.search_repository.delete_turns_outside(db_session.id, first_own_turn, len(new_turns))
+            self.search_repository.index_turns(db_session.id, new_state, [
+                i for i in range(first_own_turn, len(new_turns))
+                if i >= len(old_turns) or i < old_first_own_turn or old_turns[i] != new_turns[i]
+            ])
+
         self.session.add(db_session)
+        if db_session.game_over:
+            self.session.flush()
+            self.stats_repository.add_sessions(by_id)
         self.session.commit()
         # self.session.refresh(db_session)
+        for field in FORK_SHARED_FIELDS:
+            set_committed_value(db_session, field, new_state[field])
         return db_session
     
+    def save_turn_reasoning(self, turn_result_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store the model level reasoning content of turns, return the turns referencing it by hash"""
+        turns = self._store_reasoning(turn_result_history)
+        self.session.commit()
+        return turns
+    
+    def get_turn_reasoning(self, reasoning_hash: str) -> TurnReasoning | None:
+        """Get the model level reasoning content of a turn by its hash"""
+        return self.session.get(TurnReasoning, reasoning_hash)
+    
+    def lock_game_session(self, session_id: uuid.UUID) -> None:
+        """Hold a postgres advisory lock on the session until the transaction ends"""
+        if self.session.get_bind().dialect.name != "postgresql":
+            return
+        lock_key = int.from_bytes(session_id.bytes[:8], "big", signed=True)
+        self.session.execute(text("SELECT pg_advisory_xact_lock(:lock_key)"), {"lock_key": lock_key})
+
+    def get_turn_idempotency_key(self, session_id: uuid.UUID, key: str, created_from: datetime) -> TurnIdempotencyKey | None:
+        """Get the turn stored for an idempotency key, unless it is older than `created_from`"""
+        statement = select(TurnIdempotencyKey).where(
+            TurnIdempotencyKey.session_id == session_id,
+            TurnIdempotencyKey.key == key,
+            TurnIdempotencyKey.created_at >= created_from
+        )
+        return self.session.exec(statement).first()
+
+    def save_turn_idempotency_key(self, turn_idempotency_key: TurnIdempotencyKey, commit: bool = True) -> None:
+        """Store the turn of an idempotency key, replacing an expired one"""
+        self.session.merge(turn_idempotency_key)
+        if commit:
+            self.session.commit()
+
+    def delete_turn_idempotency_keys_created_before(self, created_before: datetime) -> int:
+        """Delete idempotency keys created before a date"""
+        result = self.session.execute(delete(TurnIdempotencyKey).where(TurnIdempotencyKey.created_at < created_before))
+        self.session.commit()
+        return result.rowcount
+    
     def delete_game_session_by_id(self, session_id: uuid.UUID) -> bool:
         """Delete game session by id"""
         db_session = self.get_game_session_by_id(session_id)
         if db_session:
+            # forks of this session are re-pointed to its parent before it goes away
+            self._rebase_children(
+                self._get_children(db_session.id),
+                self._get_state_of(db_session),
+                db_session.fork_turn if db_session.parent_session_id else 0,
+                db_session.fork_message_index if db_session.parent_session_id else 0,
+                db_session.parent_session_id,
+            )
+            self.session.execute(delete(GameSessionArchive).where(GameSessionArchive.session_id == db_session.id))
+            self.search_repository.delete_documents([db_session.id])
+            if db_session.game_over:
+                self.stats_repository.add_sessions(
+                    and_(GameSession.id == session_id, GameSession.partition_filter(session_id)), -1
+                )
             self.session.delete(db_session)
             self.session.commit()
             return True
         return False
     
+    def delete_game_sessions_created_before(self, created_before: datetime) -> int:
+        """Delete all sessions created before `created_before` in one statement and transaction, return how many were deleted"""
+        self.detach_game_sessions_created_between(None, created_before)
+        statement = delete(GameSession).where(GameSession.created_at < created_before)
+        deleted = self.session.execute(statement).rowcount
+        self.session.commit()
+        return deleted
+
+    def detach_game_sessions_created_between(self, created_from: Optional[datetime], created_before: datetime) -> None:
+        """
+        Prepare the removal of the sessions created in [created_from, created_before), in the current transaction:
+        forks created later get their own copy of the shared turns, archives and search documents are deleted,
+        the sessions are taken out of the stats
+        """
+        in_range = GameSession.created_at < created_before
+        if created_from is not None:
+            in_range = and_(GameSession.created_at >= created_from, in_range)
+        self._prepare_removal(in_range)
+        self.stats_repository.add_sessions(in_range, -1)
+
+    def delete_game_sessions(self, *, session_filter: SessionFilter, batch_size: int, now: datetime) -> int:
+        """Delete filtered sessions not held by a worker, in batches of one short transaction each"""
+        deleted = 0
+        while True:
+            statement = (
+                self._apply_filter(select(GameSession.id), session_filter)
+                .where(self._not_owned(now))
+                .order_by(GameSession.id)
+                .limit(batch_size)
+            )
+            session_ids = list(self.session.exec(statement).all())
+            if not session_ids:
+                break
+            self._prepare_removal(GameSession.id.in_(session_ids))
+            self.stats_repository.add_sessions(GameSession.id.in_(session_ids), -1)
+            deleted += self.session.execute(delete(GameSession).where(GameSession.id.in_(session_ids))).rowcount
+            self.session.commit()
+            if len(session_ids) < batch_size:
+                break
+        return deleted
+
+    def update_game_sessions(self, *, session_filter: SessionFilter, values: Dict[str, Any], batch_size: int, now: datetime) -> int:
+        """Set `values` on filtered sessions not held by a worker, in batches of one statement and transaction each"""
+        updated = 0
+        last_session_id: Optional[uuid.UUID] = None
+        # changed stats columns need the batch before and after the update
+        counted = bool(values.keys() & STATS_SOURCE_FIELDS)
+        while True:
+            batch_ids = self._apply_filter(select(GameSession.id), session_filter).where(self._not_owned(now))
+            if last_session_id is not None:
+                batch_ids = batch_ids.where(GameSession.id > last_session_id)
+            batch_ids = batch_ids.order_by(GameSession.id).limit(batch_size)
+            if counted:
+                batch_ids = list(self.session.exec(batch_ids).all())
+                self.stats_repository.add_sessions(GameSession.id.in_(batch_ids), -1)
+            statement = (
+                update(GameSession)
+                .where(GameSession.id.in_(batch_ids))
+                .values(**values, updated_at=now)
+                .returning(GameSession.id)
+            )
+            session_ids = list(self.session.execute(statement).scalars().all())
+            if counted:
+                self.stats_repository.add_sessions(GameSession.id.in_(session_ids))
+            self.session.commit()
+            updated += len(session_ids)
+            if len(session_ids) < batch_size:
+                break
+            last_session_id = max(session_ids)
+        return updated
+    
+    def select_game_session_ids(self, session_filter: SessionFilter) -> Any:
+        """Statement selecting the ids of the filtered sessions, to be used as a subquery"""
+        return self._apply_filter(select(GameSession.id), session_filter)
+    
     def list_game_sessions(
         self, 
         *, 
         skip: int = 0, 
         limit: int = 100,
-        llm_id: Optional[str] = None,
-        setup_id: Optional[str] = None,
+        session_filter: SessionFilter,
+        sort_by: List[str],
     ) -> tuple[List[GameSession], int]:
-        """Get game sessions list with filters"""
-        statement = select(GameSession)
-        count_statement = select(func.count(GameSession.id))
-        
-        # Apply filters
-        if llm_id:
-            statement = statement.where(GameSession.llm_id == llm_id)
-            count_statement = count_statement.where(GameSession.llm_id == llm_id)
-        
-        if setup_id:
-            statement = statement.where(GameSession.setup_id == setup_id)
-            count_statement = count_statement.where(GameSession.setup_id == setup_id)
-        
+        """Get game sessions list with filters, sorted by `sort_by` columns ("-" prefix for descending)"""
+        # count(*) lets postgres answer from the filter indexes alone
+        count_statement = self._apply_filter(select(func.count()).select_from(GameSession), session_filter)
         total = self.session.exec(count_statement).first()
         
-        statement = statement.offset(skip).limit(limit).order_by(GameSession.created_at.desc())
-        sessions = list(self.session.exec(statement).all())
+        order_by = [
+            SESSION_SORT_COLUMNS[name[1:]].desc() if name.startswith("-") else SESSION_SORT_COLUMNS[name].asc()
+            for name in sort_by
+        ]
+        statement = (
+            self._apply_filter(select(GameSession), session_filter)
+            .order_by(*order_by, GameSession.id)
+            .offset(skip).limit(limit)
+            .execution_options(populate_existing=True)
+        )
+        sessions = self._hydrate(list(self.session.exec(statement).all()))
+        state_cache: Dict[uuid.UUID, Dict[str, list]] = {}
+        for game_session in sessions:
+            self._stitch(game_session, state_cache)
         
         return sessions, total or 0
     
+    def iter_game_session_batches(
+        self,
+        *,
+        session_filter: SessionFilter,
+        batch_size: int = 500
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Stream filtered sessions as plain column dicts with their full turns, `batch_size` rows at a time"""
+        statement = (
+            self._apply_filter(select(*GameSession.__table__.columns), session_filter)
+            .order_by(GameSession.created_at, GameSession.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for partition in self.session.execute(statement).mappings().partitions():
+            rows = [dict(row) for row in partition]
+            archived_ids = [row["id"] for row in rows if row["archived_at"] is not None]
+            archived_states = self._get_archived_states(archived_ids) if archived_ids else {}
+            # parents are usually exported in the same batch, the cache is dropped with it to keep memory flat
+            state_cache: Dict[uuid.UUID, Dict[str, list]] = {}
+            for row in rows:
+                row.update(archived_states.get(row["id"], {}))
+                if row["parent_session_id"] is not None and (row["fork_turn"] or row["fork_message_index"]):
+                    prefix = self._get_prefix_state(
+                        row["parent_session_id"], row["fork_turn"], row["fork_message_index"], state_cache
+                    )
+                    for field in FORK_SHARED_FIELDS:
+                        row[field] = prefix[field] + list(row[field] or [])
+                for field in (*OWNERSHIP_FIELDS, *ARCHIVE_MANAGED_FIELDS):
+                    row.pop(field, None)
+            yield rows
+
     def get_game_session_with_game_and_llm_info(self, session_id: uuid.UUID) -> GameSession | None:
         """Get game session with game info"""
         statement = (
             select(GameSession)
-            .where(GameSession.id == session_id)
+            .where(GameSession.id == session_id, GameSession.partition_filter(session_id))
             .options(selectinload(GameSession.llm))
             .options(selectinload(GameSession.setup))
         )
-        return self.session.exec(statement).first()
\ No newline at end of file
+        return self.session.exec(statement).first()
+
+    def archive_game_sessions(self, *, updated_before: datetime, limit: int) -> int:
+        """Compress the bulky columns of finished sessions not updated since `updated_before`, return how many were archived"""
+        archived_at = datetime.now(timezone.utc)
+        statement = (
+            select(GameSession.id, *[getattr(GameSession, field) for field in ARCHIVED_FIELDS])
+            .where(GameSession.game_over == True)  # noqa: E712
+            .where(GameSession.archived_at.is_(None))
+            # a lease left behind by a crashed worker does not keep a session from being archived
+            .where(self._not_owned(archived_at))
+            .where(GameSession.updated_at < updated_before)
+            .order_by(GameSession.updated_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = self.session.exec(statement).all()
+        if not rows:
+            self.session.rollback()
+            return 0
+
+        compressor = zstandard.ZstdCompressor(level=settings.TURNBENCH_SESSION_ARCHIVE_ZSTD_LEVEL)
+        archives = []
+        for session_id, *values in rows:
+            raw = json.dumps(dict(zip(ARCHIVED_FIELDS, values, strict=True)), ensure_ascii=False).encode("utf-8")
+            archives.append({
+                "session_id": session_id,
+                "codec": ARCHIVE_CODEC,
+                "raw_size": len(raw),
+                "data": compressor.compress(raw),
+                "archived_at": archived_at,
+            })
+        self.session.execute(insert(GameSessionArchive), archives)
+        self.session.execute(
+            update(GameSession)
+            .where(GameSession.id.in_([archive["session_id"] for archive in archives]))
+            .values(archived_at=archived_at, **{field: null() for field in ARCHIVED_FIELDS})
+        )
+        self.session.commit()
+        return len(archives)
+
+    def claim_game_session(
+        self,
+        session_id: uuid.UUID,
+        owner_id: str,
+        lease_expires_at: datetime,
+        now: datetime
+    ) -> Optional[int]:
+        """Take ownership of a session unless another owner holds a valid lease, return its state version"""
+        statement = (
+            update(GameSession)
+            .where(GameSession.id == session_id, GameSession.partition_filter(session_id))
+            .where(or_(
+                GameSession.owner_id.is_(None),
+                GameSession.owner_id == owner_id,
+                GameSession.lease_expires_at < now,
+            ))
+            .values(owner_id=owner_id, lease_expires_at=lease_expires_at, handoff_requested=False)
+            .returning(GameSession.state_version)
+        )
+        state_version = self.session.execute(statement).scalar_one_or_none()
+        self.session.commit()
+        return state_version
+
+    def request_game_session_handoff(self, session_id: uuid.UUID) -> bool:
+        """Ask the current owner of a session to flush and release it, return False if nobody owns it"""
+        statement = (
+            update(GameSession)
+            .where(GameSession.id == session_id, GameSession.partition_filter(session_id))
+            .where(GameSession.owner_id.is_not(None))
+            .values(handoff_requested=True)
+        )
+        requested = self.session.execute(statement).rowcount > 0
+        self.session.commit()
+        return requested
+
+    def renew_game_session_leases(
+        self,
+        session_ids: List[uuid.UUID],
+        owner_id: str,
+        lease_expires_at: datetime
+    ) -> Dict[uuid.UUID, bool]:
+        """Extend the leases of owned sessions, return whether a handoff was requested for each"""
+        if not session_ids:
+            return {}
+        statement = (
+            update(GameSession)
+            .where(GameSession.id.in_(session_ids))
+            .where(GameSession.owner_id == owner_id)
+            .values(lease_expires_at=lease_expires_at)
+            .returning(GameSession.id, GameSession.handoff_requested)
+        )
+        renewed = dict(self.session.execute(statement).all())
+        self.session.commit()
+        return renewed
+
+    def release_game_sessions(self, session_ids: List[uuid.UUID], owner_id: str) -> None:
+        """Give up ownership of sessions"""
+        if not session_ids:
+            return
+        statement = (
+            update(GameSession)
+            .where(GameSession.id.in_(session_ids))
+            .where(GameSession.owner_id == owner_id)
+            .values(owner_id=None, lease_expires_at=None, handoff_requested=False)
+        )
+        self.session.execute(statement)
+        self.session.commit()
+
+    def update_owned_game_session(
+        self,
+        session_id: uuid.UUID,
+        game_session_update: GameSessionUpdate,
+        owner_id: str,
+        state_version: int,
+        lease_expires_at: datetime,
+        turn_idempotency_keys: Optional[List[TurnIdempotencyKey]] = None
+    ) -> bool:
+        """Update a game session only if `owner_id` still owns it, the idempotency keys of its new turns in the same transaction"""
+        statement = (
+            update(GameSession)
+            .where(GameSession.id == session_id, GameSession.partition_filter(session_id))
+            .where(GameSession.owner_id == owner_id)
+            .values(state_version=state_version, lease_expires_at=lease_expires_at)
+        )
+        if self.session.execute(statement).rowcount == 0:
+            self.session.rollback()
+            return False
+        for turn_idempotency_key in turn_idempotency_keys or []:
+            self.save_turn_idempotency_key(turn_idempotency_key, commit=False)
+        self.update_game_session(session_id, game_session_update)
+        return True
+
+    def _prepare_removal(self, removed: Any) -> None:
+        """Before the sessions matching `removed` go away, forks outside of them get their own copy of the shared turns, archives and search documents are deleted"""
+        removed_ids = select(GameSession.id).where(removed)
+        statement = (
+            select(GameSession)
+            .where(GameSession.parent_session_id.in_(removed_ids))
+            .where(not_(removed))
+            .execution_options(populate_existing=True)
+        )
+        children_by_parent: Dict[uuid.UUID, List[GameSession]] = {}
+        for child in self._hydrate(list(self.session.exec(statement).all())):
+            children_by_parent.setdefault(child.parent_session_id, []).append(child)
+        with self.session.no_autoflush:
+            state_cache: Dict[uuid.UUID, Dict[str, list]] = {}
+            for parent_session_id, children in children_by_parent.items():
+                self._rebase_children(children, self._get_full_state(parent_session_id, state_cache), 0, 0, None)
+        self.session.flush()
+        self.session.execute(delete(GameSessionArchive).where(GameSessionArchive.session_id.in_(removed_ids)))
+        self.search_repository.delete_documents(removed_ids)
+
+    @staticmethod
+    def _not_owned(now: datetime) -> Any:
+        """Condition for sessions no worker currently holds in its hot cache"""
+        return or_(GameSession.owner_id.is_(None), GameSession.lease_expires_at < now)
+
+    @staticmethod
+    def _apply_filter(statement: Any, session_filter: SessionFilter) -> Any:
+        """Add the conditions of a session filter to a statement"""
+        if session_filter.llm_ids:
+            statement = statement.where(GameSession.llm_id.in_(session_filter.llm_ids))
+        if session_filter.setup_ids:
+            statement = statement.where(GameSession.setup_id.in_(session_filter.setup_ids))
+        if session_filter.modes:
+            statement = statement.where(GameSession.mode.in_(session_filter.modes))
+        if session_filter.prompt_layouts:
+            statement = statement.where(GameSession.prompt_layout.in_(session_filter.prompt_layouts))
+        if session_filter.context_strategies:
+            statement = statement.where(GameSession.context_strategy.in_(session_filter.context_strategies))
+        if session_filter.output_modes:
+            statement = statement.where(GameSession.output_mode.in_(session_filter.output_modes))
+        if session_filter.retry_modes:
+            statement = statement.where(GameSession.retry_mode.in_(session_filter.retry_modes))
+        if session_filter.created_from is not None:
+            statement = statement.where(GameSession.created_at >= session_filter.created_from)
+        if session_filter.created_before is not None:
+            statement = statement.where(GameSession.created_at < session_filter.created_before)
+        if session_filter.game_over is not None:
+            statement = statement.where(GameSession.game_over == session_filter.game_over)
+        if session_filter.game_success is not None:
+            statement = statement.where(GameSession.game_success == session_filter.game_success)
+        if session_filter.game_over_reasons:
+            statement = statement.where(GameSession.game_over_reason.in_(session_filter.game_over_reasons))
+        if session_filter.difficulties:
+            setup_ids = select(GameSetup.id).where(GameSetup.difficulty.in_(session_filter.difficulties))
+            statement = statement.where(GameSession.setup_id.in_(setup_ids))
+        for column, low, high in (
+            (GameSession.total_rounds, session_filter.total_rounds_min, session_filter.total_rounds_max),
+            (GameSession.total_input_tokens, session_filter.total_input_tokens_min, session_filter.total_input_tokens_max),
+            (GameSession.total_output_tokens, session_filter.total_output_tokens_min, session_filter.total_output_tokens_max),
+        ):
+            if low is not None:
+                statement = statement.where(column >= low)
+            if high is not None:
+                statement = statement.where(column <= high)
+        return statement
+
+    def _store_reasoning(self, turn_result_history: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Move the model level reasoning content out of turns into the reasoning table, turns keep its hash"""
+        turns = []
+        contents: Dict[str, str] = {}
+        for turn in turn_result_history or []:
+            content = turn.get("turn_model_level_reasoning")
+            if content:
+                reasoning_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                contents[reasoning_hash] = content
+                turn = {**turn, "turn_model_level_reasoning": None, "turn_model_level_reasoning_hash": reasoning_hash}
+            turns.append(turn)
+        if contents:
+            dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(self.session.get_bind().dialect.name)
+            rows = [{"hash": reasoning_hash, "content": content} for reasoning_hash, content in contents.items()]
+            if dialect is not None:
+                statement = dialect.insert(TurnReasoning).values(rows).on_conflict_do_nothing(index_elements=["hash"])
+                self.session.execute(statement)
+            else:
+                existing = set(self.session.exec(select(TurnReasoning.hash).where(TurnReasoning.hash.in_(contents))).all())
+                self.session.add_all([TurnReasoning(**row) for row in rows if row["hash"] not in existing])
+        return turns
+
+    def _hydrate(self, db_sessions: List[GameSession]) -> List[GameSession]:
+        """Fill in the archived columns of archived sessions, without marking them dirty"""
+        archived_ids = [db_session.id for db_session in db_sessions if db_session.archived_at is not None]
+        if archived_ids:
+            states = self._get_archived_states(archived_ids)
+            for db_session in db_sessions:
+                if db_session.id in states:
+                    for field in ARCHIVED_FIELDS:
+                        set_committed_value(db_session, field, states[db_session.id].get(field))
+        return db_sessions
+
+    def _hydrate_one(self, db_session: GameSession | None) -> GameSession | None:
+        """Fill in the archived columns of a single session"""
+        if db_session is not None:
+            self._hydrate([db_session])
+        return db_session
+
+    def _get_archived_states(self, session_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """Read and decompress the archived columns of sessions"""
+        statement = select(GameSessionArchive).where(GameSessionArchive.session_id.in_(session_ids))
+        decompressor = zstandard.ZstdDecompressor()
+        states = {}
+        for archive in self.session.exec(statement).all():
+            if archive.codec != ARCHIVE_CODEC:
+                raise ValueError(f"Unknown archive codec {archive.codec} for session {archive.session_id}")
+            states[archive.session_id] = json.loads(decompressor.decompress(archive.data, max_output_size=archive.raw_size))
+        missing = set(session_ids) - states.keys()
+        if missing:
+            raise ValueError(f"Archive of sessions {missing} not found")
+        return states
+
+    def _unarchive(self, db_session: GameSession) -> None:
+        """Write a (hydrated) archived session's columns back to the session table on the next flush"""
+        if db_session.archived_at is None:
+            return
+        for field in ARCHIVED_FIELDS:
+            flag_modified(db_session, field)
+        db_session.archived_at = None
+        self.session.execute(delete(GameSessionArchive).where(GameSessionArchive.session_id == db_session.id))
+
+    def _stitch(
+        self,
+        db_session: GameSession | None,
+        state_cache: Optional[Dict[uuid.UUID, Dict[str, list]]] = None
+    ) -> GameSession | None:
+        """Prepend the shared parent prefix to a fork's own turns, without marking it dirty"""
+        if db_session is None or not self._is_fork(db_session):
+            return db_session
+        prefix = self._get_prefix_state(
+            db_session.parent_session_id, db_session.fork_turn, db_session.fork_message_index, state_cache
+        )
+        for field in FORK_SHARED_FIELDS:
+            set_committed_value(db_session, field, prefix[field] + list(getattr(db_session, field) or []))
+        return db_session
+
+    def _get_full_state(
+        self,
+        session_id: uuid.UUID,
+        state_cache: Optional[Dict[uuid.UUID, Dict[str, list]]] = None
+    ) -> Dict[str, list]:
+        """Get the stitched list columns of a session, walking up its parent chain"""
+        if state_cache is not None and session_id in state_cache:
+            return state_cache[session_id]
+        statement = select(
+            GameSession.parent_session_id,
+            GameSession.fork_turn,
+            GameSession.fork_message_index,
+            GameSession.archived_at,
+            *[getattr(GameSession, field) for field in FORK_SHARED_FIELDS],
+        ).where(GameSession.id == session_id, GameSession.partition_filter(session_id))
+        row = self.session.exec(statement).first()
+        if row is None:
+            raise ValueError(f"Parent session {session_id} not found")
+        parent_session_id, fork_turn, fork_message_index, archived_at, *own = row
+        if archived_at is not None:
+            archived = self._get_archived_states([session_id])[session_id]
+            own = [archived[field] for field in FORK_SHARED_FIELDS]
+        own_state = {field: list(value or []) for field, value in zip(FORK_SHARED_FIELDS, own, strict=True)}
+        if parent_session_id is None or not (fork_turn or fork_message_index):
+            state = own_state
+        else:
+            prefix = self._get_prefix_state(parent_session_id, fork_turn, fork_message_index, state_cache)
+            state = {field: prefix[field] + own_state[field] for field in FORK_SHARED_FIELDS}
+        if state_cache is not None:
+            state_cache[session_id] = state
+        return state
+
+    def _get_prefix_state(
+        self,
+        parent_session_id: uuid.UUID,
+        fork_turn: int,
+        fork_message_index: int,
+        state_cache: Optional[Dict[uuid.UUID, Dict[str, list]]] = None
+    ) -> Dict[str, list]:
+        """Get the part of a parent session shared with its fork"""
+        parent_state = self._get_full_state(parent_session_id, state_cache)
+        return {
+            "messages": parent_state["messages"][:fork_message_index],
+            "turn_result_history": parent_state["turn_result_history"][:fork_turn],
+            "turn_message_indexes": parent_state["turn_message_indexes"][:fork_turn],
+            "turn_llm_response_indexes": parent_state["turn_llm_response_indexes"][:fork_turn],
+        }
+
+    def _split_fork_state(self, db_session: GameSession, parent_state: Dict[str, list], state: Dict[str, list]) -> None:
+        """Keep only the part of a fork's state that differs from its parent prefix"""
+        turns, message_index = self._common_prefix(parent_state, state)
+        db_session.fork_turn = turns
+        db_session.fork_message_index = message_index
+        db_session.messages = state["messages"][message_index:]
+        for field in ("turn_result_history", "turn_message_indexes", "turn_llm_response_indexes"):
+            setattr(db_session, field, state[field][turns:])
+
+    def _get_children(self, session_id: uuid.UUID) -> List[GameSession]:
+        """Get the forks that reference a session, with their own (unstitched) turns"""
+        statement = (
+            select(GameSession)
+            .where(GameSession.parent_session_id == session_id)
+            .execution_options(populate_existing=True)
+        )
+        return self._hydrate(list(self.session.exec(statement).all()))
+
+    def _rebase_children(
+        self,
+        children: List[GameSession],
+        state: Dict[str, list],
+        turns: int,
+        message_index: int,
+        new_parent_session_id: Optional[uuid.UUID]
+    ) -> None:
+        """Copy the part of `state` beyond (turns, message_index) into the forks that share it"""
+        for child in children:
+            child_turns = min(child.fork_turn, turns)
+            child_message_index = min(child.fork_message_index, message_index)
+            if child_turns < child.fork_turn:
+                child_message_index = min(child_message_index, self._message_boundary(state, child_turns))
+            if (
+                child.parent_session_id == new_parent_session_id
+                and (child_turns, child_message_index) == (child.fork_turn, child.fork_message_index)
+            ):
+                continue
+            self._unarchive(child)
+            # the copied turns are the child's own from now on
+            self.search_repository.index_turns(child.id, state, list(range(child_turns, child.fork_turn)))
+            child.messages = state["messages"][child_message_index:child.fork_message_index] + list(child.messages or [])
+            for field in ("turn_result_history", "turn_message_indexes", "turn_llm_response_indexes"):
+                setattr(child, field, state[field][child_turns:child.fork_turn] + list(getattr(child, field) or []))
+            child.fork_turn = child_turns
+            child.fork_message_index = child_message_index
+            child.parent_session_id = new_parent_session_id
+            self.session.add(child)
+
+    @classmethod
+    def _common_prefix(cls, base: Dict[str, list], state: Dict[str, list]) -> Tuple[int, int]:
+        """Get the number of leading turns and messages `state` still shares with `base`"""
+        turns = 0
+        max_turns = min(len(base["turn_result_history"]), len(state["turn_result_history"]))
+        while turns < max_turns and all(
+            base[field][turns] == state[field][turns]
+            for field in ("turn_result_history", "turn_message_indexes", "turn_llm_response_indexes")
+        ):
+            turns += 1
+
+        message_index = cls._message_boundary(base, turns)
+        first_diff = min(message_index, len(state["messages"]))
+        for i in range(first_diff):
+            if base["messages"][i] != state["messages"][i]:
+                first_diff = i
+                break
+        while turns > 0 and first_diff < message_index:
+            turns -= 1
+            message_index = cls._message_boundary(base, turns)
+        return turns, min(message_index, first_diff)
+
+    @staticmethod
+    def _message_boundary(state: Dict[str, list], turns: int) -> int:
+        """Get the index of the first message after the first `turns` turns"""
+        if turns < len(state["turn_message_indexes"]):
+            return state["turn_message_indexes"][turns]
+        return len(state["messages"])
+
+    @staticmethod
+    def _get_state_of(db_session: GameSession) -> Dict[str, list]:
+        """Get the list columns of an in-memory session"""
+        return {field: list(getattr(db_session, field) or []) for field in FORK_SHARED_FIELDS}
+
+    @staticmethod
+    def _is_fork(db_session: GameSession) -> bool:
+        """Check whether a session shares a prefix with a parent session"""
+        return db_session.parent_session_id is not None and bool(db_session.fork_turn or db_session.fork_message_index)
+
+    @classmethod
+    def _first_own_turn(cls, db_session: GameSession) -> int:
+        """Get the index of the first turn a session does not share with a parent session"""
+        return db_session.fork_turn if cls._is_fork(db_session) else 0
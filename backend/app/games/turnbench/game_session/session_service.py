@@ -1,27 +1,56 @@
 import re
-from copy import deepcopy
-from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 
 import uuid
 from fastapi import HTTPException
 from sqlmodel import Session
 
 from app.core.config import settings
+from app.core.partitions import is_partitioned, drop_partitions_before
 from app.utils import setup_logger
 from app.models.llm import LLM, LLMCompleteResponse
 from app.games.turnbench.config import GAME_NAME
 from app.games.turnbench.verifier.models import Verifier
 from app.games.turnbench.verifier.verifier_manager import verifier_manager
-from app.games.turnbench.game_session.session_repository import SessionRepository
+from app.games.turnbench.llm.prompt_manager import prompt_manager
+from app.games.turnbench.game_setup.setup_service import SetupService
+from app.games.turnbench.game_search.search_repository import SearchRepository
+from app.games.turnbench.game_loop.game_engine import GameRules, GameState, TurnRecord, get_criterion_checks
+from app.games.turnbench.game_session.session_repository import (
+    SessionRepository,
+    FORK_SHARED_FIELDS,
+    OWNERSHIP_FIELDS,
+    ARCHIVE_MANAGED_FIELDS,
+    SESSION_SORT_COLUMNS
+)
+from app.games.turnbench.game_session.context_strategies import get_context_messages
+from app.games.turnbench.game_session.session_export import (
+    encode_records,
+    get_session_columns,
+    get_turn_columns,
+    to_turn_records
+)
+from app.games.turnbench.models.search import SearchTurnsRequest, TurnSearchHit
+from app.games.turnbench.models.setup import GameSetupDetail, GameSetupPublic
 from app.games.turnbench.models.session import (
+    CreateSessionRequest,
+    ExportSessionsRequest,
+    GameSessionBulkUpdate,
+    ListSessionsRequest,
+    SessionFilter,
     GameSession, 
     GameSessionCreate, 
     GameSessionUpdate,
-    PlayTurnData
+    PlayTurnData,
+    TurnIdempotencyKey
 )
 
 logger = setup_logger(f"{GAME_NAME}-SessionService", settings.LOG_LEVEL)
 
+# prefix stable sessions never rewrite earlier messages, edits of a played turn are stated in a new message
+TURN_EDIT_MESSAGE = "Turn {turn_num} ({turn_name}) has been edited, use the following instead of what was said in that turn:\n{changes}"
+
 class SessionService:
     """
     Service layer for session-related operations.
@@ -29,14 +58,22 @@ class SessionService:
     def __init__(self, session: Session):
         self.session = session
         self.session_repository = SessionRepository(session)
+        self.search_repository = SearchRepository(session)
 
-    def get_sessions(self, page: int, page_size: int, llm_id: Optional[str] = None, setup_id: Optional[str] = None) -> List[GameSession]:
-        """get sessions"""
+    def get_sessions(self, list_request: ListSessionsRequest) -> Tuple[List[GameSession], int]:
+        """get filtered sessions"""
+        if list_request.page < 1:
+            raise HTTPException(status_code=400, detail="Page cannot be less than 1")
+        if list_request.page_size <= 0:
+            raise HTTPException(status_code=400, detail="Page size must be greater than 0")
+        unknown = [name for name in list_request.sort_by if name.removeprefix("-") not in SESSION_SORT_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Cannot sort sessions by {', '.join(unknown)}")
         sessions, total = self.session_repository.list_game_sessions(
-            skip=(page - 1) * page_size, 
-            limit=page_size, 
-            llm_id=llm_id, 
-            setup_id=setup_id
+            skip=(list_request.page - 1) * list_request.page_size, 
+            limit=list_request.page_size, 
+            session_filter=list_request,
+            sort_by=list_request.sort_by
         )
         logger.debug(f"get {len(sessions)} sessions")
         return sessions, total
@@ -61,26 +98,254 @@ class SessionService:
         """create session"""
         return self.session_repository.create_game_session(game_session_create=session_create)
     
+    def build_session_create(self, session_request: CreateSessionRequest, setup_info: GameSetupPublic) -> GameSessionCreate:
+        """build a new session with the setup's game info and verifier descriptions, prompts and system message"""
+        verifier_details = verifier_manager.get_verifier_by_ids(setup_info.verifier_ids)
+        verifier_descriptions = verifier_manager.get_verifier_descriptions(verifier_details)
+
+        game_info_detail = GameSetupDetail(
+            **setup_info.model_dump(), 
+            verifier_details=[vd.model_dump() for vd in verifier_details]
+        )
+
+        game_info_detail_json = game_info_detail.model_dump()
+        game_info_detail_json["id"] = str(game_info_detail.id)
+        game_info_detail_json["created_at"] = game_info_detail.created_at.isoformat()
+        game_info_detail_json["updated_at"] = game_info_detail.updated_at.isoformat()
+
+        base_prompts = prompt_manager.build_prompt_model(mode=session_request.mode)
+
+        session_create = GameSessionCreate(
+            **session_request.model_dump(),
+            game_info=game_info_detail_json,
+            verifier_descriptions=verifier_descriptions,
+            base_game_prompts=base_prompts.model_dump()
+        )
+        self.add_system_message(session_create)
+        return session_create
+
+    def create_sessions(self, session_requests: List[CreateSessionRequest]) -> List[uuid.UUID]:
+        """create sessions in one transaction, setups are read once and prompts rendered once per (setup, mode, layout)"""
+        setups = SetupService(self.session).get_setups_public_by_ids(
+            list({session_request.setup_id for session_request in session_requests})
+        )
+        templates: Dict[Tuple[uuid.UUID, str, str], GameSessionCreate] = {}
+        session_creates = []
+        for session_request in session_requests:
+            key = (session_request.setup_id, session_request.mode, session_request.prompt_layout)
+            if key not in templates:
+                templates[key] = self.build_session_create(session_request, setups[session_request.setup_id])
+            session_creates.append(templates[key].model_copy(
+                update={
+                    "llm_id": session_request.llm_id,
+                    "max_rounds": session_request.max_rounds,
+                    "context_strategy": session_request.context_strategy,
+                    "output_mode": session_request.output_mode,
+                    "retry_mode": session_request.retry_mode,
+                }
+            ))
+        session_ids = self.session_repository.create_game_sessions(game_session_creates=session_creates)
+        logger.debug(f"create {len(session_ids)} sessions")
+        return session_ids
+    
     def update_session(self, session_id: uuid.UUID, session_update: GameSessionUpdate) -> bool:
         """update session"""
         session = self.session_repository.update_game_session(session_id, session_update)
         logger.debug(f"update session {session_id}")
         return session
     
+    def delete_sessions_by_filter(self, session_filter: SessionFilter, batch_size: int) -> int:
+        """delete all sessions matching a filter, return how many were deleted"""
+        self._check_filter_not_empty(session_filter)
+        deleted = self.session_repository.delete_game_sessions(
+            session_filter=session_filter, batch_size=batch_size, now=datetime.now(timezone.utc)
+        )
+        logger.debug(f"delete {deleted} sessions by filter {session_filter}")
+        return deleted
+
+    def update_sessions_by_filter(self, session_filter: SessionFilter, session_update: GameSessionBulkUpdate, batch_size: int) -> int:
+        """update all sessions matching a filter, return how many were updated"""
+        self._check_filter_not_empty(session_filter)
+        values = session_update.model_dump(exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="Nothing to update")
+        updated = self.session_repository.update_game_sessions(
+            session_filter=session_filter, values=values, batch_size=batch_size, now=datetime.now(timezone.utc)
+        )
+        logger.debug(f"update {updated} sessions by filter {session_filter}")
+        return updated
+
+    def _check_filter_not_empty(self, session_filter: SessionFilter) -> None:
+        """refuse bulk operations on all sessions"""
+        if not session_filter.model_dump(exclude_none=True):
+            raise HTTPException(status_code=400, detail="At least one filter is required")
+    
     def delete_sessions(self, session_id: uuid.UUID) -> Tuple[List[bool], bool]:
         """delete sessions"""
         success = self.session_repository.delete_game_session_by_id(session_id)
         logger.debug(f"delete sessions {session_id}: {success}")
         return success
     
-    def copy_session(self, src_session: GameSession, new_llm: Optional[LLM] = None) -> GameSession:
-        """Copy a session"""
-        new_session = deepcopy(src_session)
-        if new_llm:
-            new_session.llm_id = new_llm.id
-        new_session_create = GameSessionCreate(**new_session.model_dump())
-        saved_session = self.create_session(new_session_create)
-        return saved_session
+    def copy_session(self, src_session: GameSession, new_llm: Optional[LLM] = None, new_turn_data: Optional[PlayTurnData] = None) -> uuid.UUID:
+        """Copy a session, sharing its turns with the source instead of duplicating them"""
+        return self.fork_sessions(src_session, [new_llm.id if new_llm else src_session.llm_id], new_turn_data)[0]
+
+    def fork_sessions(self, src_session: GameSession, llm_ids: List[uuid.UUID], new_turn_data: Optional[PlayTurnData] = None) -> List[uuid.UUID]:
+        """Fork a session once per llm, in one transaction"""
+        session_data = src_session.model_dump(exclude={"id", "created_at", "updated_at", *FORK_SHARED_FIELDS, *OWNERSHIP_FIELDS, *ARCHIVE_MANAGED_FIELDS})
+        forks = []
+        for llm_id in llm_ids:
+            fork = GameSession(**session_data)
+            fork.llm_id = llm_id
+            for field in FORK_SHARED_FIELDS:
+                setattr(fork, field, list(getattr(src_session, field)))
+            self.update_turn_result(fork, new_turn_data)
+            forks.append(fork)
+        fork_ids = self.session_repository.create_forked_game_sessions(parent=src_session, forks=forks)
+        logger.debug(f"fork session {src_session.id} into {fork_ids}")
+        return fork_ids
+    
+    def export_sessions(self, export_request: ExportSessionsRequest, batch_size: int) -> Iterator[bytes]:
+        """stream the filtered sessions, or their turns, encoded in the requested format"""
+        batches = self.session_repository.iter_game_session_batches(session_filter=export_request, batch_size=batch_size)
+        if export_request.kind == "turns":
+            return encode_records(
+                (to_turn_records(rows) for rows in batches), export_request.format, get_turn_columns()
+            )
+        return encode_records(batches, export_request.format, get_session_columns())
+    
+    def search_turns(self, search_request: SearchTurnsRequest) -> List[TurnSearchHit]:
+        """full text search over the reasoning and responses of the turns of the filtered sessions"""
+        if not search_request.q.strip():
+            raise HTTPException(status_code=400, detail="Search query cannot be empty")
+        if search_request.limit <= 0 or search_request.offset < 0:
+            raise HTTPException(status_code=400, detail="Limit must be greater than 0 and offset cannot be negative")
+        session_ids = None
+        if search_request.model_dump(include=set(SessionFilter.model_fields), exclude_none=True):
+            session_ids = self.session_repository.select_game_session_ids(search_request)
+        hits = self.search_repository.search_turns(
+            query=search_request.q, session_ids=session_ids, limit=search_request.limit, offset=search_request.offset
+        )
+        logger.debug(f"search turns for {search_request.q!r}: {len(hits)} hits")
+        return [TurnSearchHit(**hit) for hit in hits]
+
+    def reindex_turn_search(self, batch_size: int) -> int:
+        """rebuild the turn search index of all sessions, return how many sessions were indexed"""
+        indexed = 0
+        # the sessions are streamed through this session, the index is written through its own
+        with Session(self.session.get_bind()) as index_session:
+            search_repository = SearchRepository(index_session)
+            for rows in self.session_repository.iter_game_session_batches(session_filter=SessionFilter(), batch_size=batch_size):
+                for row in rows:
+                    state = {field: row[field] or [] for field in FORK_SHARED_FIELDS}
+                    # turns a fork shares with its parent are indexed for the parent only
+                    is_fork = row["parent_session_id"] is not None and bool(row["fork_turn"] or row["fork_message_index"])
+                    first_own_turn = row["fork_turn"] if is_fork else 0
+                    turn_count = len(state["turn_result_history"])
+                    search_repository.delete_turns_outside(row["id"], first_own_turn, turn_count)
+                    search_repository.index_turns(row["id"], state, list(range(first_own_turn, turn_count)))
+                index_session.commit()
+                indexed += len(rows)
+                logger.info(f"indexed turns of {indexed} sessions")
+        return indexed
+    
+    def get_turn_reasoning(self, reasoning_hash: str) -> str:
+        """get model level reasoning content by hash"""
+        reasoning = self.session_repository.get_turn_reasoning(reasoning_hash)
+        if reasoning is None:
+            raise HTTPException(status_code=404, detail=f"Reasoning {reasoning_hash} not found")
+        return reasoning.content
+
+    def lock_session(self, session_id: uuid.UUID) -> None:
+        """serialize turns of a session across workers until the current transaction ends"""
+        self.session_repository.lock_game_session(session_id)
+
+    def get_idempotent_turn(
+        self,
+        session_id: uuid.UUID,
+        idempotency_key: str,
+        request_hash: str,
+        unwritten: Optional[TurnIdempotencyKey] = None
+    ) -> Optional[PlayTurnData]:
+        """
+        turn already played for an idempotency key, None if there is none within the key window.
+        `unwritten` is a key whose turn is not written yet, it is used instead of the stored one.
+        """
+        record = unwritten
+        if record is None:
+            created_from = datetime.now(timezone.utc) - timedelta(seconds=settings.TURNBENCH_IDEMPOTENCY_KEY_TTL_SECONDS)
+            record = self.session_repository.get_turn_idempotency_key(session_id, idempotency_key, created_from)
+        if record is None:
+            return None
+        if record.request_hash != request_hash:
+            raise HTTPException(status_code=422, detail=f"Idempotency-Key {idempotency_key} was already used for another request")
+        logger.debug(f"replay turn of session {session_id} for idempotency key {idempotency_key}")
+        return PlayTurnData(**record.turn_data)
+
+    def save_idempotent_turn(
+        self,
+        session_id: uuid.UUID,
+        idempotency_key: str,
+        request_hash: str,
+        turn_data: PlayTurnData,
+        commit: bool = True
+    ) -> None:
+        """store a played turn for its idempotency key, without `commit` it is written with the session"""
+        self.session_repository.save_turn_idempotency_key(
+            self.create_idempotency_key(session_id, idempotency_key, request_hash, turn_data), commit=commit
+        )
+
+    @staticmethod
+    def create_idempotency_key(
+        session_id: uuid.UUID,
+        idempotency_key: str,
+        request_hash: str,
+        turn_data: PlayTurnData
+    ) -> TurnIdempotencyKey:
+        """idempotency key record replaying `turn_data`, exactly as it was returned"""
+        return TurnIdempotencyKey(
+            session_id=session_id,
+            key=idempotency_key,
+            request_hash=request_hash,
+            turn_data=turn_data.model_dump(mode="json"),
+        )
+
+    def delete_expired_idempotency_keys(self, now: datetime) -> int:
+        """delete idempotency keys past their window, return how many were deleted"""
+        created_before = now - timedelta(seconds=settings.TURNBENCH_IDEMPOTENCY_KEY_TTL_SECONDS)
+        deleted = self.session_repository.delete_turn_idempotency_keys_created_before(created_before)
+        logger.info(f"deleted {deleted} expired idempotency keys")
+        return deleted
+
+    def store_turn_reasoning(self, game_session: GameSession) -> None:
+        """move model level reasoning content of the session turns to the reasoning store"""
+        game_session.turn_result_history = self.session_repository.save_turn_reasoning(game_session.turn_result_history)
+    
+    def apply_retention(self, created_before: datetime, detach_only: bool = False) -> None:
+        """remove sessions created before `created_before`, whole partitions at a time when the table is partitioned"""
+        if is_partitioned(self.session, GameSession.__tablename__):
+            dropped = drop_partitions_before(
+                self.session,
+                GameSession.__tablename__,
+                created_before,
+                detach_only,
+                before_drop=self.session_repository.detach_game_sessions_created_between,
+            )
+            logger.info(f"removed session partitions {dropped}")
+        else:
+            deleted = self.session_repository.delete_game_sessions_created_before(created_before)
+            logger.info(f"deleted {deleted} sessions created before {created_before}")
+    
+    def archive_finished_sessions(self, updated_before: datetime, batch_size: int) -> int:
+        """archive finished sessions in batches, each batch in its own short transaction"""
+        total = 0
+        while True:
+            archived = self.session_repository.archive_game_sessions(updated_before=updated_before, limit=batch_size)
+            total += archived
+            logger.debug(f"archived a batch of {archived} sessions")
+            if archived < batch_size:
+                break
+        return total
     
     def add_message(self, game_session: GameSession | GameSessionCreate, role: str, content: str) -> None:
         """Add message to history"""
@@ -90,21 +355,85 @@ class SessionService:
         """Add turn message to history"""
         game_session.turn_messages.append({"role": role, "content": content})
     
+    def get_context_messages(self, game_session: GameSession) -> List[Dict[str, Any]]:
+        """Messages for the next llm call, built by the session's context strategy"""
+        return get_context_messages(game_session)
+    
     def merge_game_messages(self, game_session: GameSession) -> None:
         """Merge turn messages"""
         game_session.messages.extend(game_session.turn_messages)
 
     def add_system_message(self, game_session: GameSession | GameSessionCreate, system_message: Optional[str] = None) -> None:
         """Add system message to history"""
+        if system_message is None and game_session.prompt_layout == "prefix_stable":
+            # the rules are the same for every session of a mode, the setup follows in its own message
+            rules = game_session.base_game_prompts["system_prompt"].partition("{game_setup}")[0]
+            self.add_message(game_session, "system", rules.format().rstrip())
+            self.add_message(game_session, "user", game_session.verifier_descriptions)
+            return
         if system_message is None:
             system_message = game_session.base_game_prompts["system_prompt"].format(
                 game_setup=game_session.verifier_descriptions
             )
         self.add_message(game_session, "system", system_message)
     
-    def check_total_rounds(self, game_session: GameSession) -> int:
-        """Check total rounds"""
-        return len([turn["turn_name"] for turn in game_session.turn_result_history if turn["turn_name"] == "deduce"])
+    def get_game_rules(self, game_session: GameSession, verifiers: Optional[List[Verifier]] = None) -> GameRules:
+        """game engine rules of the session's setup"""
+        game_info = game_session.game_info
+        if verifiers is None:
+            verifiers = verifier_manager.get_verifier_by_ids(game_info["verifier_ids"])
+        prefix = "" if game_session.mode == "classic" else "nightmare_"
+        return GameRules(
+            answer=game_info["answer"],
+            max_rounds=game_session.max_rounds,
+            verifier_checks=get_criterion_checks(
+                verifiers, game_info[f"{prefix}verifier_ids"], game_info[f"{prefix}active_criteria_ids"]
+            ),
+            answer_checks=get_criterion_checks(verifiers, game_info["verifier_ids"], game_info["active_criteria_ids"]),
+        )
+
+    @staticmethod
+    def to_turn_record(turn: Dict[str, Any]) -> TurnRecord:
+        """game engine record of a stored turn result"""
+        return TurnRecord(
+            turn_num=turn["turn_num"],
+            round_num=turn["round_num"],
+            turn_name=turn["turn_name"],
+            guess_code=turn.get("guess_code"),
+            verifier_choice=turn.get("verifier_choice"),
+            verifier_result=turn.get("verifier_result"),
+            submitted_code=turn.get("deduce_choice_submit_code"),
+        )
+
+    def get_game_state(self, game_session: GameSession, verifiers: Optional[List[Verifier]] = None) -> GameState:
+        """game engine state of the session, resumed from its counters and the turns of the current round"""
+        history = game_session.turn_result_history
+        round_guess_code = next((turn["guess_code"] for turn in reversed(history) if turn["turn_name"] == "proposal"), None)
+        return GameState(
+            rules=self.get_game_rules(game_session, verifiers),
+            next_turn_name=game_session.next_turn_name,
+            total_turns=game_session.total_turns,
+            total_rounds=game_session.total_rounds,
+            submitted_code=game_session.submitted_code,
+            game_over=game_session.game_over,
+            game_over_reason=game_session.game_over_reason,
+            game_success=game_session.game_success,
+            round_guess_code=round_guess_code,
+            recent_turn_names=tuple(turn["turn_name"] for turn in history[-3:]),
+            last_turn=self.to_turn_record(history[-1]) if history else None,
+        )
+
+    def apply_game_state(self, game_session: GameSession, state: GameState) -> None:
+        """write the counters and the status of the game engine state to the session"""
+        game_session.next_turn_name = state.next_turn_name
+        game_session.total_turns = state.total_turns
+        game_session.total_rounds = state.total_rounds
+        game_session.submitted_code = state.submitted_code
+        game_session.game_over = state.game_over
+        game_session.game_over_reason = state.game_over_reason
+        game_session.game_success = state.game_success
+        if state.num_of_verifier_passed is not None:
+            game_session.num_of_verifier_passed = state.num_of_verifier_passed
     
     def cut_turn_history(self, game_session: GameSession, turn_num: int) -> None:
         """Cut turn history"""
@@ -115,7 +444,9 @@ class SessionService:
         game_session.turn_message_indexes = game_session.turn_message_indexes[:turn_num-1]
         game_session.turn_llm_response_indexes = game_session.turn_llm_response_indexes[:turn_num-1]
         game_session.messages = game_session.messages[:message_index]
-        game_session.total_rounds = self.check_total_rounds(game_session)
+        game_session.total_rounds = GameState.replay(
+            self.get_game_rules(game_session), map(self.to_turn_record, game_session.turn_result_history)
+        ).total_rounds
         game_session.total_turns = turn_num - 1
         game_session.submitted_code = None
         game_session.game_over = False
@@ -136,62 +467,60 @@ class SessionService:
         game_session.turn_time_used = 0
         game_session.turn_input_tokens = 0
         game_session.turn_output_tokens = 0
+        game_session.turn_cached_tokens = 0
+        game_session.turn_reasoning_tokens = 0
+        game_session.turn_retries = 0
+        game_session.turn_retry_time = 0
+        game_session.turn_retry_input_tokens = 0
+        game_session.turn_retry_output_tokens = 0
         game_session.turn_longest_context_length = 0
-
-    def get_current_round_guess_code(self, game_session: GameSession) -> str:
-        """Get current round guess code"""
-        for turn in game_session.turn_result_history[::-1]:
-            if turn["turn_name"] == "proposal":
-                return turn["guess_code"]
-        return None
-    
-    def get_current_question_round(self, game_session: GameSession) -> int:
-        """Get current question round"""
-        return len([turn["turn_name"] for turn in game_session.turn_result_history[-3:] if turn["turn_name"] == "question"]) + 1
-    
-    def check_if_three_questions(self, game_session: GameSession) -> bool:
-        """Check if three questions"""
-        return len([turn["turn_name"] for turn in game_session.turn_result_history[-3:] if turn["turn_name"] == "question"]) >= 3
-    
-    def update_next_turn_name(self, game_session: GameSession) -> None:
-        """Update next turn name"""
-        if game_session.next_turn_name == "proposal":
-            game_session.next_turn_name = "question"
-        elif game_session.next_turn_name == "question":
-            if game_session.turn_result_history[-1]["turn_name"] == "proposal":
-                return
-            skip_turn = game_session.turn_result_history[-1]["verifier_choice"] == "SKIP"
-            already_three_questions = self.check_if_three_questions(game_session)
-            if skip_turn or already_three_questions:
-                game_session.next_turn_name = "deduce"
-        elif game_session.next_turn_name == "deduce":
-            if game_session.game_over:
-                game_session.next_turn_name = "end"
-            else:
-                game_session.next_turn_name = "proposal"
  
     def update_game_tokens(self, game_session: GameSession, llm_response: LLMCompleteResponse) -> None:
         """Update game tokens"""
         game_session.total_input_tokens += llm_response.input_tokens
         game_session.total_output_tokens += llm_response.output_tokens
+        game_session.total_cached_tokens += llm_response.cached_tokens
+        game_session.total_reasoning_tokens += llm_response.reasoning_tokens
         game_session.longest_context_length = max(game_session.longest_context_length, llm_response.input_tokens + llm_response.output_tokens)
     
     def update_turn_tokens(self, game_session: GameSession, llm_response: LLMCompleteResponse) -> None:
         """Update turn tokens"""
         game_session.turn_input_tokens += llm_response.input_tokens
         game_session.turn_output_tokens += llm_response.output_tokens
+        game_session.turn_cached_tokens += llm_response.cached_tokens
+        game_session.turn_reasoning_tokens += llm_response.reasoning_tokens
         game_session.turn_longest_context_length = max(game_session.turn_longest_context_length, llm_response.input_tokens + llm_response.output_tokens)
     
+    def update_turn_retry_usage(self, game_session: GameSession, llm_response: LLMCompleteResponse) -> None:
+        """Update the part of the turn usage spent on a retry"""
+        game_session.turn_retries += 1
+        game_session.turn_retry_time += llm_response.time_used
+        game_session.turn_retry_input_tokens += llm_response.input_tokens
+        game_session.turn_retry_output_tokens += llm_response.output_tokens
+
+    def merge_game_retry_usage(self, game_session: GameSession) -> None:
+        """Merge the retry usage of the turn"""
+        game_session.total_retries += game_session.turn_retries
+        game_session.total_retry_time += game_session.turn_retry_time
+        game_session.total_retry_input_tokens += game_session.turn_retry_input_tokens
+        game_session.total_retry_output_tokens += game_session.turn_retry_output_tokens
+    
     def merge_game_tokens(self, game_session: GameSession) -> None:
         """Merge game tokens"""
         game_session.total_input_tokens += game_session.turn_input_tokens
         game_session.total_output_tokens += game_session.turn_output_tokens
+        game_session.total_cached_tokens += game_session.turn_cached_tokens
+        game_session.total_reasoning_tokens += game_session.turn_reasoning_tokens
         game_session.longest_context_length = max(game_session.longest_context_length, game_session.turn_longest_context_length)
     
     def update_game_response_with_formatting_error(self, game_session: GameSession, count: int = 1) -> None:
         """Update game response with formatting error"""
         game_session.total_response_with_formatting_error += count
     
+    def update_game_response_with_not_valid_error(self, game_session: GameSession, count: int = 1) -> None:
+        """Update game response with not valid error"""
+        game_session.total_response_with_not_valid_error += count
+    
     def update_game_time(self, game_session: GameSession, time_used: float) -> None:
         """Update game time"""
         game_session.total_time += time_used
@@ -200,10 +529,6 @@ class SessionService:
         """Update turn time"""
         game_session.turn_time_used += time_used
     
-    def update_game_turns(self, game_session: GameSession, count: int = 1) -> None:
-        """Update game turns"""
-        game_session.total_turns += count
-    
     def update_turn_result(self, game_session: GameSession, result: Optional[PlayTurnData] = None) -> None:
         """Update turn result"""
         if result is None:
@@ -219,10 +544,54 @@ class SessionService:
     def replace_turn_result(self, game_session: GameSession, result: PlayTurnData) -> None:
         """Replace turn result"""
         old_turn_result = game_session.turn_result_history[result.turn_num-1]
+        if game_session.prompt_layout == "prefix_stable":
+            self.add_turn_edit_message(game_session, old_turn_result, result)
+        else:
+            self.rewrite_turn_messages(game_session, old_turn_result, result)
+
+        new_turn_result = result.model_dump()
+        # an edit without reasoning content keeps the stored one
+        if result.turn_model_level_reasoning is None and result.turn_model_level_reasoning_hash is None:
+            new_turn_result["turn_model_level_reasoning"] = old_turn_result.get("turn_model_level_reasoning")
+            new_turn_result["turn_model_level_reasoning_hash"] = old_turn_result.get("turn_model_level_reasoning_hash")
+        game_session.turn_result_history = list(game_session.turn_result_history)
+        game_session.turn_result_history[result.turn_num-1] = new_turn_result
+
+    def add_turn_edit_message(self, game_session: GameSession, old_turn_result: Dict[str, Any], result: PlayTurnData) -> None:
+        """Append a message stating what changed in a played turn, earlier messages stay untouched"""
+        turn_name = old_turn_result["turn_name"]
+        changes = []
+        if old_turn_result["turn_prompt"] != result.turn_prompt:
+            changes.append(f"- prompt: {result.turn_prompt}")
+        if old_turn_result["turn_reasoning"] != result.turn_reasoning:
+            changes.append(f"- your reasoning: {result.turn_reasoning}")
+        if turn_name == "proposal" and old_turn_result["guess_code"] != result.guess_code:
+            guess_code = result.guess_code
+            changes.append(f"- your proposal: BLUE={guess_code[0]} YELLOW={guess_code[1]} PURPLE={guess_code[2]}")
+        elif turn_name == "question":
+            if old_turn_result["verifier_choice"] != result.verifier_choice:
+                changes.append(f"- your verifier choice: {result.verifier_choice}")
+            if old_turn_result["verifier_result"] != result.verifier_result:
+                changes.append(f"- verifier result: {result.verifier_result}")
+        if changes:
+            # messages may be shared with a parent or fork session, so the list is replaced instead of appended to
+            game_session.messages = list(game_session.messages)
+            self.add_message(game_session, "user", TURN_EDIT_MESSAGE.format(
+                turn_num=result.turn_num, turn_name=turn_name, changes="\n".join(changes)
+            ))
+
+    def rewrite_turn_messages(self, game_session: GameSession, old_turn_result: Dict[str, Any], result: PlayTurnData) -> None:
+        """Rewrite the messages of a played turn in place"""
         turn_name = old_turn_result["turn_name"]
         turn_message_index = game_session.turn_message_indexes[result.turn_num-1]
         turn_llm_response_index = game_session.turn_llm_response_indexes[result.turn_num-1]
 
+        # messages may be shared with a parent or fork session, so they are replaced instead of edited in place
+        game_session.messages = list(game_session.messages)
+        for index in (turn_message_index, turn_llm_response_index, turn_llm_response_index+1):
+            if index < len(game_session.messages):
+                game_session.messages[index] = dict(game_session.messages[index])
+
         old_prompt = old_turn_result["turn_prompt"]
         new_prompt = result.turn_prompt
         if old_prompt != new_prompt:
@@ -258,48 +627,3 @@ class SessionService:
             if old_verifier_result != new_verifier_result:
                 if turn_llm_response_index+1 < len(game_session.messages):
                     game_session.messages[turn_llm_response_index+1]["content"] = game_session.messages[turn_llm_response_index+1]["content"].replace(old_verifier_result, new_verifier_result)
-
-
-        game_session.turn_result_history[result.turn_num-1] = result.model_dump()
-
-    def update_num_of_verifier_passed(self, game_session: GameSession, submitted_code: str, verifiers: List[Verifier]) -> None:
-        """Count the number of verifiers passed"""
-        count = 0
-        for i, verifier_id in enumerate(game_session.game_info["verifier_ids"]):
-            verifier = next((v for v in verifiers if v.id == verifier_id), None)
-            criteria_id = game_session.game_info["active_criteria_ids"][i]
-            is_passed = verifier_manager.verify(verifier, criteria_id, submitted_code)
-            if is_passed:
-                count += 1
-        game_session.num_of_verifier_passed = count
-
-    def update_submitted_code(self, game_session: GameSession, submitted_code: str) -> None:
-        """Update submitted code"""
-        game_session.submitted_code = submitted_code
-
-    def update_game_rounds(self, game_session: GameSession, count: int = 1) -> None:
-        """Update game rounds"""
-        game_session.total_rounds += count
-
-    def update_game_status(self, game_session: GameSession) -> None:
-        """Update game status"""
-        if game_session.submitted_code:
-            game_session.game_over = True
-            game_session.game_over_reason = "Submitted"
-            game_session.game_success = game_session.submitted_code == game_session.game_info["answer"]
-            return
-        
-        if game_session.total_rounds >= game_session.max_rounds:
-            game_session.game_over = True
-            game_session.game_over_reason = "Over rounds"
-            game_session.game_success = False
-            return
-        
-        game_session.game_over = False
-        game_session.game_over_reason = None
-        game_session.game_success = False
-
-
-    def check_answer(self, game_session: GameSession, submitted_code: str) -> bool:
-        """Check if the submitted code is correct"""
-        return submitted_code == game_session.game_info["answer"]
@@ -2,6 +2,8 @@ import uuid
 from typing import Any, Optional, List
 
 from sqlmodel import Session, select, func
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import selectinload
 
 from app.games.turnbench.models.setup import GameSetup, GameSetupCreate, GameSetupUpdate
@@ -29,11 +31,48 @@ class SetupRepository:
         self.session.commit()
         return db_objs
     
+    def upsert_setups(self, *, setup_creates: List[GameSetupCreate], content_hashes: List[str]) -> int:
+        """insert setups or update them by game_id where the content hash changed, returns the rows written"""
+        rows = [
+            {**GameSetup.model_validate(setup_create).model_dump(), "content_hash": content_hash}
+            for setup_create, content_hash in zip(setup_creates, content_hashes, strict=True)
+        ]
+        if not rows:
+            return 0
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}[self.session.get_bind().dialect.name]
+        statement = dialect.insert(GameSetup).values(rows)
+        updated_fields = [name for name in GameSetupCreate.model_fields if name != "game_id"] + ["content_hash", "updated_at"]
+        statement = statement.on_conflict_do_update(
+            index_elements=["game_id"],
+            set_={name: statement.excluded[name] for name in updated_fields},
+            where=GameSetup.content_hash.is_distinct_from(statement.excluded.content_hash),
+        )
+        result = self.session.execute(statement)
+        self.session.commit()
+        return result.rowcount
+    
+    def get_setups_without_game_id(self) -> List[GameSetup]:
+        """get setups stored before they were keyed by game_id"""
+        statement = select(GameSetup).where(GameSetup.game_id.is_(None))
+        return list(self.session.exec(statement).all())
+    
+    def set_setup_game_ids(self, *, setup_keys: List[tuple[uuid.UUID, str, str]]) -> None:
+        """set (setup id, game_id, content hash) of setups stored without game_id"""
+        if setup_keys:
+            rows = [{"id": setup_id, "game_id": game_id, "content_hash": content_hash} for setup_id, game_id, content_hash in setup_keys]
+            self.session.execute(update(GameSetup), rows)
+        self.session.commit()
+    
     def get_setup_by_id(self, setup_id: uuid.UUID) -> GameSetup | None:
         """get game setup by id"""
         statement = select(GameSetup).where(GameSetup.id == setup_id)
         return self.session.exec(statement).first()
     
+    def get_setups_by_ids(self, setup_ids: List[uuid.UUID]) -> List[GameSetup]:
+        """get game setups by ids"""
+        statement = select(GameSetup).where(GameSetup.id.in_(setup_ids))
+        return list(self.session.exec(statement).all())
+    
     def update_setup(self, *, setup_id: uuid.UUID, setup_update: GameSetupUpdate) -> GameSetup:
         """update game setup"""
         setup_data = setup_update.model_dump(exclude_unset=True)
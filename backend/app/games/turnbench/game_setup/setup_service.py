@@ -1,11 +1,13 @@
+import hashlib
+import json
 import uuid
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from sqlmodel import Session
 from fastapi import HTTPException
 
 from app.games.turnbench.game_setup.setup_repository import SetupRepository
-from app.games.turnbench.models.setup import GameSetup, GameSetupCreate, GameSetupUpdate, GameSetupPublic
+from app.games.turnbench.models.setup import GameSetup, GameSetupBase, GameSetupCreate, GameSetupUpdate, GameSetupPublic
 
 
 class SetupService:
@@ -23,6 +25,33 @@ class SetupService:
         """create game setups"""
         return self.setup_repository.create_setups(setup_creates=setup_creates)
     
+    def sync_setups(self, setup_creates: List[GameSetupCreate]) -> int:
+        """upsert setups by game_id, only rows whose content changed are written, returns their count"""
+        content_hashes = [self.get_setup_content_hash(setup_create) for setup_create in setup_creates]
+        self._assign_game_ids(setup_creates, content_hashes)
+        return self.setup_repository.upsert_setups(setup_creates=setup_creates, content_hashes=content_hashes)
+    
+    @staticmethod
+    def get_setup_content_hash(setup: GameSetupBase) -> str:
+        """sha256 of the setup content, without its game_id"""
+        content = setup.model_dump(mode="json", include=set(GameSetupBase.model_fields) - {"game_id"})
+        return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+    
+    def _assign_game_ids(self, setup_creates: List[GameSetupCreate], content_hashes: List[str]) -> None:
+        """key setups stored before game_id existed by matching their content, so the upsert does not duplicate them"""
+        legacy_setups = self.setup_repository.get_setups_without_game_id()
+        if not legacy_setups:
+            return
+        game_ids = {content_hash: setup_create.game_id for setup_create, content_hash in zip(setup_creates, content_hashes, strict=True)}
+        setup_keys = []
+        for setup in legacy_setups:
+            content_hash = self.get_setup_content_hash(setup)
+            # duplicated rows keep no game_id, only the first one is matched
+            game_id = game_ids.pop(content_hash, None)
+            if game_id is not None:
+                setup_keys.append((setup.id, game_id, content_hash))
+        self.setup_repository.set_setup_game_ids(setup_keys=setup_keys)
+    
     def get_setup_by_id(self, setup_id: uuid.UUID) -> GameSetup:
         """get setup by id"""
         setup = self.setup_repository.get_setup_by_id(setup_id)
@@ -58,6 +87,14 @@ class SetupService:
             limit=page_size
         )
     
+    def get_setups_public_by_ids(self, setup_ids: List[uuid.UUID]) -> Dict[uuid.UUID, GameSetupPublic]:
+        """get public setups by ids, keyed by id"""
+        setups = {setup.id: GameSetupPublic(**setup.model_dump()) for setup in self.setup_repository.get_setups_by_ids(setup_ids)}
+        missing = [str(setup_id) for setup_id in setup_ids if setup_id not in setups]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Setups with ids {', '.join(missing)} not found")
+        return setups
+    
     def get_setup_public_by_setup_id(self, setup_id: uuid.UUID) -> GameSetupPublic:
         """get public setup by setup id"""
         setup = self.get_setup_by_id(setup_id)
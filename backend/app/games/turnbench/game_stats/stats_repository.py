@@ -0,0 +1,137 @@
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    BigInteger,
+    Float,
+    Integer,
+    cast,
+    delete,
+    insert,
+    literal_column,
+    or_,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, func, select
+
+from app.games.turnbench.models.session import GameSession
+from app.games.turnbench.models.setup import GameSetup
+from app.games.turnbench.models.stats import GameSessionStats, LeaderboardRequest
+
+# session columns the stats of a finished session are computed from
+STATS_SOURCE_FIELDS = {
+    "llm_id", "setup_id", "mode", "game_over", "game_success",
+    "total_rounds", "total_turns", "total_input_tokens", "total_output_tokens",
+    "total_cached_tokens", "total_reasoning_tokens", "total_time"
+}
+STATS_KEY_FIELDS = ("llm_id", "mode", "difficulty", "day")
+STATS_TOTAL_FIELDS = (
+    "sessions", "successes", "total_rounds", "total_turns", "total_input_tokens", "total_output_tokens",
+    "total_cached_tokens", "total_reasoning_tokens", "total_time"
+)
+
+
+class StatsRepository:
+    """Session stats repository"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def add_sessions(self, condition: Any, sign: int = 1) -> None:
+        """Add the finished sessions matching `condition` to the stats (remove them with `sign` -1), in the current transaction"""
+        rows = [dict(row) for row in self.session.execute(self._aggregate(condition)).mappings()]
+        if not rows:
+            return
+        for row in rows:
+            row["day"] = self._to_date(row["day"])
+            for field in STATS_TOTAL_FIELDS:
+                row[field] = sign * (row[field] or 0)
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}[self.session.get_bind().dialect.name]
+        statement = dialect.insert(GameSessionStats).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(STATS_KEY_FIELDS),
+            set_={field: getattr(GameSessionStats, field) + statement.excluded[field] for field in STATS_TOTAL_FIELDS},
+        )
+        self.session.execute(statement)
+
+    def replace_stats_between(self, created_from: datetime, created_before: datetime) -> None:
+        """Recompute the stats of the sessions created in [created_from, created_before), both at midnight"""
+        self.session.execute(
+            delete(GameSessionStats)
+            .where(GameSessionStats.day >= created_from.date(), GameSessionStats.day < created_before.date())
+        )
+        aggregate = self._aggregate(GameSession.created_at >= created_from, GameSession.created_at < created_before)
+        self.session.execute(insert(GameSessionStats).from_select(list(aggregate.selected_columns.keys()), aggregate))
+        self.session.commit()
+
+    def delete_stats_outside(self, created_from: Optional[datetime], created_before: Optional[datetime]) -> None:
+        """Delete the stats of days outside of [created_from, created_before)"""
+        statement = delete(GameSessionStats)
+        if created_from is not None and created_before is not None:
+            statement = statement.where(or_(
+                GameSessionStats.day < created_from.date(), GameSessionStats.day >= created_before.date()
+            ))
+        self.session.execute(statement)
+        self.session.commit()
+
+    def get_session_created_at_range(self) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Creation time of the oldest and newest stored session"""
+        statement = select(func.min(GameSession.created_at), func.max(GameSession.created_at))
+        return tuple(self.session.execute(statement).one())
+
+    def get_leaderboard_totals(self, leaderboard_request: LeaderboardRequest) -> List[Dict[str, Any]]:
+        """Summed stats per llm and the `group_by` columns"""
+        group_columns = [GameSessionStats.llm_id] + [getattr(GameSessionStats, name) for name in leaderboard_request.group_by]
+        # plain int and float sums, whatever type the database sums into
+        totals = [
+            cast(func.sum(getattr(GameSessionStats, field)), Float if field == "total_time" else BigInteger).label(field)
+            for field in STATS_TOTAL_FIELDS
+        ]
+        statement = (
+            select(*group_columns, *totals)
+            .group_by(*group_columns)
+            .having(func.sum(GameSessionStats.sessions) > 0)
+        )
+        if leaderboard_request.llm_ids:
+            statement = statement.where(GameSessionStats.llm_id.in_(leaderboard_request.llm_ids))
+        if leaderboard_request.modes:
+            statement = statement.where(GameSessionStats.mode.in_(leaderboard_request.modes))
+        if leaderboard_request.difficulties:
+            statement = statement.where(GameSessionStats.difficulty.in_(leaderboard_request.difficulties))
+        if leaderboard_request.day_from is not None:
+            statement = statement.where(GameSessionStats.day >= leaderboard_request.day_from)
+        if leaderboard_request.day_to is not None:
+            statement = statement.where(GameSessionStats.day <= leaderboard_request.day_to)
+        return [dict(row) for row in self.session.execute(statement).mappings()]
+
+    @staticmethod
+    def _aggregate(*conditions: Any) -> Any:
+        """stats rows of the finished sessions matching `conditions`, columns in stats table order"""
+        # literal empty string, a bound parameter would make the grouped expression differ from the selected one
+        difficulty = func.coalesce(GameSetup.difficulty, literal_column("''"))
+        day = func.date(GameSession.created_at)
+        return (
+            select(
+                GameSession.llm_id.label("llm_id"),
+                GameSession.mode.label("mode"),
+                difficulty.label("difficulty"),
+                day.label("day"),
+                func.count().label("sessions"),
+                func.sum(cast(GameSession.game_success, Integer)).label("successes"),
+                func.coalesce(func.sum(GameSession.total_rounds), 0).label("total_rounds"),
+                func.coalesce(func.sum(GameSession.total_turns), 0).label("total_turns"),
+                func.coalesce(func.sum(GameSession.total_input_tokens), 0).label("total_input_tokens"),
+                func.coalesce(func.sum(GameSession.total_output_tokens), 0).label("total_output_tokens"),
+                func.coalesce(func.sum(GameSession.total_cached_tokens), 0).label("total_cached_tokens"),
+                func.coalesce(func.sum(GameSession.total_reasoning_tokens), 0).label("total_reasoning_tokens"),
+                func.coalesce(func.sum(GameSession.total_time), 0).label("total_time"),
+            )
+            .join(GameSetup, GameSetup.id == GameSession.setup_id)
+            .where(GameSession.game_over == True, *conditions)  # noqa: E712
+            .group_by(GameSession.llm_id, GameSession.mode, difficulty, day)
+        )
+
+    @staticmethod
+    def _to_date(value: Any) -> date:
+        # sqlite returns the day as text
+        return date.fromisoformat(value) if isinstance(value, str) else value
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.partitions import as_utc, month_start
+from app.games.turnbench.game_stats.stats_repository import StatsRepository
+from app.games.turnbench.models.stats import LeaderboardEntry, LeaderboardRequest
+from app.utils import setup_logger
+
+logger = setup_logger("StatsService", settings.LOG_LEVEL)
+
+
+class StatsService:
+    """Session stats service"""
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.stats_repository = StatsRepository(session)
+
+    def get_leaderboard(self, leaderboard_request: LeaderboardRequest) -> List[LeaderboardEntry]:
+        """Leaderboard from the stats table, best success rate first"""
+        entries = []
+        for totals in self.stats_repository.get_leaderboard_totals(leaderboard_request):
+            sessions = totals["sessions"]
+            entries.append(LeaderboardEntry(
+                **{name: totals[name] for name in ("llm_id", *leaderboard_request.group_by)},
+                sessions=sessions,
+                successes=totals["successes"],
+                success_rate=totals["successes"] / sessions,
+                avg_rounds=totals["total_rounds"] / sessions,
+                avg_turns=totals["total_turns"] / sessions,
+                avg_input_tokens=totals["total_input_tokens"] / sessions,
+                avg_output_tokens=totals["total_output_tokens"] / sessions,
+                avg_cached_tokens=totals["total_cached_tokens"] / sessions,
+                avg_reasoning_tokens=totals["total_reasoning_tokens"] / sessions,
+                cache_hit_rate=totals["total_cached_tokens"] / totals["total_input_tokens"] if totals["total_input_tokens"] else 0,
+                reasoning_rate=totals["total_reasoning_tokens"] / totals["total_output_tokens"] if totals["total_output_tokens"] else 0,
+                avg_time=totals["total_time"] / sessions,
+                avg_turn_time=totals["total_time"] / totals["total_turns"] if totals["total_turns"] else 0,
+            ))
+        entries.sort(key=lambda entry: (-entry.success_rate, -entry.sessions))
+        return entries
+
+    def rebuild_stats(self, workers: int) -> int:
+        """Recompute the stats from the stored sessions, one month of sessions per chunk, `workers` chunks at a time"""
+        oldest, newest = self.stats_repository.get_session_created_at_range()
+        chunks: List[Tuple[datetime, datetime]] = []
+        if oldest is not None:
+            lower = month_start(oldest)
+            while lower <= as_utc(newest):
+                chunks.append((lower, month_start(lower, 1)))
+                lower = chunks[-1][1]
+        bind = self.session.get_bind()
+
+        def rebuild_chunk(chunk: Tuple[datetime, datetime]) -> None:
+            with Session(bind) as chunk_session:
+                StatsRepository(chunk_session).replace_stats_between(*chunk)
+            logger.info(f"rebuilt stats of sessions created in {chunk[0]:%Y-%m}")
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            list(executor.map(rebuild_chunk, chunks))
+        # days without any stored session left, e.g. after the whole table was emptied
+        self.stats_repository.delete_stats_outside(chunks[0][0] if chunks else None, chunks[-1][1] if chunks else None)
+        return len(chunks)
@@ -0,0 +1,265 @@
+import json
+import random
+import re
+from functools import cache, lru_cache
+from itertools import product
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.core.fake_llm import register_fake_policy
+from app.games.turnbench.game_session.context_strategies import SUMMARY_HEADER
+from app.games.turnbench.llm.llm_parser_service import LlmParserService
+from app.games.turnbench.llm.structured_output import RESPONSE_SCHEMAS
+from app.games.turnbench.verifier.criteria_service import CriteriaService
+from app.games.turnbench.verifier.models import Verifier
+from app.games.turnbench.verifier.verifier_manager import verifier_manager
+
+# every possible code, a set of codes is a bit mask over this list
+CODES = ["".join(digits) for digits in product("12345", repeat=3)]
+ALL_CODES_MASK = (1 << len(CODES)) - 1
+
+VERIFIER_PATTERN = re.compile(r"^Verifier <(\d+)>: (.+)$", re.MULTILINE)
+RESULT_PATTERN = re.compile(r"You chose Verifier <(\d+)> and the result is <(PASS|FAIL)>")
+SUMMARY_CODE_PATTERN = re.compile(r"proposed BLUE=(\d) YELLOW=(\d) PURPLE=(\d)")
+SUMMARY_RESULT_PATTERN = re.compile(r"Verifier (\d+): (PASS|FAIL)")
+
+# (code, verifier number, passed) of every verifier tested so far
+Observation = Tuple[str, int, bool]
+
+
+class GameView:
+    """what the player knows, parsed back from the messages of the game"""
+
+    def __init__(self, messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]]):
+        self.verifiers: List[Verifier] = []
+        self.observations: List[Observation] = []
+        self.code: Optional[str] = None
+        self.json_format = bool(response_format and response_format.get("type") == "json_schema")
+        self.stage = self._get_stage(messages, response_format)
+
+        verifiers_by_description = {
+            verifier["description"]: verifier for verifier in verifier_manager.get_verifiers().values()
+        }
+        prompt_stage = None
+        for message in messages:
+            content = str(message.get("content") or "")
+            if message.get("role") == "assistant" and prompt_stage == "proposal":
+                self.code = self._get_proposal(content) or self.code
+            if message.get("role") == "user":
+                prompt_stage = self._get_prompt_stage(content)
+            if not self.verifiers:
+                found = {int(num): description for num, description in VERIFIER_PATTERN.findall(content)}
+                if found and all(description in verifiers_by_description for description in found.values()):
+                    self.verifiers = [Verifier(**verifiers_by_description[found[num]]) for num in sorted(found)]
+            if content.startswith(SUMMARY_HEADER):
+                # earlier rounds summarized by the facts only and sliding window context strategies
+                for line in content.splitlines()[1:]:
+                    for fact in line.partition(": ")[2].split("; "):
+                        code_match = SUMMARY_CODE_PATTERN.fullmatch(fact)
+                        result_match = SUMMARY_RESULT_PATTERN.fullmatch(fact)
+                        if code_match:
+                            self.code = "".join(code_match.groups())
+                        elif result_match and self.code:
+                            self._observe(int(result_match.group(1)), result_match.group(2))
+            for num, result in RESULT_PATTERN.findall(content):
+                if self.code:
+                    self._observe(int(num), result)
+
+    def _observe(self, verifier_num: int, result: str) -> None:
+        observation = (self.code, verifier_num, result == "PASS")
+        if observation not in self.observations:
+            self.observations.append(observation)
+
+    @staticmethod
+    def _get_prompt_stage(content: str) -> str:
+        """stage a game prompt asks for"""
+        if "submit a final guess" in content:
+            return "deduce"
+        if "verifier_num" in content:
+            return "question"
+        return "proposal"
+
+    @classmethod
+    def _get_stage(cls, messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]]) -> str:
+        """stage to answer, from the schema name of structured requests or the last prompt"""
+        if response_format and response_format.get("type") == "json_schema":
+            return response_format["json_schema"]["name"].removesuffix("_answer")
+        prompt = next((message for message in reversed(messages) if message.get("role") == "user"), None)
+        return cls._get_prompt_stage(str(prompt.get("content") or "")) if prompt else "proposal"
+
+    @staticmethod
+    def _get_proposal(content: str) -> Optional[str]:
+        """code of a proposal answer, None if it does not parse"""
+        try:
+            if content.lstrip().startswith("{"):
+                return LlmParserService.extract_proposal_structured(content)[1]
+            return LlmParserService.extract_proposal(content, with_reasoning=False)[1]
+        except Exception:
+            return None
+
+    def tested_this_round(self) -> List[int]:
+        """verifiers tested with the code of the current round"""
+        return [num for code, num, _ in self.observations if code == self.code]
+
+    def render(self, reasoning: str, choice: Optional[str] = None, code: Optional[str] = None) -> str:
+        """answer of the stage, tagged text or json; no choice and no code skips"""
+        if self.json_format:
+            answer: Dict[str, Any] = {"reasoning": reasoning}
+            if self.stage == "question":
+                answer.update(skip=choice is None, verifier=int(choice) if choice is not None else 0)
+            else:
+                if self.stage == "deduce":
+                    answer["skip"] = code is None
+                digits = code or "111"
+                answer.update(blue=int(digits[0]), yellow=int(digits[1]), purple=int(digits[2]))
+            return json.dumps({key: answer[key] for key in RESPONSE_SCHEMAS[self.stage]["required"]})
+        if code is not None:
+            choice = f"BLUE={code[0]}, YELLOW={code[1]}, PURPLE={code[2]}"
+        return f"<REASONING>: {reasoning}\n<CHOICE>: {choice if choice is not None else 'SKIP'}"
+
+
+@cache
+def get_criterion_mask(function: str) -> int:
+    """codes meeting a criterion"""
+    criterion = getattr(CriteriaService, function)
+    return sum(1 << i for i, code in enumerate(CODES) if criterion(code))
+
+
+def get_verifier_masks(verifiers: List[Verifier]) -> Tuple[Tuple[int, ...], ...]:
+    """masks of the criteria of every verifier"""
+    return tuple(tuple(get_criterion_mask(criterion.function) for criterion in verifier.criteria) for verifier in verifiers)
+
+
+def get_consistent_criteria(
+    criteria_masks: Tuple[Tuple[int, ...], ...], observations: FrozenSet[Observation]
+) -> List[List[int]]:
+    """criteria of every verifier agreeing with all of its results"""
+    code_index = {code: i for i, code in enumerate(CODES)}
+    consistent = []
+    for num, masks in enumerate(criteria_masks):
+        seen = [(code_index[code], passed) for code, verifier_num, passed in observations if verifier_num == num]
+        consistent.append([
+            criterion for criterion, mask in enumerate(masks)
+            if all(bool(mask >> i & 1) == passed for i, passed in seen)
+        ])
+    return consistent
+
+
+@lru_cache(maxsize=1024)
+def get_solutions(
+    criteria_masks: Tuple[Tuple[int, ...], ...], observations: FrozenSet[Observation]
+) -> Tuple[Tuple[int, ...], ...]:
+    """setups consistent with the observations, a setup is one criterion per verifier leaving exactly one code"""
+    candidates = get_consistent_criteria(criteria_masks, observations)
+    solutions = []
+
+    def search(num: int, mask: int, chosen: Tuple[int, ...]) -> None:
+        if not mask:
+            return
+        if num == len(criteria_masks):
+            if mask & (mask - 1) == 0:
+                solutions.append(chosen)
+            return
+        for criterion in candidates[num]:
+            search(num + 1, mask & criteria_masks[num][criterion], chosen + (criterion,))
+
+    search(0, ALL_CODES_MASK, ())
+    return tuple(solutions)
+
+
+class Solver:
+    """setups of the game still possible after the observations"""
+
+    def __init__(self, view: GameView):
+        self.masks = get_verifier_masks(view.verifiers)
+        self.setups = get_solutions(self.masks, frozenset(view.observations))
+        self.codes = sorted({self._solution(setup) for setup in self.setups})
+
+    def _solution(self, setup: Tuple[int, ...]) -> str:
+        mask = ALL_CODES_MASK
+        for num, criterion in enumerate(setup):
+            mask &= self.masks[num][criterion]
+        return CODES[mask.bit_length() - 1]
+
+    def split(self, code: str, num: int) -> int:
+        """setups on the smaller side of the result of verifier `num` for `code`, 0 if the result is known"""
+        bit = CODES.index(code)
+        passed = sum(1 for setup in self.setups if self.masks[num][setup[num]] >> bit & 1)
+        return min(passed, len(self.setups) - passed)
+
+    def best_code(self) -> str:
+        """candidate code whose verifier results split the setups the most"""
+        return max(self.codes, key=lambda code: sum(self.split(code, num) for num in range(len(self.masks))))
+
+    def best_verifier(self, code: str, tested: List[int]) -> Optional[int]:
+        """untested verifier whose result for `code` splits the setups the most, None if no result is unknown"""
+        splits = {num: self.split(code, num) for num in range(len(self.masks)) if num not in tested}
+        best = max(splits, key=splits.get, default=None)
+        return best if best is not None and splits[best] > 0 else None
+
+
+def random_code() -> str:
+    return "".join(random.choice("12345") for _ in range(3))
+
+
+@register_fake_policy("random")
+def random_policy(messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]]) -> str:
+    """random codes and verifiers, submitting a random guess in one of five rounds"""
+    view = GameView(messages, response_format)
+    if view.stage == "proposal":
+        return view.render("a random code", code=random_code())
+    if view.stage == "question":
+        if view.verifiers and random.random() < 0.75:
+            return view.render("a random verifier", choice=str(random.randrange(len(view.verifiers))))
+        return view.render("skipping the verifiers")
+    if random.random() < 0.2:
+        return view.render("a random guess", code=random_code())
+    return view.render("continuing to the next round")
+
+
+@register_fake_policy("greedy")
+def greedy_policy(messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]]) -> str:
+    """propose a code every verifier may still pass, test verifiers until one fails and submit a code passing all"""
+    view = GameView(messages, response_format)
+    tested = view.tested_this_round()
+    failed = any(code == view.code and not passed for code, _, passed in view.observations)
+    if view.stage == "proposal":
+        plausible = ALL_CODES_MASK
+        masks = get_verifier_masks(view.verifiers)
+        for num, criteria in enumerate(get_consistent_criteria(masks, frozenset(view.observations))):
+            verifier_mask = 0
+            for criterion in criteria:
+                verifier_mask |= masks[num][criterion]
+            plausible &= verifier_mask
+        codes = [
+            code for i, code in enumerate(CODES)
+            if plausible >> i & 1 and not any(seen == code and not passed for seen, _, passed in view.observations)
+        ]
+        return view.render("a code every verifier may still pass", code=random.choice(codes or CODES))
+    if view.stage == "question":
+        untested = [num for num in range(len(view.verifiers)) if num not in tested]
+        if failed or not untested:
+            return view.render("nothing more to learn from this code")
+        return view.render("testing the next verifier", choice=str(untested[0]))
+    if view.code and not failed and len(set(tested)) == len(view.verifiers):
+        return view.render("the code passed every verifier", code=view.code)
+    return view.render("continuing to the next round")
+
+
+@register_fake_policy("solver")
+def solver_policy(messages: List[Dict[str, Any]], response_format: Optional[Dict[str, Any]]) -> str:
+    """track the setups consistent with the verifier results, testing the most informative ones and submitting the only solution left"""
+    view = GameView(messages, response_format)
+    solver = Solver(view) if view.verifiers else None
+    if solver is None or not solver.codes:
+        # no setup explains the results, e.g. in nightmare mode, where verifiers check another verifier's criterion
+        return greedy_policy(messages, response_format)
+    if view.stage == "proposal":
+        return view.render(f"{len(solver.codes)} codes are still possible", code=solver.best_code())
+    if view.stage == "question":
+        verifier = solver.best_verifier(view.code, view.tested_this_round()) if view.code else None
+        if verifier is None:
+            return view.render("no verifier result is unknown for this code")
+        return view.render(f"verifier {verifier} splits the possible setups", choice=str(verifier))
+    if len(solver.codes) == 1:
+        return view.render("only one code is left", code=solver.codes[0])
+    return view.render(f"{len(solver.codes)} codes are still possible")
@@ -1,138 +1,142 @@
+import json
 import re
-from typing import Tuple, Optional
+from typing import Any, Dict, Tuple, Optional
 
 from app.core.config import settings
 from app.core.exceptions import ResponseFormatError
 from app.utils import setup_logger
+from app.games.turnbench.llm.structured_output import RESPONSE_SCHEMAS
 
 logger = setup_logger("LlmParserService", settings.LOG_LEVEL)
 
+# compiled once, matched in place from an offset instead of on sliced copies of the response
+TAG_PATTERN = re.compile(r"<(CHOICE|REASONING)>", re.IGNORECASE)
+CODE_VALUE_PATTERN = re.compile(r"(BLUE|YELLOW|PURPLE)\s*=\s*(\d+)", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"\d+")
+CODE_COLORS = ("BLUE", "YELLOW", "PURPLE")
+
 class LlmParserService:
     """
     used to extract structured information from LLM responses
     """
     
     @staticmethod
-    def extract_proposal(response: str, with_reasoning: bool = True) -> Tuple[Optional[str], str]:
-        """extract reasoning and proposal code from response"""
-        reasoning = None
-        blue_value = None
-        yellow_value = None
-        purple_value = None
-        choice_tag_match = None
+    def _locate_tags(response: str, with_reasoning: bool) -> Tuple[int, int, int]:
+        """start and end of the first <CHOICE> tag and end of the first <REASONING> tag (-1 if missing), in one scan"""
+        choice_start = choice_end = reasoning_end = -1
+        for match in TAG_PATTERN.finditer(response):
+            if match.group(1).upper() == "CHOICE":
+                if choice_start < 0:
+                    choice_start, choice_end = match.start(), match.end()
+            elif reasoning_end < 0:
+                reasoning_end = match.end()
+            if choice_start >= 0 and (reasoning_end >= 0 or not with_reasoning):
+                break
+        if choice_start < 0:
+            raise ResponseFormatError("Cannot find <CHOICE> tag in response.")
+        if with_reasoning and reasoning_end < 0:
+            raise ResponseFormatError("Cannot find <REASONING> tag in response.")
+        return choice_start, choice_end, reasoning_end
 
-        # find <CHOICE> tag position
-        choice_tag_match = re.search(r"<CHOICE>", response, re.IGNORECASE)
+    @staticmethod
+    def _get_reasoning(response: str, reasoning_end: int, choice_start: int) -> str:
+        """text between the tags without surrounding whitespace and a leading colon, sliced once"""
+        start, end = reasoning_end, choice_start
+        while start < end and response[start].isspace():
+            start += 1
+        if start < end and response[start] == ":":
+            start += 1
+            while start < end and response[start].isspace():
+                start += 1
+        while end > start and response[end - 1].isspace():
+            end -= 1
+        return response[start:end]
 
-        if choice_tag_match:
-            text_after_choice = response[choice_tag_match.end():].strip()
-            if text_after_choice.startswith(":"):
-                text_after_choice = text_after_choice[1:].strip()
-            
-            try:
-                # find the first BLUE value after <CHOICE> tag
-                blue_match = re.search(r"BLUE\s*=\s*(\d+)", text_after_choice, re.IGNORECASE)
-                blue_value = int(blue_match.group(1))
-                # find the first YELLOW value after <CHOICE> tag
-                yellow_match = re.search(r"YELLOW\s*=\s*(\d+)", text_after_choice, re.IGNORECASE)
-                yellow_value = int(yellow_match.group(1))
-                # find the first PURPLE value after <CHOICE> tag
-                purple_match = re.search(r"PURPLE\s*=\s*(\d+)", text_after_choice, re.IGNORECASE)
-                purple_value = int(purple_match.group(1))
-            except Exception:
-                logger.error(f"Proposal stage, cannot convert extracted value to integer. {text_after_choice}")
-                raise Exception(f"Cannot convert extracted value to integer.")
-                     
-        else:
-            # if tag is missing, all values remain None
-            raise ResponseFormatError("Cannot find <CHOICE> tag in response.")
+    @staticmethod
+    def _get_code(response: str, pos: int) -> Optional[str]:
+        """first BLUE, YELLOW and PURPLE values from `pos` on, None if one is missing"""
+        values = {}
+        for match in CODE_VALUE_PATTERN.finditer(response, pos):
+            values.setdefault(match.group(1).upper(), int(match.group(2)))
+            if len(values) == len(CODE_COLORS):
+                return "".join(str(values[color]) for color in CODE_COLORS)
+        return None
 
-        # find <REASONING> tag position
-        if with_reasoning:
-            reasoning_tag_match = re.search(r"<REASONING>", response, re.IGNORECASE)
-        
-            if reasoning_tag_match:
-                reasoning = response[reasoning_tag_match.end():choice_tag_match.start()].strip()
-                if reasoning.startswith(":"):
-                    reasoning = reasoning[1:].strip()
-            else:
-                raise ResponseFormatError("Cannot find <REASONING> tag in response.")
-            
-        return reasoning, f"{blue_value}{yellow_value}{purple_value}"
+    @staticmethod
+    def extract_proposal(response: str, with_reasoning: bool = True) -> Tuple[Optional[str], str]:
+        """extract reasoning and proposal code from response"""
+        choice_start, choice_end, reasoning_end = LlmParserService._locate_tags(response, with_reasoning)
+        guess_code = LlmParserService._get_code(response, choice_end)
+        if guess_code is None:
+            logger.error(f"Proposal stage, cannot find the code after <CHOICE> tag. {response[choice_end:choice_end + 200]}")
+            raise ResponseFormatError("Cannot find BLUE, YELLOW and PURPLE values after <CHOICE> tag.")
+        reasoning = LlmParserService._get_reasoning(response, reasoning_end, choice_start) if with_reasoning else None
+        return reasoning, guess_code
     
     @staticmethod
     def extract_verifier_choices(response: str, with_reasoning: bool = True) -> Tuple[Optional[str], str]:
         """extract verifier choices from response"""
-        reasoning = None
-        choice = None
-        choice_tag_match = re.search(r"<CHOICE>", response, re.IGNORECASE)
-        
-        if choice_tag_match:
-            text_after_choice = response[choice_tag_match.end():].strip()
-            if text_after_choice.startswith(":"):
-                text_after_choice = text_after_choice[1:].strip()
-            
-            if "SKIP" in text_after_choice:
-                choice = "SKIP"
-            else:
-                number_match = re.search(r'\d+', text_after_choice)
-                if number_match:
-                    choice = int(number_match.group(0))
-                else:
-                    logger.error(f"Question stage, did not find any choices in response. {text_after_choice}")
-                    raise ResponseFormatError("Did not find any choices in response.")
+        choice_start, choice_end, reasoning_end = LlmParserService._locate_tags(response, with_reasoning)
+        if response.find("SKIP", choice_end) >= 0:
+            choice = "SKIP"
         else:
-            raise ResponseFormatError("Cannot find <CHOICE> tag in response.")
-
-        if with_reasoning:  
-            reasoning_tag_match = re.search(r"<REASONING>", response, re.IGNORECASE)
-            if reasoning_tag_match:
-                reasoning = response[reasoning_tag_match.end():choice_tag_match.start()].strip()
-                if reasoning.startswith(":"):
-                    reasoning = reasoning[1:].strip()
-            else:
-                raise ResponseFormatError("Cannot find <REASONING> tag in response.")
-
-        return reasoning, str(choice)
+            number_match = NUMBER_PATTERN.search(response, choice_end)
+            if number_match is None:
+                logger.error(f"Question stage, did not find any choices in response. {response[choice_end:choice_end + 200]}")
+                raise ResponseFormatError("Did not find any choices in response.")
+            choice = str(int(number_match.group(0)))
+        reasoning = LlmParserService._get_reasoning(response, reasoning_end, choice_start) if with_reasoning else None
+        return reasoning, choice
     
     @staticmethod
     def extract_deduce(response: str, with_reasoning: bool = True) -> Tuple[Optional[str], str]:
         """extract final guess from response"""
-        reasoning = None
-        guess = None
-        
-        # find <CHOICE> tag position
-        choice_tag_match = re.search(r"<CHOICE>", response, re.IGNORECASE)
-
-        if choice_tag_match:
-            text_after_choice = response[choice_tag_match.end():].strip()
-            if text_after_choice.startswith(":"):
-                text_after_choice = text_after_choice[1:].strip()
-
-            if "SKIP" in text_after_choice:
-                guess = "SKIP"
-            else:
-                try:
-                    blue_match = re.search(r"BLUE\s*=\s*(\d+)", text_after_choice, re.IGNORECASE)
-                    blue_value = int(blue_match.group(1))
-                    yellow_match = re.search(r"YELLOW\s*=\s*(\d+)", text_after_choice, re.IGNORECASE)
-                    yellow_value = int(yellow_match.group(1))
-                    purple_match = re.search(r"PURPLE\s*=\s*(\d+)", text_after_choice, re.IGNORECASE)
-                    purple_value = int(purple_match.group(1))
-                except Exception:
-                    raise ResponseFormatError(f"Cannot convert extracted values to integers.")
-                     
-                guess = f"{blue_value}{yellow_value}{purple_value}"
+        choice_start, choice_end, reasoning_end = LlmParserService._locate_tags(response, with_reasoning)
+        if response.find("SKIP", choice_end) >= 0:
+            guess = "SKIP"
         else:
-            raise ResponseFormatError("Cannot find <CHOICE> tag in response.")
+            guess = LlmParserService._get_code(response, choice_end)
+            if guess is None:
+                raise ResponseFormatError("Cannot find BLUE, YELLOW and PURPLE values after <CHOICE> tag.")
+        reasoning = LlmParserService._get_reasoning(response, reasoning_end, choice_start) if with_reasoning else None
+        return reasoning, guess
 
-        if with_reasoning:
-            reasoning_tag_match = re.search(r"<REASONING>", response, re.IGNORECASE)
-            if reasoning_tag_match:
-                reasoning = response[reasoning_tag_match.end():choice_tag_match.start()]
-                if reasoning.startswith(":"):
-                    reasoning = reasoning[1:].strip()
+    @staticmethod
+    def _load_structured(response: str, turn_name: str) -> Dict[str, Any]:
+        """decode a schema constrained answer, checking the keys and value types of the stage schema"""
+        try:
+            answer = json.loads(response)
+        except ValueError:
+            raise ResponseFormatError("Response is not valid JSON.")
+        schema = RESPONSE_SCHEMAS[turn_name]
+        if not isinstance(answer, dict) or set(answer) != set(schema["required"]):
+            raise ResponseFormatError(f"Response does not have the keys {schema['required']}.")
+        for key, value in answer.items():
+            expected = schema["properties"][key]
+            if expected["type"] == "string":
+                valid = isinstance(value, str)
+            elif expected["type"] == "boolean":
+                valid = isinstance(value, bool)
             else:
-                raise ResponseFormatError("Cannot find <REASONING> tag in response.")
-        
-        return reasoning, guess
\ No newline at end of file
+                valid = isinstance(value, int) and not isinstance(value, bool)
+            if not valid or ("enum" in expected and value not in expected["enum"]):
+                raise ResponseFormatError(f"Response has an invalid {key}: {value!r}")
+        return answer
+
+    @staticmethod
+    def extract_proposal_structured(response: str) -> Tuple[str, str]:
+        """extract reasoning and proposal code from a json schema answer"""
+        answer = LlmParserService._load_structured(response, "proposal")
+        return answer["reasoning"].strip(), f"{answer['blue']}{answer['yellow']}{answer['purple']}"
+
+    @staticmethod
+    def extract_verifier_choices_structured(response: str) -> Tuple[str, str]:
+        """extract reasoning and verifier choice from a json schema answer"""
+        answer = LlmParserService._load_structured(response, "question")
+        return answer["reasoning"].strip(), "SKIP" if answer["skip"] else str(answer["verifier"])
+
+    @staticmethod
+    def extract_deduce_structured(response: str) -> Tuple[str, str]:
+        """extract reasoning and final guess from a json schema answer"""
+        answer = LlmParserService._load_structured(response, "deduce")
+        return answer["reasoning"].strip(), "SKIP" if answer["skip"] else f"{answer['blue']}{answer['yellow']}{answer['purple']}"
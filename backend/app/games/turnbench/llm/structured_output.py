@@ -0,0 +1,103 @@
+from typing import Any, Dict, List
+
+from openai import BadRequestError
+
+from app.core.config import settings
+from app.core.llm_client import LLMClient
+from app.games.turnbench.config import GAME_NAME
+from app.games.turnbench.models.session import GameSession
+from app.models.llm import LLMCompleteResponse
+from app.utils import setup_logger
+
+logger = setup_logger(f"{GAME_NAME}-StructuredOutput", settings.LOG_LEVEL)
+
+_REASONING = {"type": "string", "description": "your step by step reasoning"}
+_DIGIT = {"type": "integer", "enum": [1, 2, 3, 4, 5]}
+
+# strict json schemas of the answers of each stage, all properties are required by strict mode
+RESPONSE_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "proposal": {
+        "type": "object",
+        "properties": {"reasoning": _REASONING, "blue": _DIGIT, "yellow": _DIGIT, "purple": _DIGIT},
+        "required": ["reasoning", "blue", "yellow", "purple"],
+        "additionalProperties": False,
+    },
+    "question": {
+        "type": "object",
+        "properties": {
+            "reasoning": _REASONING,
+            "skip": {"type": "boolean", "description": "true to skip verifier testing for this round"},
+            "verifier": {"type": "integer", "description": "number of the verifier to test, ignored when skipping"},
+        },
+        "required": ["reasoning", "skip", "verifier"],
+        "additionalProperties": False,
+    },
+    "deduce": {
+        "type": "object",
+        "properties": {
+            "reasoning": _REASONING,
+            "skip": {"type": "boolean", "description": "true to continue to the next round, false to submit the code"},
+            "blue": _DIGIT,
+            "yellow": _DIGIT,
+            "purple": _DIGIT,
+        },
+        "required": ["reasoning", "skip", "blue", "yellow", "purple"],
+        "additionalProperties": False,
+    },
+}
+
+
+# sent instead of the tagged text format prompts when a schema constrained answer does not decode
+STRUCTURED_FORMAT_ERROR_PROMPT = (
+    "Your answer did not follow the required JSON schema ({error}). "
+    "Please answer again with the same choice, as a JSON object with the keys {keys}."
+)
+
+
+def get_response_format(turn_name: str) -> Dict[str, Any]:
+    """openai `response_format` constraining the answer of a stage to its schema"""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": f"{turn_name}_answer", "strict": True, "schema": RESPONSE_SCHEMAS[turn_name]},
+    }
+
+
+def get_format_error_prompt(session: GameSession, turn_name: str, error: Exception) -> str:
+    """prompt asking to answer a stage again after a format error"""
+    if session.output_mode == "json_schema":
+        return STRUCTURED_FORMAT_ERROR_PROMPT.format(error=error, keys=", ".join(RESPONSE_SCHEMAS[turn_name]["required"]))
+    return session.base_game_prompts[f"not_valid_{turn_name}_format_prompt"]
+
+
+def is_response_format_unsupported(error: BadRequestError) -> bool:
+    """whether a provider rejected a request because it does not support the json schema response format"""
+    if error.param == "response_format":
+        return True
+    message = str(error.message).lower()
+    return "response_format" in message or "json_schema" in message
+
+
+def get_stage_complete(
+    session: GameSession,
+    llm_client: LLMClient,
+    turn_name: str,
+    messages: List[Dict[str, Any]],
+    attempt: int
+) -> LLMCompleteResponse:
+    """
+    get the answer of a stage, schema constrained for `json_schema` sessions.
+    a provider rejecting the response format switches the session back to tagged text for good,
+    any other bad request is raised.
+    """
+    turn_num = session.total_turns + 1
+    if session.output_mode == "json_schema":
+        try:
+            return llm_client.get_complete(
+                messages, turn_num=turn_num, attempt=attempt, response_format=get_response_format(turn_name)
+            )
+        except BadRequestError as e:
+            if not is_response_format_unsupported(e):
+                raise
+            logger.warning(f"{session.id}: structured output rejected, falling back to tagged text: {e}")
+            session.output_mode = "text"
+    return llm_client.get_complete(messages, turn_num=turn_num, attempt=attempt)
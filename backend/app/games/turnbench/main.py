@@ -1,3 +1,4 @@
+import hashlib
 import os
 
 from sqlmodel import Session
@@ -8,9 +9,12 @@ from app.games.base.main import GameMetadataBase, GameCreate
 from app.games.turnbench.config import GAME_NAME, GAME_DISPLAY_NAME, GAME_DESCRIPTION, GAME_ICON_URL
 from app.games.turnbench.models.setup import GameSetupCreate
 from app.games.turnbench.game_setup.setup_service import SetupService
+from app.services.game_service import GameService
 
 logger = setup_logger("TurnbenchGameMetadata", settings.LOG_LEVEL)
 
+SETUPS_FILEPATH = "app/games/turnbench/data/setups.json"
+
 class TurnbenchGameMetadata(GameMetadataBase):
     """Turnbench game metadata"""
     
@@ -51,22 +55,28 @@ class TurnbenchGameMetadata(GameMetadataBase):
         )
     
     def check_game_setup_exists(self, session: Session) -> bool:
-        """check if game setup exists"""
-        setup_service = SetupService(session)
-        filepath = "app/games/turnbench/data/setups.json"
-        logger.info(f"Trying to load {filepath} to check game setups")
-        all_setups = load_json(filepath)
-        setups, total = setup_service.list_setups(page=1, page_size=len(all_setups))
-        if total == len(all_setups):
-            return True
-        return False
+        """check if the stored setups match setups.json, by the hash of the file"""
+        game = GameService(session).get_game_by_name(self.name)
+        if game is None:
+            return False
+        return game.setup_manifest_hash == self._get_setups_manifest_hash()
     
     def save_game_setups(self, session: Session) -> None:
-        """save game setups"""
+        """upsert game setups by game_id and remember the synced setups.json"""
+        game_service = GameService(session)
         setup_service = SetupService(session)
-        filepath = "app/games/turnbench/data/setups.json"
-        logger.info(f"Trying to load {filepath} to save game setups")
-        all_setups = load_json(filepath)
+        logger.info(f"Trying to load {SETUPS_FILEPATH} to save game setups")
+        manifest_hash = self._get_setups_manifest_hash()
+        all_setups = load_json(SETUPS_FILEPATH)
         setup_creates = [GameSetupCreate(**setup) for setup in all_setups.values()]
-        setups = setup_service.create_setups(setup_creates=setup_creates)
-        logger.info(f"Saved {len(setups)} game setups")
\ No newline at end of file
+        written = setup_service.sync_setups(setup_creates=setup_creates)
+        logger.info(f"Synced {len(setup_creates)} game setups, {written} inserted or updated")
+        game = game_service.get_game_by_name(self.name)
+        if game is not None:
+            game_service.update_setup_manifest_hash(game.id, manifest_hash)
+    
+    @staticmethod
+    def _get_setups_manifest_hash() -> str:
+        """sha256 of setups.json"""
+        with open(SETUPS_FILEPATH, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
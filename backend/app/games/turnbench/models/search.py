@@ -0,0 +1,47 @@
+import uuid
+from typing import List, Optional
+
+from sqlalchemy import Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import Column, Field, SQLModel, Text
+
+from app.games.turnbench.config import GAME_NAME
+from app.games.turnbench.models.session import SessionFilter
+
+
+# database model
+class TurnSearchDocument(SQLModel, table=True):
+    """searchable text of one turn of a session, forks get their own copy of the turns they share"""
+    __tablename__ = f"{GAME_NAME}_turn_search"
+    __table_args__ = (
+        Index(f"ix_{GAME_NAME}_turn_search_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    # no foreign key, the sessions table is partitioned and its primary key includes created_at
+    session_id: uuid.UUID = Field(primary_key=True)
+    # position in the turn history of the session
+    turn_index: int = Field(primary_key=True)
+    turn_num: int
+    turn_name: str = Field(max_length=100)
+    # reasoning, model level reasoning and llm response of the turn
+    content: str = Field(sa_column=Column(Text, nullable=False))
+    # only maintained on postgres
+    search_vector: Optional[str] = Field(default=None, sa_column=Column(Text().with_variant(TSVECTOR(), "postgresql")))
+
+# request model
+class SearchTurnsRequest(SessionFilter):
+    q: str # web search syntax: words, "quoted phrases", OR, -excluded
+    limit: int = 50
+    offset: int = 0
+
+# response model
+class TurnSearchHit(SQLModel):
+    session_id: uuid.UUID
+    turn_index: int
+    turn_num: int
+    turn_name: str
+    snippet: str
+    rank: float
+
+class SearchTurnsResponse(SQLModel):
+    data: List[TurnSearchHit]
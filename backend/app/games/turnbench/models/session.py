@@ -1,10 +1,12 @@
 import uuid
-from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+from typing import List, Dict, Any, Literal, Optional, Tuple, TYPE_CHECKING
 from datetime import datetime, timezone
 
-from sqlmodel import Field, SQLModel, JSON, Column, Relationship
+from pydantic import computed_field
+from sqlmodel import Field, SQLModel, JSON, Column, LargeBinary, Relationship, Text
+from sqlalchemy import Index, text
 
-from app.models.base import BaseModel
+from app.models.base import PartitionedBaseModel
 from app.games.turnbench.config import GAME_NAME
 from app.games.turnbench.models.llm import Prompt
 from app.games.turnbench.models.setup import GameSetupDetail
@@ -20,7 +22,12 @@ class PlayTurnData(SQLModel):
     turn_prompt: str
     turn_reasoning: str
     turn_model_level_reasoning: Optional[str] = None
+    # stored reasoning content is moved out of the turn, fetch it by hash
+    turn_model_level_reasoning_hash: Optional[str] = None
     turn_time_used: Optional[float] = None
+    turn_retries: Optional[int] = None
+    turn_cached_tokens: Optional[int] = None
+    turn_reasoning_tokens: Optional[int] = None
     guess_code: Optional[str] = None
     verifier_choice: Optional[str] = None
     verifier_result: Optional[str] = None
@@ -36,6 +43,20 @@ class GameSessionBase(SQLModel):
     llm_id: uuid.UUID = Field(foreign_key="llms.id", index=True)
     setup_id: uuid.UUID = Field(foreign_key=f"{GAME_NAME}_setups.id", index=True)
     max_rounds: Optional[int] = Field(default=99)
+    # "prefix_stable" keeps the rules first, the setup next and the history append-only, for provider prompt caching
+    prompt_layout: str = Field(default="default", max_length=20)
+    # how the messages sent to the llm are built from the history, see context_strategies
+    context_strategy: str = Field(default="full", max_length=20)
+    # "json_schema" asks for schema constrained answers, switched back to "text" if the provider rejects them
+    output_mode: str = Field(default="text", max_length=20)
+    # what is sent again after an unusable response, see retry_policy
+    retry_mode: str = Field(default="keep", max_length=20)
+
+    # fork info, a fork shares the first `fork_turn` turns and `fork_message_index` messages of its parent
+    # no foreign key, the sessions table is partitioned and its primary key includes created_at
+    parent_session_id: Optional[uuid.UUID] = Field(default=None, index=True)
+    fork_turn: Optional[int] = Field(default=0)
+    fork_message_index: Optional[int] = Field(default=0)
 
     # game settings
     game_info: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
@@ -48,9 +69,17 @@ class GameSessionBase(SQLModel):
     total_verifiers: Optional[int] = Field(default=0)
     total_input_tokens: Optional[int] = Field(default=0)
     total_output_tokens: Optional[int] = Field(default=0)
+    # prompt cache hits within total_input_tokens, hidden reasoning within total_output_tokens
+    total_cached_tokens: Optional[int] = Field(default=0)
+    total_reasoning_tokens: Optional[int] = Field(default=0)
     longest_context_length: Optional[int] = Field(default=0)
     total_response_with_formatting_error: Optional[int] = Field(default=0)
     total_response_with_not_valid_error: Optional[int] = Field(default=0)
+    # part of the totals spent on asking again after unusable responses
+    total_retries: Optional[int] = Field(default=0)
+    total_retry_time: Optional[float] = Field(default=0)
+    total_retry_input_tokens: Optional[int] = Field(default=0)
+    total_retry_output_tokens: Optional[int] = Field(default=0)
     submitted_code: Optional[str] = Field(default=None)
     num_of_verifier_passed: Optional[int] = Field(default=0)
 
@@ -67,6 +96,12 @@ class GameSessionBase(SQLModel):
     turn_time_used: Optional[float] = Field(default=0)
     turn_input_tokens: Optional[int] = Field(default=0)
     turn_output_tokens: Optional[int] = Field(default=0)
+    turn_cached_tokens: Optional[int] = Field(default=0)
+    turn_reasoning_tokens: Optional[int] = Field(default=0)
+    turn_retries: Optional[int] = Field(default=0)
+    turn_retry_time: Optional[float] = Field(default=0)
+    turn_retry_input_tokens: Optional[int] = Field(default=0)
+    turn_retry_output_tokens: Optional[int] = Field(default=0)
     turn_longest_context_length: Optional[int] = Field(default=0)
 
     # game data
@@ -87,19 +122,129 @@ class GameSessionUpdate(GameSessionBase):
     setup_id: Optional[uuid.UUID] = Field(default=None)
     updated_at: Optional[datetime] = Field(default=datetime.now(timezone.utc))
 
-class GameSession(GameSessionBase, BaseModel, table=True):
+class GameSession(GameSessionBase, PartitionedBaseModel, table=True):
     """game session database model"""
     __tablename__ = f"{GAME_NAME}_sessions"
+    __table_args__ = (
+        # listings of one llm or mode, newest first
+        Index(f"ix_{GAME_NAME}_sessions_llm_id_created_at", "llm_id", "created_at"),
+        Index(f"ix_{GAME_NAME}_sessions_mode_created_at", "mode", "created_at"),
+        # finished sessions by outcome, covering the outcome filter columns for index-only scans
+        Index(
+            f"ix_{GAME_NAME}_sessions_finished",
+            "llm_id", "mode", "game_success", "created_at",
+            postgresql_where=text("game_over"),
+            postgresql_include=["setup_id", "game_over_reason", "total_rounds", "total_input_tokens", "total_output_tokens"],
+        ),
+        Index(
+            f"ix_{GAME_NAME}_sessions_game_over_reason",
+            "game_over_reason", "created_at",
+            postgresql_where=text("game_over_reason IS NOT NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # ownership of a worker holding the session in its hot cache
+    owner_id: Optional[str] = Field(default=None, max_length=100)
+    lease_expires_at: Optional[datetime] = Field(default=None)
+    handoff_requested: bool = Field(default=False)
+    state_version: int = Field(default=0)
+
+    # set once the bulky columns moved to the compressed archive table
+    archived_at: Optional[datetime] = Field(default=None)
 
     # relations
     llm: "LLM" = Relationship(back_populates=f"{GAME_NAME}_sessions")
     turnbench_setup: "GameSetup" = Relationship(back_populates=f"{GAME_NAME}_sessions")
     
+class GameSessionArchive(SQLModel, table=True):
+    """compressed bulky columns of a finished session"""
+    __tablename__ = f"{GAME_NAME}_session_archives"
+
+    session_id: uuid.UUID = Field(primary_key=True)
+    codec: str = Field(default="zstd", max_length=20)
+    raw_size: int = Field(default=0)
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    archived_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    
+class TurnReasoning(SQLModel, table=True):
+    """model level reasoning content of turns, addressed by the sha256 of the content"""
+    __tablename__ = f"{GAME_NAME}_turn_reasonings"
+
+    hash: str = Field(primary_key=True, max_length=64)
+    content: str = Field(sa_column=Column(Text, nullable=False))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class TurnIdempotencyKey(SQLModel, table=True):
+    """turn played for an Idempotency-Key, replayed to retries of the same request"""
+    __tablename__ = f"{GAME_NAME}_turn_idempotency_keys"
+
+    session_id: uuid.UUID = Field(primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    # sha256 of the request, a key reused for another request is rejected
+    request_hash: str = Field(max_length=64)
+    turn_data: Dict[str, Any] = Field(sa_column=Column(JSON, nullable=False))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
 class GameSessionPublic(GameSessionBase):
     id: uuid.UUID
     created_at: datetime
     updated_at: datetime
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def cache_hit_rate(self) -> float:
+        """share of the input tokens read from the provider's prompt cache"""
+        return (self.total_cached_tokens or 0) / self.total_input_tokens if self.total_input_tokens else 0
+
+class SessionFilter(SQLModel):
+    """session filters, all given conditions have to match"""
+    llm_ids: Optional[List[uuid.UUID]] = None
+    setup_ids: Optional[List[uuid.UUID]] = None
+    modes: Optional[List[str]] = None
+    prompt_layouts: Optional[List[str]] = None
+    context_strategies: Optional[List[str]] = None
+    output_modes: Optional[List[str]] = None
+    retry_modes: Optional[List[str]] = None
+    created_from: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    game_over: Optional[bool] = None
+    game_success: Optional[bool] = None
+    game_over_reasons: Optional[List[str]] = None
+    difficulties: Optional[List[str]] = None # difficulty of the setup
+    # inclusive ranges
+    total_rounds_min: Optional[int] = None
+    total_rounds_max: Optional[int] = None
+    total_input_tokens_min: Optional[int] = None
+    total_input_tokens_max: Optional[int] = None
+    total_output_tokens_min: Optional[int] = None
+    total_output_tokens_max: Optional[int] = None
+
+class ListSessionsRequest(SessionFilter):
+    page: int
+    page_size: int
+    # column names, prefixed with "-" for descending order
+    sort_by: List[str] = ["-created_at"]
+
+class GameSessionBulkUpdate(SQLModel):
+    """fields that can be set on many sessions at once"""
+    mode: Optional[str] = Field(default=None, max_length=100)
+    max_rounds: Optional[int] = None
+    game_over: Optional[bool] = None
+    game_over_reason: Optional[str] = None
+    game_success: Optional[bool] = None
+
+class UpdateSessionsRequest(SQLModel):
+    filter: SessionFilter
+    update: GameSessionBulkUpdate
+
+class SessionsCountResponse(SQLModel):
+    data: int # number of sessions affected
+
+class ExportSessionsRequest(SessionFilter):
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson"
+    kind: Literal["sessions", "turns"] = "sessions" # one record per session or per played turn
+
 class GetSessionsResponse(SQLModel):
     data: List[GameSessionPublic]
     count: int
@@ -112,15 +257,28 @@ class GetSessionResponse(SQLModel):
 class GetSessionTurnHistoryResponse(SQLModel):
     data: List[PlayTurnData]
     
+class GetTurnReasoningResponse(SQLModel):
+    data: str
+    
 class CreateSessionRequest(SQLModel):
     mode: str
     llm_id: uuid.UUID
     setup_id: uuid.UUID
     max_rounds: int
+    prompt_layout: Literal["default", "prefix_stable"] = "default"
+    context_strategy: Literal["full", "sliding_window", "facts_only"] = "full"
+    output_mode: Literal["text", "json_schema"] = "text"
+    retry_mode: Literal["keep", "collapse", "restart"] = "keep"
 
 class CreateSessionResponse(SQLModel):
     data: GameSessionPublic
 
+class CreateSessionsRequest(SQLModel):
+    data: List[CreateSessionRequest]
+
+class CreateSessionsResponse(SQLModel):
+    data: List[uuid.UUID] # session ids, same order as the requests
+
 class UpdateSessionRequest(SQLModel):
     new_turn_data: Optional[PlayTurnData] = None
 
@@ -134,9 +292,18 @@ class CopySessionRequest(SQLModel):
 class CopySessionResponse(SQLModel):
     data: uuid.UUID # session id
 
+class ForkSessionsRequest(SQLModel):
+    llm_ids: List[uuid.UUID]
+    new_turn_data: Optional[PlayTurnData] = None
+
+class ForkSessionsResponse(SQLModel):
+    data: List[uuid.UUID] # session ids, same order as llm_ids
+
 class PlayTurnRequest(SQLModel):
     turn_num: Optional[int] = None
     reasoning_effort: Optional[str] = None # None, low, medium, high
+    # seconds the turn may take, the llm's and the default deadline still apply when shorter
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
 
 class PlayTurnResponse(SQLModel):
     data: PlayTurnData
@@ -14,9 +14,11 @@ if TYPE_CHECKING:
 # base model
 class GameSetupBase(SQLModel):
     """game setup base model"""
+    # natural key of the setup in setups.json
+    game_id: Optional[str] = Field(default=None, unique=True, index=True, max_length=50)
     number_of_verifiers: Optional[int] = Field(default=None)
     answer: Optional[str] = Field(default=None)
-    difficulty: Optional[str] = Field(default=None)
+    difficulty: Optional[str] = Field(default=None, index=True)
     verifier_ids: Optional[List[int]] = Field(default=None, sa_column=Column(JSON))
     active_criteria_ids: Optional[List[int]] = Field(default=None, sa_column=Column(JSON))
     nightmare_verifier_ids: Optional[List[int]] = Field(default=None, sa_column=Column(JSON))
@@ -43,6 +45,9 @@ class GameSetup(GameSetupBase, BaseModel, table=True):
     """game setup database model"""
     __tablename__ = f"{GAME_NAME}_setups"
 
+    # sha256 of the setup content, upserts skip rows whose hash did not change
+    content_hash: Optional[str] = Field(default=None, max_length=64)
+
     # relations
     turnbench_sessions: List["GameSession"] = Relationship(back_populates=f"{GAME_NAME}_setup")
 
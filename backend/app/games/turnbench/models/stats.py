@@ -0,0 +1,63 @@
+import uuid
+from datetime import date
+from typing import List, Literal, Optional
+
+from sqlmodel import Field, SQLModel
+
+from app.games.turnbench.config import GAME_NAME
+
+
+# database model
+class GameSessionStats(SQLModel, table=True):
+    """totals of the finished sessions of one llm, mode and setup difficulty, by the day the sessions were created"""
+    __tablename__ = f"{GAME_NAME}_session_stats"
+
+    # no foreign key, the stats outlive dropped session partitions
+    llm_id: uuid.UUID = Field(primary_key=True)
+    mode: str = Field(primary_key=True, max_length=100)
+    # empty for setups without difficulty
+    difficulty: str = Field(default="", primary_key=True, max_length=100)
+    day: date = Field(primary_key=True)
+
+    sessions: int = Field(default=0)
+    successes: int = Field(default=0)
+    total_rounds: int = Field(default=0)
+    total_turns: int = Field(default=0)
+    total_input_tokens: int = Field(default=0)
+    total_output_tokens: int = Field(default=0)
+    total_cached_tokens: int = Field(default=0)
+    total_reasoning_tokens: int = Field(default=0)
+    total_time: float = Field(default=0)
+
+# request model
+class LeaderboardRequest(SQLModel):
+    """leaderboard filters, rows are always per llm and optionally split by `group_by`"""
+    llm_ids: Optional[List[uuid.UUID]] = None
+    modes: Optional[List[str]] = None
+    difficulties: Optional[List[str]] = None
+    day_from: Optional[date] = None
+    day_to: Optional[date] = None # inclusive
+    group_by: List[Literal["mode", "difficulty", "day"]] = []
+
+# response model
+class LeaderboardEntry(SQLModel):
+    llm_id: uuid.UUID
+    mode: Optional[str] = None
+    difficulty: Optional[str] = None
+    day: Optional[date] = None
+    sessions: int
+    successes: int
+    success_rate: float
+    avg_rounds: float
+    avg_turns: float
+    avg_input_tokens: float
+    avg_output_tokens: float
+    avg_cached_tokens: float
+    avg_reasoning_tokens: float
+    cache_hit_rate: float # share of input tokens read from the provider's prompt cache
+    reasoning_rate: float # share of output tokens spent on hidden reasoning
+    avg_time: float # seconds per session
+    avg_turn_time: float # seconds per turn
+
+class GetLeaderboardResponse(SQLModel):
+    data: List[LeaderboardEntry]
@@ -0,0 +1,26 @@
+import logging
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.games.turnbench.game_stats.stats_service import StatsService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def rebuild() -> int:
+    # stats of sessions no longer stored, e.g. in dropped partitions, are removed as well
+    with Session(engine) as session:
+        return StatsService(session).rebuild_stats(settings.TURNBENCH_STATS_REBUILD_WORKERS)
+
+
+def main() -> None:
+    logger.info("Rebuilding session stats")
+    chunks = rebuild()
+    logger.info(f"Rebuilt session stats of {chunks} months")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import logging
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.games.turnbench.game_session.session_service import SessionService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def reindex() -> int:
+    # turns are indexed as they are played, this fills the index for sessions recorded before it existed
+    with Session(engine) as session:
+        return SessionService(session).reindex_turn_search(settings.TURNBENCH_SEARCH_REINDEX_BATCH_SIZE)
+
+
+def main() -> None:
+    logger.info("Rebuilding the turn search index")
+    indexed = reindex()
+    logger.info(f"Indexed the turns of {indexed} sessions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,31 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.api.main import api_router
+from app.core.telemetry import llm_call_recorder
 from app.games.turnbench.api.main import turnbench_api_router
+from app.games.turnbench.game_session.session_cache import session_cache
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    yield
+    # persist sessions still held in memory before the worker exits
+    session_cache.close()
+    llm_call_recorder.close()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -0,0 +1,51 @@
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import delete
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.partitions import (
+    drop_partitions_before,
+    ensure_partitions,
+    is_partitioned,
+    month_start,
+)
+from app.games.turnbench.game_session.session_service import SessionService
+from app.models.llm_call import LLMCall
+from app.services.history_service import GameHistoryService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def maintain() -> None:
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        ensure_partitions(session, now)
+        detach_only = settings.PARTITION_RETENTION_DETACH_ONLY
+        if settings.TURNBENCH_SESSION_RETENTION_MONTHS > 0:
+            created_before = month_start(now, -settings.TURNBENCH_SESSION_RETENTION_MONTHS)
+            SessionService(session).apply_retention(created_before, detach_only)
+        if settings.GAME_HISTORY_RETENTION_MONTHS > 0:
+            created_before = month_start(now, -settings.GAME_HISTORY_RETENTION_MONTHS)
+            GameHistoryService(session).apply_retention(created_before, detach_only)
+        if settings.LLM_CALL_RETENTION_MONTHS > 0:
+            created_before = month_start(now, -settings.LLM_CALL_RETENTION_MONTHS)
+            if is_partitioned(session, LLMCall.__tablename__):
+                drop_partitions_before(session, LLMCall.__tablename__, created_before, detach_only)
+            else:
+                session.execute(delete(LLMCall).where(LLMCall.created_at < created_before))
+                session.commit()
+        SessionService(session).delete_expired_idempotency_keys(datetime.now(timezone.utc))
+
+
+def main() -> None:
+    logger.info("Maintaining partitions")
+    maintain()
+    logger.info("Partitions maintained")
+
+
+if __name__ == "__main__":
+    main()
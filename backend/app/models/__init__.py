@@ -5,10 +5,13 @@ from .provider import Provider, ProviderPublic, ProviderCreate, ProviderUpdate,
 from .llm import LLM, LLMPublic, LLMCreate, LLMUpdate, LLMListResponse
 from .game import Game, GamePublic, GameCreate, GameUpdate, GameListResponse
 from .history import GameHistory, GameHistoryPublic, GameHistoryCreate, GameHistoryUpdate, GameHistoryListResponse
+from .llm_call import LLMCall
 
 # Turnbench
-from app.games.turnbench.models.session import GameSession
+from app.games.turnbench.models.session import GameSession, GameSessionArchive, TurnIdempotencyKey, TurnReasoning
 from app.games.turnbench.models.setup import GameSetup
+from app.games.turnbench.models.stats import GameSessionStats
+from app.games.turnbench.models.search import TurnSearchDocument
 __all__ = [
     "SQLModel",
     "BaseModel", 
@@ -32,7 +35,13 @@ __all__ = [
     "LLMCreate",
     "LLMUpdate",
     "LLMListResponse",
+    "LLMCall",
     # Turnbench
     "GameSession",
+    "GameSessionArchive",
+    "TurnIdempotencyKey",
+    "TurnReasoning",
     "GameSetup",
+    "GameSessionStats",
+    "TurnSearchDocument",
 ]
\ No newline at end of file
@@ -1,8 +1,58 @@
+import os
+import time
 import uuid
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+from sqlalchemy import JSON, DateTime, and_, true
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.sql.elements import ColumnElement
 from sqlmodel import Field, SQLModel
 
+# the id and created_at are generated separately, lookups derived from an id tolerate some skew
+UUID7_CREATED_AT_SLACK = timedelta(days=1)
+
+def uuid7() -> uuid.UUID:
+    """time ordered uuid (RFC 9562 version 7), the first 48 bits are the unix time in milliseconds"""
+    unix_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (unix_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= ((rand >> 64) & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
+
+def uuid7_datetime(value: uuid.UUID) -> Optional[datetime]:
+    """creation time embedded in a version 7 uuid"""
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=timezone.utc)
+
+class UTCDateTime(TypeDecorator[datetime]):
+    """timestamp with time zone, read back in UTC also where the database drops the offset (e.g. sqlite)"""
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_result_value(self, value: Optional[datetime], dialect: Any) -> Optional[datetime]:
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+class UUIDList(TypeDecorator[List[uuid.UUID]]):
+    """list of uuids stored as a json array of strings"""
+    impl = JSON
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[List[uuid.UUID]], dialect: Any) -> Optional[List[str]]:
+        if value is None:
+            return None
+        return [str(item) for item in value]
+
+    def process_result_value(self, value: Optional[List[str]], dialect: Any) -> Optional[List[uuid.UUID]]:
+        if value is None:
+            return None
+        return [uuid.UUID(item) for item in value]
+
 class TimestampMixin(SQLModel):
     """timestamp mixin"""
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -16,6 +66,29 @@ class BaseModel(UUIDMixin, TimestampMixin):
     """base model"""
     pass
 
+class PartitionedBaseModel(SQLModel):
+    """
+    base model of tables range partitioned by created_at, the partition key has to be part of the primary key.
+    ids are uuid7 so that lookups by id can be pruned to the partitions around their creation time.
+    """
+    id: uuid.UUID = Field(default_factory=uuid7, primary_key=True)
+    # aware utc, also as read back, primary key values have to be comparable
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), primary_key=True, sa_type=UTCDateTime
+    )
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @classmethod
+    def partition_filter(cls, id: uuid.UUID) -> ColumnElement[bool]:
+        """created_at condition implied by an id, lets postgres skip the partitions that cannot hold it"""
+        created_at = uuid7_datetime(id)
+        if created_at is None:
+            return true()
+        return and_(
+            cls.created_at >= created_at - UUID7_CREATED_AT_SLACK,
+            cls.created_at < created_at + UUID7_CREATED_AT_SLACK,
+        )
+
 class Message(SQLModel):
     """message model"""
     message: str
\ No newline at end of file
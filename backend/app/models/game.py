@@ -35,6 +35,9 @@ class Game(GameBase, BaseModel, table=True):
     """game database model"""
     __tablename__ = "games"
     
+    # sha256 of the setups file last synced, startup skips the sync while it matches
+    setup_manifest_hash: Optional[str] = Field(default=None, max_length=64)
+    
     # relations
     histories: List["GameHistory"] = Relationship(back_populates="game")
 
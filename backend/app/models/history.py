@@ -6,7 +6,7 @@ from sqlmodel import Field, SQLModel, JSON, Column, Relationship
 from sqlalchemy import Text
 from enum import Enum
 
-from app.models.base import BaseModel
+from app.models.base import PartitionedBaseModel
 
 if TYPE_CHECKING:
     from app.models.game import Game
@@ -32,10 +32,23 @@ class GameHistoryUpdate(SQLModel):
     result: Optional[bool] = Field(default=None)
     updated_at: Optional[datetime] = Field(default=datetime.now(timezone.utc))
 
+class GameHistoryFilter(SQLModel):
+    """game history filters, all given conditions have to match"""
+    game_id: Optional[uuid.UUID] = None
+    llm_id: Optional[uuid.UUID] = None
+    result: Optional[bool] = None
+    created_from: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class GameHistoryBulkUpdate(SQLModel):
+    """fields that can be set on many game histories at once"""
+    result: Optional[bool] = None
+
 # database model
-class GameHistory(GameHistoryBase, BaseModel, table=True):
+class GameHistory(GameHistoryBase, PartitionedBaseModel, table=True):
     """game history database model"""
     __tablename__ = "game_histories"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
     
     # relations
     game: "Game" = Relationship(back_populates="histories")
@@ -55,6 +68,15 @@ class GameHistoryListResponse(SQLModel):
     page: int
     page_size: int
 
+class GameHistoriesUpdateRequest(SQLModel):
+    """bulk update game histories request model"""
+    filter: GameHistoryFilter
+    update: GameHistoryBulkUpdate
+
+class GameHistoriesCountResponse(SQLModel):
+    """number of game histories affected by a bulk operation"""
+    data: int
+
 class GameHistoryDeleteResponse(SQLModel):
     """game history delete response model"""
     data: uuid.UUID
\ No newline at end of file
@@ -6,7 +6,7 @@ from sqlmodel import Field, SQLModel, Column, Relationship
 from sqlalchemy import Text
 from enum import Enum
 
-from app.models.base import BaseModel
+from app.models.base import BaseModel, UUIDList
 
 if TYPE_CHECKING:
     from app.models.provider import Provider
@@ -34,6 +34,14 @@ class LLMBase(SQLModel):
     top_p: Optional[float] = Field(default=None)
     reasoning_effort: Optional[ReasoningEffort] = Field(default=None)
 
+    # alias routing: ids of llms serving the same model on other providers, tried in order after this one.
+    # with hedging, a second endpoint is asked once the first one takes longer than its recent p95
+    # (or hedge_after_seconds while it has too few samples), the first answer wins
+    endpoint_llm_ids: Optional[List[uuid.UUID]] = Field(default=None, sa_column=Column(UUIDList))
+    hedge_after_seconds: Optional[float] = Field(default=None, gt=0)
+    # seconds a turn played by this llm may take, None for the default deadline
+    turn_deadline_seconds: Optional[float] = Field(default=None, gt=0)
+
     # relations
     provider_id: uuid.UUID = Field(foreign_key="providers.id", index=True)
     
@@ -53,6 +61,9 @@ class LLMUpdate(SQLModel):
     temperature: Optional[float] = Field(default=None, ge=0.0, le=2.0)
     top_p: Optional[float] = Field(default=None)
     reasoning_effort: Optional[ReasoningEffort] = Field(default=None)
+    endpoint_llm_ids: Optional[List[uuid.UUID]] = Field(default=None)
+    hedge_after_seconds: Optional[float] = Field(default=None, gt=0)
+    turn_deadline_seconds: Optional[float] = Field(default=None, gt=0)
     updated_at: Optional[datetime] = Field(default=datetime.now(timezone.utc))
 
 # database model
@@ -97,3 +108,6 @@ class LLMCompleteResponse(BaseModel):
     model_level_reasoning_content: Optional[str] = None
     input_tokens: int
     output_tokens: int
+    # parts of input_tokens read from the prompt cache and of output_tokens spent on hidden reasoning
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
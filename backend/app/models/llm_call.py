@@ -0,0 +1,42 @@
+import uuid
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+from app.models.base import PartitionedBaseModel
+
+
+# base model
+class LLMCallBase(SQLModel):
+    """one request to an llm api, retries are separate calls"""
+    # no foreign keys, calls are recorded in the background and may outlive what they refer to
+    session_id: Optional[uuid.UUID] = Field(default=None, index=True)
+    turn_num: Optional[int] = Field(default=None)
+    # 1 for the first request of a turn, counting up with every retry
+    attempt: int = Field(default=1)
+
+    llm_id: uuid.UUID
+    llm_name: str = Field(max_length=100)
+    provider_id: uuid.UUID
+    provider_name: str = Field(max_length=100)
+
+    latency: float # seconds
+    input_tokens: Optional[int] = Field(default=None)
+    output_tokens: Optional[int] = Field(default=None)
+    cached_tokens: Optional[int] = Field(default=None)
+    reasoning_tokens: Optional[int] = Field(default=None)
+    # http status of the api response, none if no response arrived
+    http_status: Optional[int] = Field(default=None)
+    # exception class name of a failed call
+    error_class: Optional[str] = Field(default=None, max_length=100)
+
+# database model
+class LLMCall(LLMCallBase, PartitionedBaseModel, table=True):
+    """llm call telemetry database model"""
+    __tablename__ = "llm_calls"
+    __table_args__ = (
+        Index("ix_llm_calls_llm_id_created_at", "llm_id", "created_at"),
+        Index("ix_llm_calls_provider_id_created_at", "provider_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
@@ -65,4 +65,27 @@ class ProviderListResponse(SQLModel):
 
 class ProviderDeleteResponse(SQLModel):
     """provider delete response model"""
-    data: uuid.UUID
\ No newline at end of file
+    data: uuid.UUID
+
+class CircuitBreakerTransition(SQLModel):
+    """circuit breaker state change"""
+    from_state: str
+    to_state: str
+    reason: str
+    at: datetime
+
+class CircuitBreakerPublic(SQLModel):
+    """circuit breaker of a model on a provider"""
+    provider_id: uuid.UUID
+    provider_name: str
+    model_name: str
+    state: str
+    recent_calls: int
+    error_rate: float
+    slow_call_rate: float
+    retry_at: Optional[datetime]
+    transitions: List[CircuitBreakerTransition]
+
+class CircuitBreakerListResponse(SQLModel):
+    """circuit breaker list response model"""
+    data: List[CircuitBreakerPublic]
\ No newline at end of file
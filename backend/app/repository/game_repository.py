@@ -2,6 +2,7 @@ import uuid
 from typing import Any, Optional, List
 
 from sqlmodel import Session, select, func
+from sqlalchemy import update
 from sqlalchemy.orm import selectinload
 
 from app.models.game import Game, GameCreate, GameUpdate
@@ -41,6 +42,12 @@ class GameRepository:
         self.session.refresh(db_game)
         return db_game
     
+    def update_setup_manifest_hash(self, *, game_id: uuid.UUID, setup_manifest_hash: str) -> None:
+        """Store the hash of the last synced setups file"""
+        statement = update(Game).where(Game.id == game_id).values(setup_manifest_hash=setup_manifest_hash)
+        self.session.execute(statement)
+        self.session.commit()
+    
     def delete_game_by_id(self, game_id: uuid.UUID) -> bool:
         """Delete game by id"""
         db_game = self.get_game_by_id(game_id)
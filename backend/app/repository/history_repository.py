@@ -1,10 +1,12 @@
 import uuid
-from typing import Any, Optional, List
+from datetime import datetime
+from typing import Any, Dict, Optional, List
 
 from sqlmodel import Session, select, func
+from sqlalchemy import delete, update
 from sqlalchemy.orm import selectinload
 
-from app.models.history import GameHistory, GameHistoryCreate, GameHistoryUpdate
+from app.models.history import GameHistory, GameHistoryCreate, GameHistoryUpdate, GameHistoryFilter
 
 
 class GameHistoryRepository:
@@ -23,7 +25,7 @@ class GameHistoryRepository:
     
     def get_game_history_by_id(self, history_id: uuid.UUID) -> GameHistory | None:
         """Get game history by id"""
-        statement = select(GameHistory).where(GameHistory.id == history_id)
+        statement = select(GameHistory).where(GameHistory.id == history_id, GameHistory.partition_filter(history_id))
         return self.session.exec(statement).first()
     
     def get_game_histories_by_game_id(self, game_id: uuid.UUID) -> List[GameHistory]:
@@ -48,12 +50,51 @@ class GameHistoryRepository:
     
     def delete_game_history_by_id(self, history_id: uuid.UUID) -> bool:
         """Delete game history by id"""
-        db_history = self.get_game_history_by_id(history_id)
-        if db_history:
-            self.session.delete(db_history)
+        statement = delete(GameHistory).where(GameHistory.id == history_id, GameHistory.partition_filter(history_id))
+        deleted = self.session.execute(statement).rowcount
+        self.session.commit()
+        return deleted > 0
+    
+    def delete_game_histories(self, *, history_filter: GameHistoryFilter, batch_size: int) -> int:
+        """Delete filtered game histories in batches of one statement and transaction each"""
+        deleted = 0
+        while True:
+            batch_ids = self._apply_filter(select(GameHistory.id), history_filter).limit(batch_size)
+            batch_deleted = self.session.execute(delete(GameHistory).where(GameHistory.id.in_(batch_ids))).rowcount
+            self.session.commit()
+            deleted += batch_deleted
+            if batch_deleted < batch_size:
+                break
+        return deleted
+    
+    def update_game_histories(self, *, history_filter: GameHistoryFilter, values: Dict[str, Any], batch_size: int) -> int:
+        """Set `values` on filtered game histories in batches of one statement and transaction each"""
+        updated = 0
+        last_history_id: Optional[uuid.UUID] = None
+        while True:
+            batch_ids = self._apply_filter(select(GameHistory.id), history_filter)
+            if last_history_id is not None:
+                batch_ids = batch_ids.where(GameHistory.id > last_history_id)
+            statement = (
+                update(GameHistory)
+                .where(GameHistory.id.in_(batch_ids.order_by(GameHistory.id).limit(batch_size)))
+                .values(**values)
+                .returning(GameHistory.id)
+            )
+            history_ids = list(self.session.execute(statement).scalars().all())
             self.session.commit()
-            return True
-        return False
+            updated += len(history_ids)
+            if len(history_ids) < batch_size:
+                break
+            last_history_id = max(history_ids)
+        return updated
+    
+    def delete_game_histories_created_before(self, created_before: datetime) -> int:
+        """Delete all game histories created before `created_before` in one statement"""
+        statement = delete(GameHistory).where(GameHistory.created_at < created_before)
+        deleted = self.session.execute(statement).rowcount
+        self.session.commit()
+        return deleted
     
     def list_game_histories(
         self, 
@@ -92,7 +133,7 @@ class GameHistoryRepository:
         """Get game history with game info"""
         statement = (
             select(GameHistory)
-            .where(GameHistory.id == history_id)
+            .where(GameHistory.id == history_id, GameHistory.partition_filter(history_id))
             .options(selectinload(GameHistory.game))
             .options(selectinload(GameHistory.llm))
         )
@@ -106,4 +147,19 @@ class GameHistoryRepository:
             .order_by(GameHistory.created_at.desc())
             .limit(limit)
         )
-        return list(self.session.exec(statement).all())
\ No newline at end of file
+        return list(self.session.exec(statement).all())
+    
+    @staticmethod
+    def _apply_filter(statement: Any, history_filter: GameHistoryFilter) -> Any:
+        """Add the conditions of a game history filter to a statement"""
+        if history_filter.game_id:
+            statement = statement.where(GameHistory.game_id == history_filter.game_id)
+        if history_filter.llm_id:
+            statement = statement.where(GameHistory.llm_id == history_filter.llm_id)
+        if history_filter.result is not None:
+            statement = statement.where(GameHistory.result == history_filter.result)
+        if history_filter.created_from is not None:
+            statement = statement.where(GameHistory.created_at >= history_filter.created_from)
+        if history_filter.created_before is not None:
+            statement = statement.where(GameHistory.created_at < history_filter.created_before)
+        return statement
\ No newline at end of file
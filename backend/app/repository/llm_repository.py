@@ -82,3 +82,12 @@ class LLMRepository:
             .options(selectinload(LLM.provider))
         )
         return self.session.exec(statement).first()
+
+    def get_llms_with_provider_info_by_ids(self, llm_ids: List[uuid.UUID]) -> List[LLM]:
+        """Get LLMs with provider info by ids"""
+        statement = (
+            select(LLM)
+            .where(LLM.id.in_(llm_ids))
+            .options(selectinload(LLM.provider))
+        )
+        return list(self.session.exec(statement).all())
@@ -43,9 +43,9 @@ class GameManager:
         registered_games = game_registry.get_all_games()
         for game_name, game_class in registered_games.items():
             if game_class.check_game_setup_exists(db_session):
-                logger.info(f"Game {game_name} setup already exists")
+                logger.info(f"Game {game_name} setups are up to date")
                 continue
-            logger.info(f"Game {game_name} setup does not exist, saving...")
+            logger.info(f"Game {game_name} setups changed, syncing...")
             game_class.save_game_setups(db_session)
             logger.info(f"Game {game_name} setup saved")
         
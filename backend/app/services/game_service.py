@@ -56,6 +56,10 @@ class GameService:
             game_update=game_update
         )
     
+    def update_setup_manifest_hash(self, game_id: uuid.UUID, setup_manifest_hash: str) -> None:
+        """Store the hash of the last synced setups file"""
+        self.game_repository.update_setup_manifest_hash(game_id=game_id, setup_manifest_hash=setup_manifest_hash)
+    
     def delete_game(self, game_id: uuid.UUID) -> bool:
         """Delete game"""
         self.get_game_by_id(game_id)
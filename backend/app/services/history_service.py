@@ -1,11 +1,20 @@
 import uuid
+from datetime import datetime
 from typing import List, Optional, Tuple
 
 from sqlmodel import Session, select
 from fastapi import HTTPException
 
+from app.core.partitions import is_partitioned, drop_partitions_before
 from app.repository.history_repository import GameHistoryRepository
-from app.models.history import GameHistory, GameHistoryCreate, GameHistoryUpdate, GameHistoryPublic
+from app.models.history import (
+    GameHistory,
+    GameHistoryCreate,
+    GameHistoryUpdate,
+    GameHistoryPublic,
+    GameHistoryFilter,
+    GameHistoryBulkUpdate
+)
 
 
 class GameHistoryService:
@@ -61,9 +70,35 @@ class GameHistoryService:
     
     def delete_game_history(self, history_id: uuid.UUID) -> bool:
         """Delete game history"""
-        self.get_game_history_by_id(history_id)
         return self.history_repository.delete_game_history_by_id(history_id)
     
+    def delete_game_histories(self, history_filter: GameHistoryFilter, batch_size: int) -> int:
+        """Delete all game histories matching a filter, return how many were deleted"""
+        self._check_filter_not_empty(history_filter)
+        return self.history_repository.delete_game_histories(history_filter=history_filter, batch_size=batch_size)
+    
+    def update_game_histories(self, history_filter: GameHistoryFilter, history_update: GameHistoryBulkUpdate, batch_size: int) -> int:
+        """Update all game histories matching a filter, return how many were updated"""
+        self._check_filter_not_empty(history_filter)
+        values = history_update.model_dump(exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="Nothing to update")
+        return self.history_repository.update_game_histories(
+            history_filter=history_filter, values=values, batch_size=batch_size
+        )
+    
+    def _check_filter_not_empty(self, history_filter: GameHistoryFilter) -> None:
+        """Refuse bulk operations on all game histories"""
+        if not history_filter.model_dump(exclude_none=True):
+            raise HTTPException(status_code=400, detail="At least one filter is required")
+    
+    def apply_retention(self, created_before: datetime, detach_only: bool = False) -> None:
+        """Remove histories created before `created_before`, whole partitions at a time when the table is partitioned"""
+        if is_partitioned(self.session, GameHistory.__tablename__):
+            drop_partitions_before(self.session, GameHistory.__tablename__, created_before, detach_only)
+        else:
+            self.history_repository.delete_game_histories_created_before(created_before)
+    
     def list_game_histories(
         self,
         skip: int = 0,
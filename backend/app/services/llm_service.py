@@ -89,4 +89,17 @@ class LLMService:
     def get_llm_public_by_llm_id(self, llm_id: uuid.UUID) -> LLMPublic:
         """Get public LLM by LLM id"""
         llm = self.get_llm_by_id(llm_id)
-        return LLMPublic(**llm.model_dump())
\ No newline at end of file
+        return LLMPublic(**llm.model_dump())
+
+    def get_llm_endpoints(self, llm_info: LLMPublic, provider_info: Provider) -> List[Tuple[LLMPublic, Provider]]:
+        """Get the endpoints of an LLM in routing order, the LLM itself first"""
+        if not llm_info.endpoint_llm_ids:
+            return [(llm_info, provider_info)]
+        endpoint_ids = llm_info.endpoint_llm_ids
+        endpoints = {llm.id: llm for llm in self.llm_repository.get_llms_with_provider_info_by_ids(endpoint_ids)}
+        missing = [str(llm_id) for llm_id in endpoint_ids if llm_id not in endpoints]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Endpoint LLMs {', '.join(missing)} of LLM {llm_info.id} not found")
+        return [(llm_info, provider_info)] + [
+            (LLMPublic(**endpoints[llm_id].model_dump()), endpoints[llm_id].provider) for llm_id in endpoint_ids
+        ]
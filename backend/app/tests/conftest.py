@@ -0,0 +1,46 @@
+import os
+from collections.abc import Generator
+
+# settings without a .env, the tests run on an in-memory sqlite database
+os.environ.setdefault("PROJECT_NAME", "VISTA Platform")
+os.environ.setdefault("POSTGRES_SERVER", "localhost")
+os.environ.setdefault("POSTGRES_USER", "postgres")
+
+import pytest  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+
+from app.models import LLM, GameSetup, Provider  # noqa: E402
+
+
+@pytest.fixture()
+def db() -> Generator[Session, None, None]:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture()
+def provider(db: Session) -> Provider:
+    provider = Provider(display_name="provider", api_key="key")
+    db.add(provider)
+    db.commit()
+    return provider
+
+
+@pytest.fixture()
+def llms(db: Session, provider: Provider) -> list[LLM]:
+    llms = [LLM(name=f"model-{i}", display_name=f"model {i}", provider_id=provider.id) for i in range(3)]
+    db.add_all(llms)
+    db.commit()
+    return llms
+
+
+@pytest.fixture()
+def setup(db: Session) -> GameSetup:
+    setup = GameSetup(answer="123", difficulty="easy", verifier_ids=[4, 9], active_criteria_ids=[2, 0])
+    db.add(setup)
+    db.commit()
+    return setup
@@ -0,0 +1,198 @@
+import uuid
+
+import httpx
+import pytest
+from openai import APITimeoutError, BadRequestError, InternalServerError
+
+from app.core import circuit_breaker
+from app.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.core.config import settings
+from app.core.exceptions import CircuitOpenError
+
+REQUEST = httpx.Request("POST", "http://provider/v1/chat/completions")
+
+
+def status_error(error_type: type, status_code: int) -> Exception:
+    return error_type("error", response=httpx.Response(status_code, request=REQUEST), body=None)
+
+
+class Clock:
+    """stands in for the time module of the breaker"""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+@pytest.fixture()
+def breaker(monkeypatch: pytest.MonkeyPatch) -> CircuitBreaker:
+    monkeypatch.setattr(settings, "LLM_BREAKER_WINDOW", 4)
+    monkeypatch.setattr(settings, "LLM_BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(settings, "LLM_BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "LLM_BREAKER_SLOW_CALL_SECONDS", 0)
+    monkeypatch.setattr(settings, "LLM_BREAKER_SLOW_CALL_RATE", 0.75)
+    monkeypatch.setattr(settings, "LLM_BREAKER_OPEN_SECONDS", 30)
+    return CircuitBreaker(uuid.uuid4(), "provider", "model")
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(2):
+        breaker.record(1.0)
+    for _ in range(2):
+        breaker.record(1.0, APITimeoutError(request=REQUEST))
+    assert breaker.state == OPEN
+
+
+def no_probe() -> None:
+    raise AssertionError("no probe expected")
+
+
+@pytest.mark.parametrize(
+    ("errors", "state"),
+    [
+        ([None, None, None, None], CLOSED),
+        ([None, None, None, "timeout"], CLOSED),
+        ([None, None, "timeout", "server"], OPEN),
+        # requests the provider rejected say nothing about its health
+        ([None, "bad_request", "bad_request", "bad_request"], CLOSED),
+    ],
+)
+def test_error_rate_opens_the_circuit(breaker: CircuitBreaker, errors: list, state: str) -> None:
+    known_errors = {
+        None: None,
+        "timeout": APITimeoutError(request=REQUEST),
+        "server": status_error(InternalServerError, 500),
+        "bad_request": status_error(BadRequestError, 400),
+    }
+    for error in errors:
+        breaker.record(1.0, known_errors[error])
+    assert breaker.state == state
+
+
+def test_nothing_opens_before_the_minimum_calls(breaker: CircuitBreaker) -> None:
+    for _ in range(3):
+        breaker.record(1.0, APITimeoutError(request=REQUEST))
+    assert breaker.state == CLOSED
+    breaker.record(1.0, APITimeoutError(request=REQUEST))
+    assert breaker.state == OPEN
+
+
+def test_slow_calls_open_the_circuit(breaker: CircuitBreaker, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "LLM_BREAKER_SLOW_CALL_SECONDS", 5)
+    for latency in (6.0, 7.0, 1.0, 8.0):
+        breaker.record(latency)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["transitions"][-1]["reason"] == "slow call rate 75%"
+
+
+def test_open_circuit_fails_fast_until_the_open_period_is_over(breaker: CircuitBreaker, clock: Clock) -> None:
+    open_breaker(breaker)
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call(no_probe)
+    assert raised.value.retry_at == 1030.0
+    assert breaker.state == OPEN
+
+
+def test_probe_success_closes_the_circuit(breaker: CircuitBreaker, clock: Clock) -> None:
+    open_breaker(breaker)
+    clock.now += 30
+    states = []
+
+    breaker.before_call(lambda: states.append(breaker.state))
+
+    assert states == [HALF_OPEN]
+    assert breaker.state == CLOSED
+    assert breaker.retry_at() is None
+    # the closed circuit starts counting from scratch
+    assert breaker.snapshot()["recent_calls"] == 0
+    breaker.before_call(no_probe)
+
+
+def test_probe_rejected_by_the_provider_still_closes_the_circuit(breaker: CircuitBreaker, clock: Clock) -> None:
+    open_breaker(breaker)
+    clock.now += 30
+
+    def probe() -> None:
+        raise status_error(BadRequestError, 400)
+
+    breaker.before_call(probe)
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.parametrize("slow", [False, True])
+def test_probe_failure_opens_the_circuit_again(
+    breaker: CircuitBreaker, clock: Clock, monkeypatch: pytest.MonkeyPatch, slow: bool
+) -> None:
+    monkeypatch.setattr(settings, "LLM_BREAKER_SLOW_CALL_SECONDS", 5)
+    open_breaker(breaker)
+    clock.now += 30
+
+    def probe() -> None:
+        if not slow:
+            raise APITimeoutError(request=REQUEST)
+        clock.now += 6
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(probe)
+    assert breaker.state == OPEN
+    # a new open period starts with the failed probe
+    assert breaker.retry_at() == clock.now + 30
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(no_probe)
+
+
+def test_callers_are_refused_while_a_probe_runs(breaker: CircuitBreaker, clock: Clock) -> None:
+    open_breaker(breaker)
+    clock.now += 30
+    refused = []
+
+    def probe() -> None:
+        with pytest.raises(CircuitOpenError) as raised:
+            breaker.before_call(no_probe)
+        refused.append(str(raised.value))
+
+    breaker.before_call(probe)
+
+    assert refused == ["circuit of model on provider is half_open"]
+    assert breaker.state == CLOSED
+
+
+def test_calls_finishing_while_open_are_not_counted(breaker: CircuitBreaker) -> None:
+    open_breaker(breaker)
+    for _ in range(4):
+        breaker.record(1.0, APITimeoutError(request=REQUEST))
+
+    assert breaker.snapshot()["recent_calls"] == 0
+    assert len(breaker.snapshot()["transitions"]) == 1
+
+
+def test_snapshot_records_the_transitions(breaker: CircuitBreaker, clock: Clock) -> None:
+    open_breaker(breaker)
+    clock.now += 30
+
+    def failed_probe() -> None:
+        raise APITimeoutError(request=REQUEST)
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(failed_probe)
+    clock.now += 30
+    breaker.before_call(lambda: None)
+
+    snapshot = breaker.snapshot()
+    assert snapshot["state"] == CLOSED
+    assert [(t["from_state"], t["to_state"]) for t in snapshot["transitions"]] == [
+        (CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)
+    ]
+    assert snapshot["transitions"][0]["reason"] == "error rate 50%"
+    assert snapshot["transitions"][2]["reason"].startswith("probe failed, APITimeoutError")
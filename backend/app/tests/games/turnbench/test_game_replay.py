@@ -0,0 +1,112 @@
+import pytest
+
+from app.games.turnbench.game_loop.game_engine import GameRules, GameState
+from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.models.session import PlayTurnData
+
+
+def recorded_history(turns: str) -> list[dict]:
+    """
+    stored turn results of a game written as `P<code>` for a proposal, `Q<verifier>` or `QSKIP` for a question,
+    `D` to continue to the next round and `D<code>` to submit a code
+    """
+    history = []
+    round_num = 1
+    for turn_num, turn in enumerate(turns.split(), start=1):
+        turn_name = {"P": "proposal", "Q": "question", "D": "deduce"}[turn[0]]
+        choice = turn[1:] or None
+        history.append(PlayTurnData(
+            turn_num=turn_num, round_num=round_num, turn_name=turn_name, turn_prompt="", turn_reasoning="",
+            guess_code=choice if turn_name == "proposal" else None,
+            verifier_choice=choice if turn_name == "question" else None,
+            deduce_choice_skip=choice is None if turn_name == "deduce" else None,
+            deduce_choice_submit_code=choice if turn_name == "deduce" else None,
+        ).model_dump())
+        round_num += turn_name == "deduce"
+    return history
+
+
+def previous_next_turn_name(history: list[dict], next_turn_name: str, game_over: bool) -> str:
+    """next turn name as the session service worked it out from the stored history before the game engine"""
+    if next_turn_name == "proposal":
+        return "question"
+    if next_turn_name == "question":
+        if history[-1]["turn_name"] == "proposal":
+            return "question"
+        three_questions = [turn["turn_name"] for turn in history[-3:]].count("question") >= 3
+        return "deduce" if history[-1]["verifier_choice"] == "SKIP" or three_questions else "question"
+    return "end" if game_over else "proposal"
+
+
+def previous_replay(history: list[dict], answer: str, max_rounds: int) -> list[tuple]:
+    """(next turn name, question round, rounds, game over reason, success) after each turn, the previous way"""
+    next_turn_name, total_rounds, submitted_code = "proposal", 0, None
+    game_over, game_over_reason, game_success = False, None, False
+    states = []
+    for turn_count in range(1, len(history) + 1):
+        turn = history[turn_count - 1]
+        if turn["turn_name"] == "deduce":
+            total_rounds += 1
+            submitted_code = turn["deduce_choice_submit_code"] or submitted_code
+            if submitted_code:
+                game_over, game_over_reason, game_success = True, "Submitted", submitted_code == answer
+            elif total_rounds >= max_rounds:
+                game_over, game_over_reason, game_success = True, "Over rounds", False
+        next_turn_name = previous_next_turn_name(history[:turn_count], next_turn_name, game_over)
+        question_round = [t["turn_name"] for t in history[:turn_count][-3:]].count("question") + 1
+        states.append((next_turn_name, question_round, total_rounds, game_over_reason, game_success))
+    return states
+
+
+REPLAYS = [
+    pytest.param(
+        "P124 Q0 Q1 Q0 D123", 5,
+        ["question", "question", "question", "deduce", "end"], "Submitted", True,
+        id="solved-after-three-questions",
+    ),
+    pytest.param(
+        "P124 Q0 QSKIP D P123 Q1 Q2 Q0 D123", 5,
+        ["question", "question", "deduce", "proposal", "question", "question", "question", "deduce", "end"],
+        "Submitted", True,
+        id="skip-then-solved",
+    ),
+    pytest.param(
+        "P111 QSKIP D222", 5,
+        ["question", "deduce", "end"], "Submitted", False,
+        id="wrong-code-submitted",
+    ),
+    pytest.param(
+        "P111 Q0 Q1 Q2 D P112 QSKIP D", 2,
+        ["question", "question", "question", "deduce", "proposal", "question", "deduce", "end"], "Over rounds", False,
+        id="over-rounds",
+    ),
+    pytest.param(
+        "P111 Q0", 5,
+        ["question", "question"], None, False,
+        id="in-progress",
+    ),
+]
+
+
+@pytest.mark.parametrize(("turns", "max_rounds", "turn_order", "game_over_reason", "game_success"), REPLAYS)
+def test_replay_of_recorded_history(
+    turns: str, max_rounds: int, turn_order: list[str], game_over_reason: str | None, game_success: bool
+) -> None:
+    history = recorded_history(turns)
+    rules = GameRules(answer="123", max_rounds=max_rounds, verifier_checks=(), answer_checks=())
+
+    states = [
+        GameState.replay(rules, map(SessionService.to_turn_record, history[:turn_count]))
+        for turn_count in range(1, len(history) + 1)
+    ]
+
+    assert [state.next_turn_name for state in states] == turn_order
+    final = states[-1]
+    assert (final.game_over_reason, final.game_success, final.game_over) == (
+        game_over_reason, game_success, game_over_reason is not None
+    )
+    assert final.total_turns == len(history)
+    assert [
+        (state.next_turn_name, state.question_round, state.total_rounds, state.game_over_reason, state.game_success)
+        for state in states
+    ] == previous_replay(history, rules.answer, max_rounds)
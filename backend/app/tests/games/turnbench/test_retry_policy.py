@@ -0,0 +1,171 @@
+import uuid
+
+import pytest
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.exceptions import ResponseFormatError, ResponseNotValidError
+from app.games.turnbench.game_loop import retry_policy
+from app.games.turnbench.game_loop.retry_policy import complete_with_retries
+from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.models.session import GameSession, GameSessionCreate
+from app.models import LLM, GameSetup
+from app.models.llm import LLMCompleteResponse
+
+SYSTEM_MESSAGE = {"role": "system", "content": "system prompt"}
+TURN_PROMPT = {"role": "user", "content": "turn prompt"}
+
+
+class ScriptedLLM:
+    """answers with the given contents in order and records the context of every call"""
+
+    def __init__(self, contents: list[str]) -> None:
+        self.contents = list(contents)
+        self.contexts: list[list[dict]] = []
+
+    def get_stage_complete(self, session, llm_client, turn_name, messages, attempt) -> LLMCompleteResponse:
+        assert attempt == len(self.contexts) + 1
+        self.contexts.append([dict(message) for message in messages])
+        return LLMCompleteResponse(
+            provider_id=uuid.uuid4(), provider_name="provider", llm_id=uuid.uuid4(), llm_name="model",
+            time_used=1.0, content=self.contents.pop(0), input_tokens=10, output_tokens=5
+        )
+
+
+def parse(content: str) -> str:
+    if content == "garbage":
+        raise ResponseFormatError("no choice found")
+    if content == "invalid":
+        raise ResponseNotValidError("not a valid code")
+    return content
+
+
+RETRY_PROMPTS = {
+    ResponseFormatError: lambda e, content: f"fix the format: {e}",
+    ResponseNotValidError: lambda e, content: f"not valid: {e}",
+}
+
+
+@pytest.fixture()
+def create_session(db: Session, llms: list[LLM], setup: GameSetup):
+    service = SessionService(db)
+
+    def create(retry_mode: str = "keep") -> GameSession:
+        game_session = service.create_session(
+            GameSessionCreate(
+                mode="classic", llm_id=llms[0].id, setup_id=setup.id, max_rounds=5,
+                messages=[SYSTEM_MESSAGE], retry_mode=retry_mode
+            )
+        )
+        game_session.turn_messages = [TURN_PROMPT]
+        return game_session
+
+    return create
+
+
+def run(db: Session, game_session: GameSession, llm: ScriptedLLM, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(retry_policy, "get_stage_complete", llm.get_stage_complete)
+    return complete_with_retries(game_session, SessionService(db), None, "proposal", parse, RETRY_PROMPTS)
+
+
+def assistant(content: str) -> dict:
+    return {"role": "assistant", "content": content}
+
+
+def user(content: str) -> dict:
+    return {"role": "user", "content": content}
+
+
+FORMAT_RETRY = user("fix the format: no choice found")
+VALID_RETRY = user("not valid: not a valid code")
+
+
+@pytest.mark.parametrize(
+    ("retry_mode", "third_context", "turn_messages"),
+    [
+        (
+            "keep",
+            [SYSTEM_MESSAGE, TURN_PROMPT, assistant("garbage"), FORMAT_RETRY, assistant("invalid"), VALID_RETRY],
+            [TURN_PROMPT, assistant("garbage"), FORMAT_RETRY, assistant("invalid"), VALID_RETRY, assistant("123")],
+        ),
+        (
+            "collapse",
+            [SYSTEM_MESSAGE, TURN_PROMPT, VALID_RETRY],
+            [TURN_PROMPT, VALID_RETRY, assistant("123")],
+        ),
+        (
+            "restart",
+            [SYSTEM_MESSAGE, TURN_PROMPT],
+            [TURN_PROMPT, assistant("123")],
+        ),
+    ],
+)
+def test_retry_modes(
+    db: Session, create_session, monkeypatch: pytest.MonkeyPatch,
+    retry_mode: str, third_context: list[dict], turn_messages: list[dict]
+) -> None:
+    game_session = create_session(retry_mode)
+    llm = ScriptedLLM(["garbage", "invalid", "123"])
+
+    result, llm_response = run(db, game_session, llm, monkeypatch)
+
+    assert (result, llm_response.content) == ("123", "123")
+    assert llm.contexts[0] == [SYSTEM_MESSAGE, TURN_PROMPT]
+    assert llm.contexts[2] == third_context
+    assert game_session.turn_messages == turn_messages
+    assert game_session.total_response_with_formatting_error == 1
+    assert game_session.total_response_with_not_valid_error == 1
+    # the first call is the turn itself, only the two after it are retries
+    assert (game_session.turn_input_tokens, game_session.turn_output_tokens) == (30, 15)
+    assert game_session.turn_retries == 2
+    assert (game_session.turn_retry_input_tokens, game_session.turn_retry_output_tokens) == (20, 10)
+
+
+def test_each_error_type_has_its_own_retry_limit(db: Session, create_session, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "TURNBENCH_MAX_RESPONSE_RETRIES", 2)
+    monkeypatch.setattr(settings, "TURNBENCH_RETRY_TOKEN_BUDGET", 0)
+    game_session = create_session()
+    llm = ScriptedLLM(["garbage", "invalid", "garbage", "invalid", "123"])
+
+    result, _ = run(db, game_session, llm, monkeypatch)
+
+    assert result == "123"
+    assert len(llm.contexts) == 5
+
+    game_session = create_session()
+    llm = ScriptedLLM(["garbage", "garbage", "garbage", "123"])
+    with pytest.raises(ResponseFormatError):
+        run(db, game_session, llm, monkeypatch)
+    assert len(llm.contexts) == 3
+    assert game_session.total_response_with_formatting_error == 3
+
+
+@pytest.mark.parametrize(("budget", "calls"), [(0, 5), (30, 3), (15, 2), (16, 3)])
+def test_retries_stop_at_the_token_budget(
+    db: Session, create_session, monkeypatch: pytest.MonkeyPatch, budget: int, calls: int
+) -> None:
+    monkeypatch.setattr(settings, "TURNBENCH_MAX_RESPONSE_RETRIES", 4)
+    monkeypatch.setattr(settings, "TURNBENCH_RETRY_TOKEN_BUDGET", budget)
+    game_session = create_session()
+    llm = ScriptedLLM(["garbage"] * 10)
+
+    with pytest.raises(ResponseFormatError):
+        run(db, game_session, llm, monkeypatch)
+
+    # every retry costs 15 tokens, the first call of the turn is not counted
+    assert len(llm.contexts) == calls
+    assert game_session.turn_retry_input_tokens + game_session.turn_retry_output_tokens == 15 * (calls - 1)
+
+
+def test_an_error_without_a_retry_prompt_is_raised(db: Session, create_session, monkeypatch: pytest.MonkeyPatch) -> None:
+    game_session = create_session()
+    llm = ScriptedLLM(["garbage"])
+    monkeypatch.setattr(retry_policy, "get_stage_complete", llm.get_stage_complete)
+
+    with pytest.raises(ResponseFormatError):
+        complete_with_retries(
+            game_session, SessionService(db), None, "proposal", parse,
+            {ResponseNotValidError: RETRY_PROMPTS[ResponseNotValidError]}
+        )
+    assert len(llm.contexts) == 1
+    assert game_session.turn_retries == 0
@@ -0,0 +1,183 @@
+import uuid
+
+from sqlmodel import Session, select
+
+from app.games.turnbench.game_session.session_service import SessionService
+from app.games.turnbench.models.session import (
+    GameSession,
+    GameSessionCreate,
+    GameSessionUpdate,
+    PlayTurnData,
+)
+from app.models import LLM, GameSetup
+
+SYSTEM_MESSAGE = {"role": "system", "content": "system prompt"}
+
+
+def turn_messages(turn_num: int, reasoning: str | None = None) -> list[dict]:
+    return [
+        {"role": "user", "content": f"prompt {turn_num}"},
+        {"role": "assistant", "content": f"<REASONING> {reasoning or f'reasoning {turn_num}'} <CHOICE> 1"},
+    ]
+
+
+def play_turn(service: SessionService, session_id: uuid.UUID, turn_num: int) -> None:
+    """append a played turn to the session, the way the game loop stores it"""
+    game_session = service.get_session_by_id(session_id)
+    game_session.turn_message_indexes = game_session.turn_message_indexes + [len(game_session.messages)]
+    game_session.messages = game_session.messages + turn_messages(turn_num)
+    game_session.turn_llm_response_indexes = game_session.turn_llm_response_indexes + [len(game_session.messages) - 1]
+    game_session.turn_result_history = game_session.turn_result_history + [
+        PlayTurnData(
+            turn_num=turn_num, round_num=1, turn_name="proposal",
+            turn_prompt=f"prompt {turn_num}", turn_reasoning=f"reasoning {turn_num}", guess_code="111"
+        ).model_dump()
+    ]
+    game_session.total_turns = turn_num
+    service.update_session(session_id, GameSessionUpdate(**game_session.model_dump()))
+
+
+def rewrite_turn(service: SessionService, session_id: uuid.UUID, turn_index: int, reasoning: str) -> None:
+    """replace the reasoning of an already played turn"""
+    game_session = service.get_session_by_id(session_id)
+    turns = [dict(turn) for turn in game_session.turn_result_history]
+    turns[turn_index]["turn_reasoning"] = reasoning
+    messages = list(game_session.messages)
+    message_index = game_session.turn_llm_response_indexes[turn_index]
+    messages[message_index] = turn_messages(turns[turn_index]["turn_num"], reasoning)[1]
+    game_session.turn_result_history = turns
+    game_session.messages = messages
+    service.update_session(session_id, GameSessionUpdate(**game_session.model_dump()))
+
+
+def create_played_session(service: SessionService, llm: LLM, setup: GameSetup, turns: int) -> uuid.UUID:
+    game_session = service.create_session(
+        GameSessionCreate(mode="classic", llm_id=llm.id, setup_id=setup.id, max_rounds=5, messages=[SYSTEM_MESSAGE])
+    )
+    for turn_num in range(1, turns + 1):
+        play_turn(service, game_session.id, turn_num)
+    return game_session.id
+
+
+def reasonings(game_session: GameSession) -> list[str]:
+    return [turn["turn_reasoning"] for turn in game_session.turn_result_history]
+
+
+def expected_messages(reasoning_by_turn: dict[int, str]) -> list[dict]:
+    messages = [SYSTEM_MESSAGE]
+    for turn_num, reasoning in reasoning_by_turn.items():
+        messages += turn_messages(turn_num, reasoning)
+    return messages
+
+
+def stored_turns(db: Session, session_id: uuid.UUID) -> list:
+    """turns stored in the row of a session itself, without the ones shared with its parent"""
+    return db.exec(select(GameSession.turn_result_history).where(GameSession.id == session_id)).one()
+
+
+def test_fork_shares_the_turns_of_its_parent(db: Session, llms: list[LLM], setup: GameSetup) -> None:
+    service = SessionService(db)
+    parent_id = create_played_session(service, llms[0], setup, turns=3)
+
+    fork_id = service.copy_session(service.get_session_by_id(parent_id), llms[1])
+
+    fork = service.get_session_by_id(fork_id)
+    assert (fork.parent_session_id, fork.fork_turn, fork.fork_message_index) == (parent_id, 3, 7)
+    assert fork.llm_id == llms[1].id
+    assert reasonings(fork) == ["reasoning 1", "reasoning 2", "reasoning 3"]
+    assert fork.messages == expected_messages({1: "reasoning 1", 2: "reasoning 2", 3: "reasoning 3"})
+    assert stored_turns(db, fork_id) == []
+
+
+def test_parent_rewrite_leaves_the_fork_unchanged(db: Session, llms: list[LLM], setup: GameSetup) -> None:
+    service = SessionService(db)
+    parent_id = create_played_session(service, llms[0], setup, turns=3)
+    fork_id = service.copy_session(service.get_session_by_id(parent_id), llms[1])
+    play_turn(service, fork_id, 4)
+
+    rewrite_turn(service, parent_id, 1, "rewritten")
+
+    parent = service.get_session_by_id(parent_id)
+    assert reasonings(parent) == ["reasoning 1", "rewritten", "reasoning 3"]
+    fork = service.get_session_by_id(fork_id)
+    assert reasonings(fork) == ["reasoning 1", "reasoning 2", "reasoning 3", "reasoning 4"]
+    assert fork.messages == expected_messages({n: f"reasoning {n}" for n in range(1, 5)})
+    # only the turn before the rewrite is still shared, the fork copied the rest
+    assert (fork.parent_session_id, fork.fork_turn) == (parent_id, 1)
+    assert len(stored_turns(db, fork_id)) == 3
+
+
+def test_parent_appending_turns_keeps_the_prefix_shared(db: Session, llms: list[LLM], setup: GameSetup) -> None:
+    service = SessionService(db)
+    parent_id = create_played_session(service, llms[0], setup, turns=2)
+    fork_id = service.copy_session(service.get_session_by_id(parent_id), llms[1])
+
+    play_turn(service, parent_id, 3)
+
+    fork = service.get_session_by_id(fork_id)
+    assert reasonings(fork) == ["reasoning 1", "reasoning 2"]
+    assert (fork.parent_session_id, fork.fork_turn) == (parent_id, 2)
+    assert stored_turns(db, fork_id) == []
+
+
+def test_deleting_a_parent_materializes_its_forks(db: Session, llms: list[LLM], setup: GameSetup) -> None:
+    service = SessionService(db)
+    parent_id = create_played_session(service, llms[0], setup, turns=3)
+    fork_ids = service.fork_sessions(service.get_session_by_id(parent_id), [llms[1].id, llms[2].id])
+    play_turn(service, fork_ids[0], 4)
+
+    service.delete_sessions(parent_id)
+
+    assert service.session_repository.get_game_session_by_id(parent_id) is None
+    first, second = (service.get_session_by_id(fork_id) for fork_id in fork_ids)
+    assert reasonings(first) == ["reasoning 1", "reasoning 2", "reasoning 3", "reasoning 4"]
+    assert first.messages == expected_messages({n: f"reasoning {n}" for n in range(1, 5)})
+    assert reasonings(second) == ["reasoning 1", "reasoning 2", "reasoning 3"]
+    for fork in (first, second):
+        assert fork.parent_session_id is None
+        assert (fork.fork_turn, fork.fork_message_index) == (0, 0)
+
+
+def test_fork_of_a_fork(db: Session, llms: list[LLM], setup: GameSetup) -> None:
+    service = SessionService(db)
+    root_id = create_played_session(service, llms[0], setup, turns=2)
+    fork_id = service.copy_session(service.get_session_by_id(root_id), llms[1])
+
+    # a fork without turns of its own is skipped, the copy shares the root directly
+    copy_id = service.copy_session(service.get_session_by_id(fork_id), llms[2])
+    assert service.get_session_by_id(copy_id).parent_session_id == root_id
+
+    play_turn(service, fork_id, 3)
+    grandchild_id = service.copy_session(service.get_session_by_id(fork_id), llms[2])
+    grandchild = service.get_session_by_id(grandchild_id)
+    assert (grandchild.parent_session_id, grandchild.fork_turn) == (fork_id, 3)
+    assert reasonings(grandchild) == ["reasoning 1", "reasoning 2", "reasoning 3"]
+    assert stored_turns(db, grandchild_id) == []
+
+    # deleting the middle of the chain re-points the fork of the fork to the root, sharing what the middle shared
+    service.delete_sessions(fork_id)
+    grandchild = service.get_session_by_id(grandchild_id)
+    assert (grandchild.parent_session_id, grandchild.fork_turn) == (root_id, 2)
+    assert reasonings(grandchild) == ["reasoning 1", "reasoning 2", "reasoning 3"]
+
+    # a rewrite of the root reaches none of its forks
+    rewrite_turn(service, root_id, 0, "rewritten")
+    grandchild = service.get_session_by_id(grandchild_id)
+    assert reasonings(grandchild) == ["reasoning 1", "reasoning 2", "reasoning 3"]
+    assert grandchild.messages == expected_messages({n: f"reasoning {n}" for n in range(1, 4)})
+    assert reasonings(service.get_session_by_id(copy_id)) == ["reasoning 1", "reasoning 2"]
+
+
+def test_fork_with_an_edited_turn(db: Session, llms: list[LLM], setup: GameSetup) -> None:
+    service = SessionService(db)
+    parent_id = create_played_session(service, llms[0], setup, turns=3)
+    parent = service.get_session_by_id(parent_id)
+    edited = PlayTurnData(**parent.turn_result_history[1])
+    edited.turn_reasoning = "edited"
+
+    fork_id = service.fork_sessions(parent, [llms[1].id], edited)[0]
+
+    fork = service.get_session_by_id(fork_id)
+    assert reasonings(fork)[:2] == ["reasoning 1", "edited"]
+    assert (fork.parent_session_id, fork.fork_turn) == (parent_id, 1)
+    assert reasonings(service.get_session_by_id(parent_id)) == ["reasoning 1", "reasoning 2", "reasoning 3"]